@@ -1,21 +1,63 @@
 import os
 import io
-import tkinter as tk
-from tkinter import ttk, filedialog
-from typing import List, Tuple, Dict
+import sys
+import glob
+import json
+import argparse
+import contextlib
+import hashlib
+import html
+import sqlite3
+import time
+import math
+import heapq
+import multiprocessing
+import queue
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import FIRST_COMPLETED, Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from typing import Any, List, Tuple, Dict, Optional, Iterator
 import pymupdf
-from PIL import Image, ImageDraw, ImageFont, ImageTk
+from PIL import Image, ImageDraw, ImageFont
+
+try:
+    import tkinter as tk
+    from tkinter import ttk, filedialog
+    from PIL import ImageTk  # Imports tkinter itself
+except ImportError:  # Headless Python builds can still use the command-line interface
+    tk = None
 import imagehash
+import numpy as np
+
 
 class PDFImageExtractorGUI:
+    # The log area is refreshed in batches and keeps only the newest lines
+    LOG_FLUSH_INTERVAL_MS = 100
+    LOG_MAX_LINES = 5000
+    # Options shown as checkboxes; the others are set from the command line or keep their defaults
+    CHECKBOX_OPTIONS = (
+        "use_threshold",
+        "remove_duplicates",
+        "skip_repeated_xrefs",
+        "raw_passthrough",
+        "reduced_phash",
+        "use_cache",
+        "write_log_file",
+    )
+
     def __init__(self, master):
         self.master = master
         self.master.title("PDF Image Extractor")
         self.master.geometry("800x725")
 
         self.extractor = PDFImageExtractor()
+        # Log and progress events posted by the background worker, handled on the Tk thread
+        self.events: "queue.Queue[Tuple]" = queue.Queue()
+        self.worker: Optional[threading.Thread] = None
+        self.log_sink = BufferedLogSink(self.LOG_MAX_LINES)
 
         self.create_widgets()
+        self.master.after(self.LOG_FLUSH_INTERVAL_MS, self.flush_log)
 
     def create_widgets(self):
         """
@@ -63,14 +105,10 @@ class PDFImageExtractorGUI:
         self.file_label.grid(row=0, column=0, sticky=tk.W)
 
         self.file_path = tk.StringVar()
-        self.file_entry = ttk.Entry(
-            self.file_frame, textvariable=self.file_path, width=50
-        )
+        self.file_entry = ttk.Entry(self.file_frame, textvariable=self.file_path, width=50)
         self.file_entry.grid(row=0, column=1, padx=5)
 
-        self.browse_button = ttk.Button(
-            self.file_frame, text="Browse", command=self.browse_file
-        )
+        self.browse_button = ttk.Button(self.file_frame, text="Browse", command=self.browse_file)
         self.browse_button.grid(row=0, column=2)
 
         # Output folder selection
@@ -81,14 +119,10 @@ class PDFImageExtractorGUI:
         self.output_label.grid(row=0, column=0, sticky=tk.W)
 
         self.output_path = tk.StringVar()
-        self.output_entry = ttk.Entry(
-            self.output_frame, textvariable=self.output_path, width=50
-        )
+        self.output_entry = ttk.Entry(self.output_frame, textvariable=self.output_path, width=50)
         self.output_entry.grid(row=0, column=1, padx=5)
 
-        self.output_browse_button = ttk.Button(
-            self.output_frame, text="Browse", command=self.browse_output_folder
-        )
+        self.output_browse_button = ttk.Button(self.output_frame, text="Browse", command=self.browse_output_folder)
         self.output_browse_button.grid(row=0, column=2)
 
         # Options frame
@@ -96,16 +130,12 @@ class PDFImageExtractorGUI:
         self.options_frame.grid(row=2, column=0, sticky=(tk.W, tk.E), padx=10, pady=5)
 
         self.option_vars = {}
-        for i, (option, default) in enumerate(self.extractor.options.items()):
-            if option not in ["phash_size", "phash_threshold"]:
-                var = tk.BooleanVar(value=default)
-                self.option_vars[option] = var
-                ttk.Checkbutton(
-                    self.options_frame,
-                    text=option.replace('_', ' ').title(),
-                    variable=var,
-                    command=self.update_options
-                ).grid(row=i, column=0, sticky=tk.W)
+        for i, option in enumerate(self.CHECKBOX_OPTIONS):
+            var = tk.BooleanVar(value=self.extractor.options[option])
+            self.option_vars[option] = var
+            ttk.Checkbutton(
+                self.options_frame, text=option.replace("_", " ").title(), variable=var, command=self.update_options
+            ).grid(row=i // 2, column=i % 2, sticky=tk.W, padx=(0, 20))
 
         # Add the Option settings frame
         self.settings_frame = ttk.LabelFrame(self.main_frame, text="Option Settings", padding="10")
@@ -118,15 +148,41 @@ class PDFImageExtractorGUI:
         self.threshold_entry.grid(row=0, column=1, padx=5)
 
         ttk.Label(self.settings_frame, text="Hash Size:").grid(row=1, column=0, sticky=tk.W)
-        self.phash_size_var = tk.IntVar(value=self.extractor.options['phash_size'])
+        self.phash_size_var = tk.IntVar(value=self.extractor.options["phash_size"])
         self.phash_size_entry = ttk.Entry(self.settings_frame, textvariable=self.phash_size_var, width=5)
         self.phash_size_entry.grid(row=1, column=1, padx=5)
 
         ttk.Label(self.settings_frame, text="Hash Threshold:").grid(row=2, column=0, sticky=tk.W)
-        self.phash_threshold_var = tk.IntVar(value=self.extractor.options['phash_threshold'])
+        self.phash_threshold_var = tk.IntVar(value=self.extractor.options["phash_threshold"])
         self.phash_threshold_entry = ttk.Entry(self.settings_frame, textvariable=self.phash_threshold_var, width=5)
         self.phash_threshold_entry.grid(row=2, column=1, padx=5)
 
+        ttk.Label(self.settings_frame, text="Workers:").grid(row=3, column=0, sticky=tk.W)
+        self.workers_var = tk.IntVar(value=self.extractor.options["workers"])
+        self.workers_entry = ttk.Entry(self.settings_frame, textvariable=self.workers_var, width=5)
+        self.workers_entry.grid(row=3, column=1, padx=5)
+
+        ttk.Label(self.settings_frame, text="Min. Size (px):").grid(row=4, column=0, sticky=tk.W)
+        self.min_dimension_var = tk.IntVar(value=self.extractor.options["min_dimension"])
+        self.min_dimension_entry = ttk.Entry(self.settings_frame, textvariable=self.min_dimension_var, width=5)
+        self.min_dimension_entry.grid(row=4, column=1, padx=5)
+
+        # Preview settings, in a second column to keep the window height
+        ttk.Label(self.settings_frame, text="Preview Limit:").grid(row=0, column=2, sticky=tk.W, padx=(20, 0))
+        self.preview_limit_var = tk.IntVar(value=self.extractor.options["preview_limit"])
+        self.preview_limit_entry = ttk.Entry(self.settings_frame, textvariable=self.preview_limit_var, width=7)
+        self.preview_limit_entry.grid(row=0, column=3, padx=5)
+
+        ttk.Label(self.settings_frame, text="Sheet Format:").grid(row=1, column=2, sticky=tk.W, padx=(20, 0))
+        self.sheet_format_var = tk.StringVar(value=self.extractor.options["sheet_format"])
+        self.sheet_format_box = ttk.Combobox(
+            self.settings_frame,
+            textvariable=self.sheet_format_var,
+            values=list(SHEET_FORMATS),
+            state="readonly",
+            width=6,
+        )
+        self.sheet_format_box.grid(row=1, column=3, padx=5)
 
         # Action buttons
         self.button_frame = ttk.Frame(self.main_frame, padding="10")
@@ -139,11 +195,17 @@ class PDFImageExtractorGUI:
         )
         self.preview_button.grid(row=0, column=0, padx=5)
 
-        self.extract_button = ttk.Button(
-            self.button_frame, text="Extract Images", command=self.extract_images
-        )
+        self.extract_button = ttk.Button(self.button_frame, text="Extract Images", command=self.extract_images)
         self.extract_button.grid(row=0, column=1, padx=5)
 
+        self.cancel_button = ttk.Button(self.button_frame, text="Cancel", command=self.cancel, state="disabled")
+        self.cancel_button.grid(row=0, column=2, padx=5)
+
+        self.progress_bar = ttk.Progressbar(self.button_frame, length=300, mode="determinate")
+        self.progress_bar.grid(row=1, column=0, columnspan=2, padx=5, pady=(5, 0), sticky=(tk.W, tk.E))
+        self.progress_label = ttk.Label(self.button_frame, text="")
+        self.progress_label.grid(row=1, column=2, padx=5, pady=(5, 0), sticky=tk.W)
+
         # Log area
         self.log_frame = ttk.Frame(self.main_frame, padding="10")
         self.log_frame.grid(row=5, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
@@ -153,9 +215,7 @@ class PDFImageExtractorGUI:
         self.log_text = tk.Text(self.log_frame, wrap=tk.WORD, width=80, height=20)
         self.log_text.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
 
-        self.scrollbar = ttk.Scrollbar(
-            self.log_frame, orient=tk.VERTICAL, command=self.log_text.yview
-        )
+        self.scrollbar = ttk.Scrollbar(self.log_frame, orient=tk.VERTICAL, command=self.log_text.yview)
         self.scrollbar.grid(row=0, column=1, sticky=(tk.N, tk.S))
         self.log_text.configure(yscrollcommand=self.scrollbar.set)
 
@@ -187,8 +247,8 @@ class PDFImageExtractorGUI:
         options. It performs the following actions:
 
         1. Updates boolean options in the extractor based on checkbox states.
-        2. Updates pHash-related settings (size and threshold) from their respective
-           entry fields.
+        2. Updates pHash-related settings (size and threshold), the worker count and the
+           preview settings from their respective entry fields.
         3. Enables or disables the threshold entry field based on the 'use_threshold'
            option.
         4. Enables or disables pHash-related entry fields based on the
@@ -221,22 +281,26 @@ class PDFImageExtractorGUI:
             self.extractor.options[option] = var.get()
 
         # Update pHash settings
-        self.extractor.options['phash_size'] = self.phash_size_var.get()
-        self.extractor.options['phash_threshold'] = self.phash_threshold_var.get()
+        self.extractor.options["phash_size"] = self.phash_size_var.get()
+        self.extractor.options["phash_threshold"] = self.phash_threshold_var.get()
+        self.extractor.options["workers"] = max(1, self.workers_var.get())
+        self.extractor.options["min_dimension"] = max(0, self.min_dimension_var.get())
+        self.extractor.options["preview_limit"] = max(0, self.preview_limit_var.get())
+        self.extractor.options["sheet_format"] = self.sheet_format_var.get()
 
         # Enable/disable threshold entry based on use_threshold option
         if self.extractor.options["use_threshold"]:
-            self.threshold_entry.config(state='normal')
+            self.threshold_entry.config(state="normal")
         else:
-            self.threshold_entry.config(state='disabled')
+            self.threshold_entry.config(state="disabled")
 
         # Enable/disable pHash settings based on remove_duplicates option
         if self.extractor.options["remove_duplicates"]:
-            self.phash_size_entry.config(state='normal')
-            self.phash_threshold_entry.config(state='normal')
+            self.phash_size_entry.config(state="normal")
+            self.phash_threshold_entry.config(state="normal")
         else:
-            self.phash_size_entry.config(state='disabled')
-            self.phash_threshold_entry.config(state='disabled')
+            self.phash_size_entry.config(state="disabled")
+            self.phash_threshold_entry.config(state="disabled")
 
     def browse_file(self):
         """
@@ -294,7 +358,6 @@ class PDFImageExtractorGUI:
         except Exception as e:
             self.log(f"Error loading PDF cover: {str(e)}")
 
-
     def browse_output_folder(self):
         """
         Opens a directory dialog for the user to select an output folder.
@@ -312,7 +375,7 @@ class PDFImageExtractorGUI:
 
     def create_preview(self):
         """
-        Creates a thumbnail preview of the selected PDF file.
+        Creates a thumbnail preview of the selected PDF file on a background thread.
 
         Logs an error message if no PDF file is selected or if an exception occurs during the preview creation.
         """
@@ -321,14 +384,35 @@ class PDFImageExtractorGUI:
             return
 
         try:
-            self.log("Creating thumbnail preview...")
-            thumbnail_sheet = self.extractor.create_thumbnail_preview()
-            self.log("Thumbnail sheet created at: " + thumbnail_sheet)
-            os.startfile(thumbnail_sheet)
+            # Preview with the same settings as the extraction, so it can reuse the analysis
+            self.extractor.threshold = self.threshold.get() if self.extractor.options["use_threshold"] else 0
+            self.update_options()
         except Exception as e:
             self.log(f"Error creating thumbnail preview: {str(e)}")
+            return
+
+        def on_done(thumbnail_sheet):
+            self.log("Thumbnail sheet created at: " + thumbnail_sheet)
+            os.startfile(thumbnail_sheet)
+
+        def on_error(error):
+            self.log(f"Error creating thumbnail preview: {str(error)}")
+
+        self.log("Creating thumbnail preview...")
+        self.run_in_background(
+            lambda: self.extractor.create_thumbnail_preview(
+                log_callback=self.post_log, progress_callback=self.post_progress
+            ),
+            on_done,
+            on_error,
+        )
 
     def extract_images(self):
+        """
+        Extracts the images of the selected PDF file on a background thread.
+
+        Logs an error message if no PDF file or output folder is selected or if an exception occurs during the extraction.
+        """
         if not self.file_path.get():
             self.log("Error: Please select a PDF file first.")
             return
@@ -340,392 +424,3186 @@ class PDFImageExtractorGUI:
                 raise ValueError("Please select an output folder.")
 
             self.update_options()  # Ensure pHash settings are updated
+        except ValueError as ve:
+            self.log(f"Error: {str(ve)}")
+            return
+        except Exception as e:
+            self.log(f"Error extracting images: {str(e)}")
+            return
+
+        self.log("Extracting images with options:")
+        for option, value in self.extractor.options.items():
+            self.log(f"- {option.replace('_', ' ').title()}: {value}")
+        if self.extractor.options["use_threshold"]:
+            self.log(f"- Threshold: {self.extractor.threshold} KB")
+        self.log(f"Output folder: {self.extractor.output_folder}")
 
-            self.log("Extracting images with options:")
-            for option, value in self.extractor.options.items():
-                self.log(f"- {option.replace('_', ' ').title()}: {value}")
-            if self.extractor.options["use_threshold"]:
-                self.log(f"- Threshold: {self.extractor.threshold} KB")
-            self.log(f"Output folder: {self.extractor.output_folder}")
+        self.log("----------------------------------------")
+        self.log("Extracting images...")
 
-            self.log("----------------------------------------")
-            self.log("Extracting images...")
-            # Wait for logging to happen before starting the extraction
-            self.master.update()
-            self.extractor.extract_and_save_images(log_callback=self.log)
+        def on_done(saved):
             self.log("Image extraction completed.")
             self.log(f"Images have been extracted to: {self.extractor.output_folder}")
             self.log("----------------------------------------")
 
-        except ValueError as ve:
-            self.log(f"Error: {str(ve)}")
-        except Exception as e:
-            self.log(f"Error extracting images: {str(e)}")
+        def on_error(error):
+            if isinstance(error, ValueError):
+                self.log(f"Error: {str(error)}")
+            else:
+                self.log(f"Error extracting images: {str(error)}")
+
+        self.run_in_background(
+            lambda: self.extractor.extract_and_save_images(
+                log_callback=self.post_log, progress_callback=self.post_progress
+            ),
+            on_done,
+            on_error,
+        )
 
-    def log(self, message):
+    def run_in_background(self, task, on_done, on_error):
         """
-        Logs a message to the text area and scrolls to the end.
+        Runs a preview or extraction on a worker thread while the window stays responsive.
+
+        The action buttons are disabled and the Cancel button is enabled until the task ends.
+        The task must only talk to the GUI through post_log and post_progress. With the
+        'write_log_file' option the log of the task is also written to extraction_log.txt
+        in the output folder.
 
         Args:
-            message (str): The message to log.
+            task (callable): The work to run, returning its result.
+            on_done (callable): Called with the result on the Tk thread.
+            on_error (callable): Called with the exception on the Tk thread. A cancelled
+                task is only logged.
         """
-        self.log_text.insert(tk.END, message + "\n")
-        self.log_text.see(tk.END)
+        if self.worker is not None and self.worker.is_alive():
+            self.log("Error: Another operation is still running.")
+            return
 
+        def run():
+            try:
+                self.events.put(("done", on_done, task()))
+            except Exception as e:
+                self.events.put(("error", on_error, e))
 
-class PDFImageExtractor:
-    def __init__(self):
-        self.pdf_path = ""
-        self.pdf_directory = ""
-        self.pdf_name = ""
-        self.output_folder = ""
-        self.threshold = 0
-        self.current_p_hashes: List = []
-        self.options: Dict[str, bool] = {
-            "use_threshold": True,
-            "remove_duplicates": True,
-            "phash_size": 8,  # New option for pHash size
-            "phash_threshold": 5  # New option for pHash comparison threshold
-        }
+        if self.extractor.options["write_log_file"] and self.output_path.get():
+            try:
+                os.makedirs(self.output_path.get(), exist_ok=True)
+                log_path = os.path.join(self.output_path.get(), "extraction_log.txt")
+                self.log_sink.open_file(log_path)
+                self.log(f"Writing log to: {log_path}")
+            except OSError as e:
+                self.log(f"Warning: Failed to open log file: {str(e)}")
+
+        self.set_busy(True)
+        self.progress_bar["value"] = 0
+        self.progress_label.config(text="")
+        self.worker = threading.Thread(target=run, daemon=True)
+        self.worker.start()
+        self.master.after(100, self.poll_events)
+
+    def poll_events(self):
+        """Handles the events posted by the worker thread, then polls again until the worker is done."""
+        finished = False
+        while True:
+            try:
+                event = self.events.get_nowait()
+            except queue.Empty:
+                break
+            kind = event[0]
+            if kind == "progress":
+                self.show_progress(event[1])
+            elif kind == "done":
+                finished = True
+                event[1](event[2])
+            elif kind == "error":
+                finished = True
+                if isinstance(event[2], ExtractionCancelled):
+                    self.log("Operation cancelled.")
+                    self.log("----------------------------------------")
+                else:
+                    event[1](event[2])
+        if finished:
+            self.set_busy(False)
+            self.log_sink.close_file()
+        else:
+            self.master.after(100, self.poll_events)
 
-    def phash_image(self, image: Image) -> imagehash.ImageHash:
+    def post_log(self, message):
+        """Thread-safe log callback for the worker thread."""
+        self.log_sink.write(message)
+
+    def post_progress(self, snapshot):
+        """Thread-safe progress callback for the worker thread."""
+        self.events.put(("progress", snapshot))
+
+    def show_progress(self, snapshot):
         """
-        Calculates the pHash value
+        Shows a ProgressTracker snapshot in the progress bar and label.
 
         Args:
-            image (Image.Image): The image to calculate the pHash for.
+            snapshot (Dict): The snapshot to show.
+        """
+        if snapshot["page_count"]:
+            self.progress_bar["value"] = 100 * snapshot["pages_done"] / snapshot["page_count"]
+        eta = f"{snapshot['eta']:.0f} s left" if snapshot["eta"] is not None else "estimating..."
+        self.progress_label.config(
+            text=f"Page {snapshot['pages_done']}/{snapshot['page_count']}, "
+            f"{snapshot['images_per_second']:.1f} img/s, {snapshot['mb_per_second']:.1f} MB/s, {eta}"
+        )
 
-        Returns:
-            str: The pHash value of the image.
+    def set_busy(self, busy):
+        """Enables the Cancel button while a task runs and the action buttons otherwise."""
+        state = "disabled" if busy else "normal"
+        self.preview_button.config(state=state)
+        self.extract_button.config(state=state)
+        self.cancel_button.config(state="normal" if busy else "disabled")
+
+    def cancel(self):
+        """Asks the running preview or extraction to stop at the next image."""
+        self.extractor.cancel()
+        self.log("Cancelling...")
+
+    def log(self, message):
         """
-        p_hash = imagehash.phash(image, hash_size=self.options["phash_size"])
-        return p_hash
+        Queues a message for the log area. Thread-safe.
 
-    def is_duplicate(self, new_hash: imagehash.ImageHash) -> bool:
+        The message is shown by the next flush_log, so logging never waits for the widget.
+
+        Args:
+            message (str): The message to log.
         """
-        Checks if the new hash is a duplicate based on the current threshold
+        self.log_sink.write(message)
+
+    def flush_log(self):
+        """
+        Appends all queued log messages to the text area in one batch and scrolls to the end.
+
+        Only the newest LOG_MAX_LINES lines are kept in the widget. Reschedules itself.
+        """
+        lines = self.log_sink.drain()
+        if lines:
+            self.log_text.insert(tk.END, "\n".join(lines) + "\n")
+            line_count = int(self.log_text.index("end-1c").split(".")[0]) - 1
+            if line_count > self.LOG_MAX_LINES:
+                self.log_text.delete("1.0", f"{line_count - self.LOG_MAX_LINES + 1}.0")
+            self.log_text.see(tk.END)
+        self.master.after(self.LOG_FLUSH_INTERVAL_MS, self.flush_log)
+
+
+class BufferedLogSink:
+    """
+    Thread-safe buffer between log producers and a slow log display.
+
+    Messages are queued by write() and taken in batches by drain(). At most max_pending
+    messages are queued; older ones are dropped and summarized in one line. With a log
+    file open, every message is also appended to it, including dropped ones.
+    """
+
+    def __init__(self, max_pending: int = 5000):
+        self._lock = threading.Lock()
+        self._pending: deque = deque(maxlen=max_pending)
+        self._dropped = 0
+        self._file = None
+
+    def write(self, message: str):
+        """
+        Queues a message.
 
         Args:
-            new_hash (imagehash.ImageHash): The hash to check for duplicates
+            message (str): The message to log.
+        """
+        with self._lock:
+            if self._file is not None:
+                self._file.write(message + "\n")
+            if len(self._pending) == self._pending.maxlen:
+                self._dropped += 1
+            self._pending.append(message)
+
+    def drain(self) -> List[str]:
+        """
+        Takes all queued messages.
 
         Returns:
-            bool: True if it's a duplicate, False otherwise
+            List[str]: The messages in order, preceded by a note if messages were dropped.
         """
-        for existing_hash in self.current_p_hashes:
-            if (new_hash - existing_hash) <= self.options['phash_threshold']:
-                return True
-        return False
-
-    def set_pdf_file(self, pdf_path: str):
+        with self._lock:
+            lines = list(self._pending)
+            self._pending.clear()
+            if self._dropped:
+                lines.insert(0, f"... {self._dropped} earlier messages not shown ...")
+                self._dropped = 0
+            if self._file is not None:
+                self._file.flush()
+        return lines
+
+    def open_file(self, path: str):
         """
-        Sets the PDF file path and updates related attributes.
+        Starts appending all messages to a file, closing a previously opened one.
 
         Args:
-            pdf_path (str): The path to the PDF file.
+            path (str): The path of the log file.
 
         Raises:
-            FileNotFoundError: If the file does not exist.
+            OSError: If the file cannot be opened.
         """
-        if pdf_path:
-            if not os.path.isfile(pdf_path):
-                raise FileNotFoundError(
-                    f"The selected file does not exist: {pdf_path}"
-                )
-            self.pdf_path = pdf_path
-            self.pdf_directory = os.path.dirname(self.pdf_path)
-            self.pdf_name = os.path.basename(self.pdf_path)
+        log_file = open(path, "a", encoding="utf-8")
+        with self._lock:
+            previous, self._file = self._file, log_file
+        if previous is not None:
+            previous.close()
 
-    def extract_images(self) -> List[Tuple[bytes, float]]:
-        """
-        Extracts images from the selected PDF file.
+    def close_file(self):
+        """Stops writing messages to the log file."""
+        with self._lock:
+            log_file, self._file = self._file, None
+        if log_file is not None:
+            log_file.close()
 
-        Raises a ValueError if no PDF file is selected or if an error occurs while reading the PDF file.
-        Raises a RuntimeError for unexpected errors during image extraction.
 
-        Returns:
-            List[Tuple[bytes, float]]: A list of tuples containing image bytes and their sizes in KB.
-        """
-        if not self.pdf_path:
-            raise ValueError("No PDF file selected.")
+def pixmap_to_image(pix: pymupdf.Pixmap, copy: bool = False) -> Tuple[Image.Image, pymupdf.Pixmap]:
+    """
+    Converts a pixmap to a PIL image in L, LA, RGB or RGBA mode.
 
-        extracted_images = []
-        try:
-            with pymupdf.open(self.pdf_path) as doc:
-                for page in doc:
-                    image_list = page.get_images(full=True)
-                    for img in image_list:
-                        xref = img[0]
-                        base_image = doc.extract_image(xref)
-                        image_bytes = base_image["image"]
-                        image_size = len(image_bytes) / 1024  # size in KB
-                        extracted_images.append((image_bytes, image_size))
-        except pymupdf.fitz.FileDataError as e:
-            raise ValueError(f"Error reading PDF file: {str(e)}")
-        except Exception as e:
-            raise RuntimeError(f"Unexpected error extracting images: {str(e)}")
+    Pixmaps in other colorspaces (for example CMYK) are converted to RGB first.
 
-        return extracted_images
+    Args:
+        pix (pymupdf.Pixmap): The pixmap to convert.
+        copy (bool): If True the image gets its own copy of the samples, so it stays valid
+            after the pixmap is gone and can be handed to another thread.
 
-    def filter_images(self, images: List[Tuple[bytes, float]], log_callback=None) -> List[Tuple[bytes, float]]:
+    Returns:
+        Tuple[Image.Image, pymupdf.Pixmap]: The image and the pixmap owning its sample buffer.
+    """
+    if pix.colorspace is not None and pix.colorspace.n not in (1, 3):
+        pix = pymupdf.Pixmap(pymupdf.csRGB, pix)
+    mode = "RGB" if pix.colorspace is not None and pix.colorspace.n == 3 else "L"
+    if pix.alpha and pix.colorspace is not None:
+        mode += "A"
+    samples = pix.samples if copy else pix.samples_mv
+    image = Image.frombuffer(mode, (pix.width, pix.height), samples, "raw", mode, pix.stride, 1)
+    return image, pix
+
+
+def thumbnail_image(image, budget: Optional["MemoryBudget"] = None) -> Tuple[Optional[Image.Image], Optional[str]]:
+    """
+    Creates a 100x100 RGB thumbnail without decoding more pixels than necessary.
+
+    JPEG images are decoded in draft mode at the smallest scale that still covers the
+    thumbnail, large decoded images are box-reduced by an integer factor before the final
+    resampling. Safe to call from worker threads; errors are returned instead of logged.
+
+    Args:
+        image (bytes | Image.Image): The encoded image, or an already decoded image.
+        budget (MemoryBudget, optional): The budget an encoded image is admitted to before it is decoded.
+
+    Returns:
+        Tuple[Optional[Image.Image], Optional[str]]: The thumbnail, or None and a warning
+        message if the image could not be processed.
+    """
+    reserved = 0
+    try:
+        if isinstance(image, Image.Image):
+            factor = min(image.size) // 100
+            img = image.reduce(factor) if factor >= 2 else image.copy()
+        else:
+            img = Image.open(io.BytesIO(image))
+            img.draft("RGB", (100, 100))
+            if budget is not None:
+                reserved = img.width * img.height * len(img.getbands())
+                budget.acquire(reserved)
+        img = img.convert("RGB")  # Ensure image mode is RGB
+        img.thumbnail((100, 100))  # Creating a thumbnail
+        return img, None
+    except OSError as e:
+        return None, f"Warning: Failed to process an image: {str(e)}"
+    except Exception as e:
+        return None, f"Unexpected error processing an image: {str(e)}"
+    finally:
+        if reserved:
+            budget.release(reserved)
+
+
+class PipelineStats:
+    """
+    Wall time, CPU time, bytes and call counts per pipeline stage, plus run totals.
+
+    Stages are timed with the stage() context manager and may run on several threads;
+    the CPU time is that of the timing thread. Worker processes time their stages in their
+    own instance, which the coordinator adds with merge(). The memory entry holds the
+    budget and peak of decoded pixels of the process that decoded the most.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stages: Dict[str, Dict[str, float]] = {}
+        self.counts: Dict[str, int] = {}
+        self.memory: Dict[str, float] = {"limit": 0, "peak": 0, "waits": 0, "wait_time": 0.0}
+        self.caches: Dict[str, Dict[str, int]] = {}
+        self.wall = 0.0
+        self.cpu = 0.0
+        self._started = time.perf_counter()
+        self._cpu_started = time.process_time()
+
+    @contextlib.contextmanager
+    def stage(self, name: str, bytes_in: int = 0):
         """
-        Filters images based on threshold and duplicate settings.
+        Times one call of a stage.
 
         Args:
-            images (List[Tuple[bytes, float]]): A list of tuples containing image bytes and their sizes in KB.
-            log_callback (callable, optional): A function to log messages.
+            name (str): The name of the stage.
+            bytes_in (int): The number of bytes the stage consumes.
 
-        Returns:
-            List[Tuple[bytes, float]]: A filtered list of image tuples.
+        Yields:
+            Dict: Set "bytes_out" in it to record the number of bytes the stage produced.
+        """
+        sizes = {"bytes_out": 0}
+        wall, cpu = time.perf_counter(), time.thread_time()
+        try:
+            yield sizes
+        finally:
+            self.add(name, time.perf_counter() - wall, time.thread_time() - cpu, bytes_in, sizes["bytes_out"])
+
+    def add(self, name: str, wall: float, cpu: float, bytes_in: int = 0, bytes_out: int = 0, calls: int = 1):
+        """Adds measured calls to a stage. Thread-safe."""
+        with self._lock:
+            totals = self.stages.setdefault(name, {"calls": 0, "wall": 0.0, "cpu": 0.0, "bytes_in": 0, "bytes_out": 0})
+            totals["calls"] += calls
+            totals["wall"] += wall
+            totals["cpu"] += cpu
+            totals["bytes_in"] += bytes_in
+            totals["bytes_out"] += bytes_out
+
+    def merge(self, other: Dict):
         """
-        filtered_images = []
-        self.current_p_hashes = []  # Reset pHashes for thumbnail preview
+        Adds the stages and memory use measured by another instance, for example in a worker process.
 
-        for image_bytes, size in images:
-            if self.options["use_threshold"] and size < self.threshold:
-                continue
+        Args:
+            other (Dict): The to_dict() of the other instance.
+        """
+        for name, totals in other["stages"].items():
+            self.add(name, totals["wall"], totals["cpu"], totals["bytes_in"], totals["bytes_out"], totals["calls"])
+        self.merge_memory(other["memory"])
+        for name, counters in other["caches"].items():
+            self.record_cache(name, counters)
 
-            if self.options["remove_duplicates"]:
-                try:
-                    img = Image.open(io.BytesIO(image_bytes))
-                    img = img.convert("RGB")
-                    hash_to_check = self.phash_image(img)
-                    if self.is_duplicate(hash_to_check):
-                        continue
-                    self.current_p_hashes.append(hash_to_check)
-                except Exception as e:
-                    msg = f"Warning: Failed to process image for duplicate check: {str(e)}"
-                    if log_callback:
-                        log_callback(msg)
-                    else:
-                        print(msg)
-                    continue
+    def record_cache(self, name: str, counters: Dict[str, int]):
+        """
+        Adds the hit, miss and eviction counters of an in-memory cache.
 
-            filtered_images.append((image_bytes, size))
+        Args:
+            name (str): The name of the cache.
+            counters (Dict[str, int]): The counters, for example from MaskCache.counters().
+        """
+        with self._lock:
+            totals = self.caches.setdefault(name, dict.fromkeys(counters, 0))
+            for key, value in counters.items():
+                totals[key] = totals.get(key, 0) + value
 
-        return filtered_images
+    def record_memory(self, budget: "MemoryBudget"):
+        """
+        Adds the peak, limit and admission waits of a memory budget.
 
-    def sort_images_by_size(
-        self, images: List[Tuple[bytes, float]], log_callback=None
-    ) -> List[Tuple[Image.Image, float]]:
+        Args:
+            budget (MemoryBudget): The budget of the decoding process.
         """
-        Sorts images by size in descending order and creates thumbnails.
+        self.merge_memory(
+            {"limit": budget.limit, "peak": budget.peak, "waits": budget.waits, "wait_time": budget.wait_time}
+        )
+
+    def merge_memory(self, memory: Dict[str, float]):
+        with self._lock:
+            self.memory["limit"] = max(self.memory["limit"], memory["limit"])
+            self.memory["peak"] = max(self.memory["peak"], memory["peak"])
+            self.memory["waits"] += memory["waits"]
+            self.memory["wait_time"] += memory["wait_time"]
+
+    def finish(self, counts: Dict[str, int]):
+        """
+        Records the run totals.
 
         Args:
-            images (List[Tuple[bytes, float]]): A list of tuples containing image bytes and their sizes in KB.
-            log_callback (callable, optional): A function to log messages.
+            counts (Dict[str, int]): The image counts of the run.
+        """
+        self.wall = time.perf_counter() - self._started
+        self.cpu = time.process_time() - self._cpu_started
+        self.counts = dict(counts)
 
+    def to_dict(self) -> Dict:
+        """
         Returns:
-            List[Tuple[Image.Image, float]]: A list of tuples containing thumbnail images and their sizes in KB.
+            Dict: The run wall and CPU time (CPU of this process only), the image counts, the
+            totals of every stage, the memory budget and peak in bytes and the cache counters.
         """
-        images.sort(key=lambda x: x[1], reverse=True)  # Sort by size in KB
-        thumbnails = []
-        for image_bytes, size in images:
-            try:
-                img = Image.open(io.BytesIO(image_bytes))
-                img = img.convert("RGB")  # Ensure image mode is RGB
-                img.thumbnail((100, 100))  # Creating a thumbnail
-                thumbnails.append((img, size))
-            except OSError as e:
-                msg = f"Warning: Failed to process an image: {str(e)}"
-                if log_callback:
-                    log_callback(msg)
-                else:
-                    print(msg)
-            except Exception as e:
-                msg = f"Unexpected error processing an image: {str(e)}"
-                if log_callback:
-                    log_callback(msg)
-                else:
-                    print(msg)
-        return thumbnails
+        with self._lock:
+            stages = {name: dict(totals) for name, totals in self.stages.items()}
+            memory = dict(self.memory)
+            caches = {name: dict(counters) for name, counters in self.caches.items()}
+        return {
+            "wall": self.wall,
+            "cpu": self.cpu,
+            "counts": dict(self.counts),
+            "stages": stages,
+            "memory": memory,
+            "caches": caches,
+        }
 
-    def create_thumb_sheet(self, images: List[Tuple[Image.Image, float]]) -> str:
+    def write_json(self, path: str):
         """
-        Creates a thumbnail sheet from a list of images and saves it as an image.
+        Writes to_dict() to a JSON file.
 
         Args:
-            images (List[Tuple[Image.Image, float]]): A list of tuples containing images and their sizes in KB.
-
-        Raises:
-            ValueError: If the images list is empty.
-            IOError: If saving the thumbnail sheet fails.
-
-        Returns:
-            str: The path to the saved thumbnail sheet.
+            path (str): The path of the file.
         """
-        if not images:
-            raise ValueError("No images to create thumbnail sheet.")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, indent=2)
 
-        thumb_width, thumb_height = 100, 100
-        max_thumbs_per_row = 10
 
-        # Calculate the number of rows needed
-        num_rows = (len(images) - 1) // max_thumbs_per_row + 1
+def timed(stats: Optional[PipelineStats], name: str, bytes_in: int = 0):
+    """
+    Times a stage if stats are collected.
 
-        sheet_width = thumb_width * min(len(images), max_thumbs_per_row)
-        sheet_height = (thumb_height + 20) * num_rows  # Extra height for labels
+    Args:
+        stats (PipelineStats, optional): Where to record the stage, or None to not time it.
+        name (str): The name of the stage.
+        bytes_in (int): The number of bytes the stage consumes.
 
-        sheet = Image.new("RGB", (sheet_width, sheet_height))
-        draw = ImageDraw.Draw(sheet)
-        font = ImageFont.load_default()
+    Returns:
+        A context manager yielding a dict to set "bytes_out" in.
+    """
+    if stats is None:
+        return contextlib.nullcontext({"bytes_out": 0})
+    return stats.stage(name, bytes_in)
 
-        for index, (img, size) in enumerate(images):
-            row = index // max_thumbs_per_row
-            col = index % max_thumbs_per_row
-            x_offset = col * thumb_width
-            y_offset = row * (thumb_height + 20)
 
-            sheet.paste(img, (x_offset, y_offset))
-            draw.text(
-                (x_offset, y_offset + thumb_height + 5),
-                f"{size:.2f} KB",
-                fill="white",
-                font=font,
-            )
+class MemoryBudget:
+    """
+    Admission control for the bytes of decoded pixels held at the same time.
 
-        thumbnail_sheet_path = os.path.join(self.pdf_directory, "thumbnail_sheet.png")
-        try:
-            sheet.save(thumbnail_sheet_path)
-        except Exception as e:
-            raise IOError(f"Failed to save thumbnail sheet: {str(e)}")
-        return thumbnail_sheet_path
+    A new image has to be admitted before its first decode: acquire() blocks while its
+    bytes would push the total over the limit. Bytes added to an already admitted image,
+    such as its soft mask or the copy handed to the writer, are never blocked, so an image
+    that holds memory can always finish and release it. An image larger than the whole
+    budget is admitted once nothing else is held. A limit of 0 only records the peak.
+    """
 
-    def create_thumbnail_preview(self, log_callback=None):
+    def __init__(self, limit: int = 0):
+        self.limit = max(0, int(limit))
+        self.in_use = 0
+        self.peak = 0
+        self.waits = 0
+        self.wait_time = 0.0
+        self._condition = threading.Condition()
+
+    def acquire(self, nbytes: int, admitted: bool = False):
         """
-        Creates a thumbnail preview of the selected PDF file, respecting threshold and duplicate settings.
+        Reserves bytes of decoded pixels, waiting until they fit into the budget.
 
         Args:
-            log_callback (callable, optional): A function to log messages.
+            nbytes (int): The number of bytes to reserve.
+            admitted (bool): Whether the caller already holds bytes for the same image, in
+                which case it does not wait.
+        """
+        with self._condition:
+            if not admitted and self.limit and self.in_use and self.in_use + nbytes > self.limit:
+                self.waits += 1
+                started = time.perf_counter()
+                while self.in_use and self.in_use + nbytes > self.limit:
+                    self._condition.wait()
+                self.wait_time += time.perf_counter() - started
+            self.in_use += nbytes
+            self.peak = max(self.peak, self.in_use)
+
+    def release(self, nbytes: int):
+        """Returns reserved bytes to the budget and wakes waiting decodes."""
+        with self._condition:
+            self.in_use = max(0, self.in_use - nbytes)
+            self._condition.notify_all()
+
+
+class MaskCache:
+    """
+    Least recently used cache of the decoded soft masks of one document.
 
-        Raises:
-            ValueError: If no PDF file is selected.
+    Many images of a document can share one soft mask, for example a rounded-corner frame,
+    so each mask is decoded only once, as a single-channel pixmap. Masks are kept up to
+    max_bytes of samples; the cache empties itself when it is used with another document.
+    Like all pymupdf objects, it is only used from the thread that owns the document.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._doc: Optional[pymupdf.Document] = None
+        self._entries: "OrderedDict[int, pymupdf.Pixmap]" = OrderedDict()
+
+    def get(self, doc: pymupdf.Document, xref: int, stats: Optional[PipelineStats] = None) -> pymupdf.Pixmap:
+        """
+        Returns the decoded soft mask, decoding and caching it on the first request.
+
+        Args:
+            doc (pymupdf.Document): The PDF document object.
+            xref (int): The reference number of the soft mask.
+            stats (PipelineStats, optional): Where to time the decode.
 
         Returns:
-            str: The path to the created thumbnail sheet.
+            pymupdf.Pixmap: The mask as a pixmap with one channel and no alpha.
         """
-        if not self.pdf_path:
-            raise ValueError("No PDF file selected.")
+        if doc is not self._doc:
+            self.clear()
+            self._doc = doc
+        mask = self._entries.get(xref)
+        if mask is not None:
+            self._entries.move_to_end(xref)
+            self.hits += 1
+            return mask
+
+        self.misses += 1
+        with timed(stats, "decode_smask") as sizes:
+            # Decoding the xref keeps its colorspace; the stream from extract_image can come
+            # back as RGB for ICC-based gray masks
+            mask = pymupdf.Pixmap(doc, xref)
+            if mask.alpha:
+                mask = pymupdf.Pixmap(mask, 0)
+            if mask.n != 1:
+                mask = pymupdf.Pixmap(pymupdf.csGRAY, mask)
+            sizes["bytes_out"] = len(mask.samples_mv)
+        nbytes = len(mask.samples_mv)
+        if nbytes <= self.max_bytes:
+            self._entries[xref] = mask
+            self.size += nbytes
+            while self.size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted.samples_mv)
+                self.evictions += 1
+        return mask
+
+    def counters(self) -> Dict[str, int]:
+        """Returns the hit, miss and eviction counts."""
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+    def clear(self):
+        """Drops all cached masks."""
+        self._entries.clear()
+        self.size = 0
+        self._doc = None
+
+
+# PIL save arguments of every PNG file not encoded by pymupdf: output presets, thumbnail
+# sheets and cached thumbnails. zlib level 1 keeps PIL close to the speed of pymupdf
+PNG_SAVE_ARGUMENTS = {"format": "PNG", "compress_level": 1}
+
+# Output encoder presets: file extension and PIL save arguments, see OutputEncoder. None
+# selects pymupdf's own PNG encoder, the fastest one, see PDFImageExtractor.save_image
+OUTPUT_PRESETS = {
+    "png": ("png", None),
+    "png-fast": ("png", PNG_SAVE_ARGUMENTS),
+    "jpeg-hq": ("jpg", {"format": "JPEG", "quality": 95, "subsampling": 0}),
+    "webp": ("webp", {"format": "WEBP", "quality": 90, "method": 4}),
+    "webp-lossless": ("webp", {"format": "WEBP", "lossless": True, "quality": 80, "method": 4}),
+}
+
+# Source codecs, as named by Document.extract_image, that the "auto" preset writes as JPEG
+LOSSY_SOURCES = ("jpeg", "jpg", "jpx")
+
+
+class OutputEncoder:
+    """
+    Chooses the format and encoder settings of decoded output images.
+
+    The preset is one of OUTPUT_PRESETS or "auto", which writes images decoded from lossy
+    JPEG and JPEG 2000 streams as high-quality JPEG and everything else as PNG. Images with
+    transparency are never written as JPEG. The quality (JPEG, WebP) and the zlib
+    compression level (PNG) of the preset can be overridden; a compression level makes
+    the pymupdf-encoded "png" preset use PIL with PNG_SAVE_ARGUMENTS.
+    """
 
-        extracted_images = self.extract_images()
-        filtered_images = self.filter_images(extracted_images, log_callback)
-        sorted_images = self.sort_images_by_size(filtered_images, log_callback)
-        return self.create_thumb_sheet(sorted_images)
+    def __init__(self, preset: str = "png", quality: int = 0, compress_level: int = -1):
+        if preset != "auto" and preset not in OUTPUT_PRESETS:
+            raise ValueError(f"Unknown output preset: {preset}")
+        self.preset = preset
+        self.quality = quality
+        self.compress_level = compress_level
 
-    def extract_and_save_images(self, log_callback=None):
+    def settings_for(self, source_ext: Optional[str] = None, alpha: bool = False) -> Tuple[str, Optional[Dict]]:
         """
-        Extracts and saves images from the selected PDF file.
+        Returns the file extension and PIL save arguments for one image.
 
         Args:
-            log_callback (callable, optional): A function to log messages.
+            source_ext (str, optional): The extension of the source stream, for example "jpeg".
+            alpha (bool): Whether the image has an alpha channel.
 
-        Raises:
-            ValueError: If no PDF file is selected or no output folder is specified.
+        Returns:
+            Tuple[str, Optional[Dict]]: The file extension and the arguments for Image.save,
+            or None for pymupdf's PNG encoder.
+        """
+        preset = self.preset
+        if preset == "auto":
+            preset = "jpeg-hq" if source_ext in LOSSY_SOURCES else "png"
+        if alpha and preset == "jpeg-hq":
+            preset = "png"
+        extension, arguments = OUTPUT_PRESETS[preset]
+        if arguments is None:
+            if self.compress_level < 0:
+                return extension, None
+            arguments = PNG_SAVE_ARGUMENTS
+        arguments = dict(arguments)
+        if self.quality > 0 and "quality" in arguments and not arguments.get("lossless"):
+            arguments["quality"] = self.quality
+        if self.compress_level >= 0 and "compress_level" in arguments:
+            arguments["compress_level"] = self.compress_level
+        return extension, arguments
+
+
+class AsyncImageWriter:
+    """
+    Encodes and writes output images on a bounded thread pool.
+
+    submit() blocks while max_pending writes are queued or running, so decoding can never
+    run arbitrarily far ahead of the disk. Only PIL images and raw bytes are handed to the
+    threads; pymupdf objects stay on the submitting thread. Write errors are collected and
+    reported through log_callback on the submitting thread, at the next submit() or close().
+    Bytes reserved in a memory budget for a submitted image are released once it is written.
+    """
+
+    def __init__(
+        self,
+        threads: int = 2,
+        max_pending: int = 8,
+        log_callback=None,
+        stats: Optional[PipelineStats] = None,
+        budget: Optional[MemoryBudget] = None,
+    ):
+        self.stats = stats
+        self.budget = budget
+        self._executor = ThreadPoolExecutor(max_workers=max(1, threads), thread_name_prefix="image-writer")
+        self._slots = threading.BoundedSemaphore(max(1, max_pending))
+        self._lock = threading.Lock()
+        self._new_errors: List[Tuple[str, str]] = []
+        self._pending = set()
+        self._unreturned: List[Tuple[str, str]] = []
+        self.failed: List[Tuple[str, str]] = []
+        self.log_callback = log_callback
+
+    def submit(self, output_path: str, data, reserved: int = 0, save_arguments: Optional[Dict] = None):
+        """
+        Queues one output file, waiting for a free slot if the queue is full.
+
+        Args:
+            output_path (str): The path of the file to write.
+            data (bytes | Image.Image): Encoded bytes to write as they are, or an image to encode.
+            reserved (int): The bytes reserved in the memory budget for data, released after writing.
+            save_arguments (Dict, optional): The Image.save arguments of an image, PNG by default.
+        """
+        self.report_errors()
+        self._slots.acquire()
+        try:
+            future = self._executor.submit(self._write, output_path, data, self.stats, save_arguments)
+        except Exception:
+            self._slots.release()
+            if reserved and self.budget is not None:
+                self.budget.release(reserved)
+            raise
+        with self._lock:
+            self._pending.add(future)
+        future.add_done_callback(lambda f: self._finish(output_path, f, reserved))
+
+    @staticmethod
+    def _write(output_path: str, data, stats: Optional[PipelineStats] = None, save_arguments: Optional[Dict] = None):
+        bytes_in = len(data) if isinstance(data, bytes) else 0
+        # Written under a unique temporary name, so readers and concurrent writers of the same
+        # content object, in this or another worker process, never see a partial file
+        temp_path = f"{output_path}.{os.getpid()}-{threading.get_ident()}.part"
+        with timed(stats, "write", bytes_in) as sizes:
+            try:
+                if isinstance(data, Image.Image):
+                    data.save(temp_path, **(save_arguments or PNG_SAVE_ARGUMENTS))
+                else:
+                    with open(temp_path, "wb") as f:
+                        f.write(data)
+                os.replace(temp_path, output_path)
+            finally:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+            sizes["bytes_out"] = os.path.getsize(output_path)
+
+    def _finish(self, output_path: str, future, reserved: int = 0):
+        error = future.exception()
+        if reserved and self.budget is not None:
+            self.budget.release(reserved)
+        with self._lock:
+            self._pending.discard(future)
+            if error is not None:
+                self._new_errors.append((output_path, str(error)))
+        self._slots.release()
+
+    def report_errors(self):
+        """Logs the write errors collected since the last call."""
+        with self._lock:
+            errors, self._new_errors = self._new_errors, []
+        for output_path, error in errors:
+            self.failed.append((output_path, error))
+            self._unreturned.append((output_path, error))
+            msg = f"Warning: Failed to write {os.path.basename(output_path)}: {error}"
+            if self.log_callback:
+                self.log_callback(msg)
+            else:
+                print(msg)
+
+    def _take_failures(self) -> List[Tuple[str, str]]:
+        self.report_errors()
+        failures, self._unreturned = self._unreturned, []
+        return failures
+
+    def flush(self) -> List[Tuple[str, str]]:
+        """
+        Waits until every file queued so far is written, keeping the thread pool running.
+
+        Returns:
+            List[Tuple[str, str]]: The path and error message of every failed write not
+            returned by an earlier flush().
+        """
+        with self._lock:
+            pending = list(self._pending)
+        wait(pending)
+        return self._take_failures()
+
+    def close(self) -> List[Tuple[str, str]]:
+        """
+        Waits until every queued file is written and shuts the thread pool down.
+
+        Returns:
+            List[Tuple[str, str]]: The path and error message of every failed write not
+            returned by flush().
+        """
+        self._executor.shutdown(wait=True)
+        return self._take_failures()
+
+
+class ImageStage:
+    """
+    Carries one PDF image through the extraction pipeline.
+
+    The raw image stream is extracted from the document at most once and decoded at most
+    once into a shared pixmap. The threshold check, the pHash and the writer all read from
+    the same buffers instead of extracting and decoding the image again. The size, the
+    dimensions and the pHash survive release() and can be pre-filled from the image cache,
+    in which case the image is not extracted at all until its pixels are needed. With a
+    memory budget, the stage is admitted before its first decode and holds its decoded
+    bytes in the budget until release().
+    """
+
+    def __init__(
+        self,
+        doc: pymupdf.Document,
+        xref: int,
+        smask: int = 0,
+        stats: Optional[PipelineStats] = None,
+        budget: Optional[MemoryBudget] = None,
+    ):
+        self.doc = doc
+        self.xref = xref
+        self.smask = smask
+        self.stats = stats
+        self.budget = budget
+        self.reserved = 0  # Bytes this stage holds in the memory budget
+        self.width: Optional[int] = None
+        self.height: Optional[int] = None
+        self.p_hash: Optional[imagehash.ImageHash] = None
+        self.cached: Optional[Dict] = None  # The image cache entry this stage was filled from
+        self._size_kb: Optional[float] = None
+        self._base_image: Optional[Dict] = None
+        self._pixmap: Optional[pymupdf.Pixmap] = None
+        self._pil_image: Optional[Image.Image] = None
+        self._pil_source: Optional[pymupdf.Pixmap] = None
+
+    @property
+    def base_image(self) -> Dict:
+        """The dictionary returned by doc.extract_image, extracted on first access."""
+        if self._base_image is None:
+            with timed(self.stats, "extract_image") as sizes:
+                self._base_image = self.doc.extract_image(self.xref)
+                sizes["bytes_out"] = len(self._base_image["image"])
+            self._size_kb = len(self._base_image["image"]) / 1024
+            self.width = self._base_image.get("width")
+            self.height = self._base_image.get("height")
+        return self._base_image
+
+    @property
+    def image_bytes(self) -> bytes:
+        """The encoded image stream."""
+        return self.base_image["image"]
+
+    @property
+    def size_kb(self) -> float:
+        """The size of the encoded image stream in KB."""
+        if self._size_kb is None:
+            self._size_kb = len(self.image_bytes) / 1024
+        return self._size_kb
+
+    @size_kb.setter
+    def size_kb(self, value: float):
+        self._size_kb = value
+
+    @property
+    def known_size_kb(self) -> Optional[float]:
+        """The size in KB if it was extracted or taken from the cache, without extracting the image."""
+        return self._size_kb
+
+    def reserve(self, nbytes: int):
+        """
+        Reserves decoded bytes for this image in the memory budget, if there is one.
+
+        The first reservation waits for admission; later ones are added right away.
+
+        Args:
+            nbytes (int): The number of bytes to reserve.
+        """
+        if self.budget is not None and nbytes > 0:
+            self.budget.acquire(nbytes, admitted=self.reserved > 0)
+            self.reserved += nbytes
+
+    @property
+    def pixmap(self) -> pymupdf.Pixmap:
+        """The decoded image without soft mask, decoded on first access."""
+        if self._pixmap is None:
+            base_image = self.base_image
+            image_bytes = base_image["image"]
+            # Admit the decode with an estimate from the stream dimensions, corrected afterwards
+            estimate = (self.width or 0) * (self.height or 0) * max(1, base_image.get("colorspace") or 1)
+            self.reserve(estimate)
+            with timed(self.stats, "decode", len(image_bytes)) as sizes:
+                self._pixmap = pymupdf.Pixmap(image_bytes)
+                sizes["bytes_out"] = len(self._pixmap.samples_mv)
+            self.reserve(sizes["bytes_out"] - estimate)
+        return self._pixmap
+
+    @property
+    def pil_image(self) -> Image.Image:
+        """A PIL view of the decoded pixmap, sharing its sample buffer where possible."""
+        if self._pil_image is None:
+            self._pil_image, self._pil_source = pixmap_to_image(self.pixmap)
+        return self._pil_image
+
+    @property
+    def decoded_image(self) -> Optional[Image.Image]:
+        """The PIL view of the pixmap if it was already created, without decoding the image."""
+        return self._pil_image
+
+    def reduced_image(self, min_size: int) -> Image.Image:
+        """
+        Decodes the image at the lowest resolution that keeps both sides at least min_size pixels.
+
+        Large JPEG streams are decoded by PIL in draft mode at 1/2, 1/4 or 1/8 scale, so most
+        of the pixels are never decoded. Other images are decoded into the shared pixmap,
+        which is needed for writing anyway, and reduced by an integer factor with box
+        averaging. The reduced image is not kept by the stage.
+
+        Args:
+            min_size (int): The smallest acceptable width and height.
+
+        Returns:
+            Image.Image: The reduced image, or the full image if it is already small.
+        """
+        base_image = self.base_image
+        if (
+            self._pil_image is None
+            and base_image["ext"] in ("jpeg", "jpg")
+            and min(self.width, self.height) >= 2 * min_size
+        ):
+            with timed(self.stats, "decode_reduced", len(base_image["image"])):
+                image = Image.open(io.BytesIO(base_image["image"]))
+                image.draft(image.mode, (min_size, min_size))
+                self.reserve(image.width * image.height * len(image.getbands()))
+                image.load()
+            return image
+
+        image = self.pil_image
+        factor = min(image.size) // min_size
+        if factor >= 2:
+            image = image.reduce(factor)
+        return image
+
+    def release(self):
+        """Drops the extracted and decoded buffers, keeping size, dimensions and pHash."""
+        self._base_image = None
+        self._pixmap = None
+        self._pil_image = None
+        self._pil_source = None
+        if self.reserved:
+            self.budget.release(self.reserved)
+            self.reserved = 0
+
+
+class ImageRecord(ImageStage):
+    """
+    Lightweight description of one image found while iterating over a PDF.
+
+    The encoded bytes are fetched from the still open document on first access and
+    dropped again by release(). The size is remembered after the bytes are released.
+    """
+
+    def __init__(
+        self,
+        doc: pymupdf.Document,
+        page_index: int,
+        xref: int,
+        smask: int = 0,
+        metadata: Optional[Tuple] = None,
+        stats: Optional[PipelineStats] = None,
+        budget: Optional[MemoryBudget] = None,
+    ):
+        super().__init__(doc, xref, smask, stats, budget)
+        self.page_index = page_index
+        self.metadata = metadata  # The entry of Page.get_images() describing the image
+
+
+# Image filters whose stream Document.extract_image returns unchanged, so the stream length
+# is exactly the size the threshold is compared against
+PASSTHROUGH_FILTERS = ("DCTDecode", "JPXDecode")
+
+
+def stream_length(doc: pymupdf.Document, xref: int) -> Optional[int]:
+    """
+    Reads the length of a stream from its dictionary, without reading the stream.
+
+    Args:
+        doc (pymupdf.Document): The PDF document object.
+        xref (int): The reference number of the stream object.
+
+    Returns:
+        Optional[int]: The /Length of the stream in bytes, or None if it is missing or invalid.
+    """
+    kind, value = doc.xref_get_key(xref, "Length")
+    if kind == "xref":
+        # Indirect length such as "12 0 R"
+        value = doc.xref_object(int(value.split()[0]), compressed=True)
+    try:
+        return int(value)
+    except ValueError:
+        return None
+
+
+def hash_to_int(p_hash: imagehash.ImageHash) -> int:
+    """
+    Packs the bits of a pHash into a Python integer.
+
+    Args:
+        p_hash (imagehash.ImageHash): The hash to pack.
+
+    Returns:
+        int: The hash bits as an integer, so that the Hamming distance is (a ^ b).bit_count().
+    """
+    return int.from_bytes(np.packbits(p_hash.hash.flatten()).tobytes(), "big")
+
+
+class LinearHashIndex:
+    """
+    Stores pHashes in insertion order and compares every stored hash on each lookup.
+    """
+
+    def __init__(self):
+        self._hashes: List[imagehash.ImageHash] = []
+
+    def add(self, p_hash: imagehash.ImageHash):
+        self._hashes.append(p_hash)
+
+    def find(self, p_hash: imagehash.ImageHash, radius: int) -> Optional[imagehash.ImageHash]:
+        """
+        Finds the earliest added hash within the given Hamming distance.
+
+        Args:
+            p_hash (imagehash.ImageHash): The hash to look up.
+            radius (int): The maximum Hamming distance of a match.
+
+        Returns:
+            Optional[imagehash.ImageHash]: The matching hash, or None if there is no match.
+        """
+        for existing_hash in self._hashes:
+            if (p_hash - existing_hash) <= radius:
+                return existing_hash
+        return None
+
+    def __len__(self) -> int:
+        return len(self._hashes)
+
+    def __iter__(self) -> Iterator[imagehash.ImageHash]:
+        return iter(self._hashes)
+
+
+class BKTreeHashIndex:
+    """
+    Burkhard-Keller tree over pHashes in Hamming space.
+
+    Every child of a node is keyed by its distance to that node, so a radius query only
+    descends into children whose key lies within [d - radius, d + radius] of the query
+    distance d. Lookups return the earliest added match, exactly like LinearHashIndex.
+    """
+
+    def __init__(self):
+        # Node layout: [hash as int, insertion order, ImageHash, {distance: child node}]
+        self._root: Optional[list] = None
+        self._hashes: List[imagehash.ImageHash] = []
+
+    def add(self, p_hash: imagehash.ImageHash):
+        key = hash_to_int(p_hash)
+        node = [key, len(self._hashes), p_hash, {}]
+        self._hashes.append(p_hash)
+        if self._root is None:
+            self._root = node
+            return
+
+        current = self._root
+        while True:
+            distance = (key ^ current[0]).bit_count()
+            child = current[3].get(distance)
+            if child is None:
+                current[3][distance] = node
+                return
+            current = child
+
+    def find(self, p_hash: imagehash.ImageHash, radius: int) -> Optional[imagehash.ImageHash]:
+        """
+        Finds the earliest added hash within the given Hamming distance.
+
+        Args:
+            p_hash (imagehash.ImageHash): The hash to look up.
+            radius (int): The maximum Hamming distance of a match.
+
+        Returns:
+            Optional[imagehash.ImageHash]: The matching hash, or None if there is no match.
+        """
+        if self._root is None:
+            return None
+
+        key = hash_to_int(p_hash)
+        best = None
+        stack = [self._root]
+        while stack:
+            node = stack.pop()
+            distance = (key ^ node[0]).bit_count()
+            if distance <= radius and (best is None or node[1] < best[1]):
+                best = node
+            for child_distance, child in node[3].items():
+                if distance - radius <= child_distance <= distance + radius:
+                    stack.append(child)
+        return best[2] if best is not None else None
+
+    def __len__(self) -> int:
+        return len(self._hashes)
+
+    def __iter__(self) -> Iterator[imagehash.ImageHash]:
+        return iter(self._hashes)
+
+
+# Number of set bits for every byte value, used when numpy has no bitwise_count
+_POPCOUNT_TABLE = np.array([bin(value).count("1") for value in range(256)], dtype=np.uint8)
+
+
+def _popcount(values: np.ndarray) -> np.ndarray:
+    """Counts the set bits of every element of an unsigned integer array."""
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(values)
+    counts = _POPCOUNT_TABLE[values.view(np.uint8)]
+    return counts.reshape(values.shape + (values.dtype.itemsize,)).sum(axis=-1)
+
+
+class ArrayHashIndex:
+    """
+    Stores pHashes packed into one contiguous NumPy array.
+
+    64-bit hashes (phash_size 8) are kept as a uint64 vector, larger hashes as uint8 rows.
+    A lookup is a single vectorized XOR + popcount against the whole store, and each hash
+    costs only its packed size in memory. Lookups return the earliest added match, exactly
+    like LinearHashIndex.
+    """
+
+    def __init__(self, initial_capacity: int = 1024):
+        self._store: Optional[np.ndarray] = None
+        self._count = 0
+        self._shape: Optional[Tuple[int, ...]] = None
+        self._initial_capacity = initial_capacity
+
+    def _pack(self, p_hash: imagehash.ImageHash) -> np.ndarray:
+        packed = np.packbits(p_hash.hash.flatten())
+        if packed.size == 8:
+            return packed.view(">u8").astype(np.uint64)[0]
+        return packed
+
+    def _unpack(self, packed: np.ndarray) -> imagehash.ImageHash:
+        if packed.dtype == np.uint64:
+            packed = np.array([packed], dtype=">u8").view(np.uint8)
+        bits = np.unpackbits(packed)[: int(np.prod(self._shape))]
+        return imagehash.ImageHash(bits.astype(bool).reshape(self._shape))
+
+    def add(self, p_hash: imagehash.ImageHash):
+        packed = self._pack(p_hash)
+        if self._store is None:
+            self._shape = p_hash.hash.shape
+            self._store = np.zeros((self._initial_capacity,) + packed.shape, dtype=packed.dtype)
+        elif self._count == len(self._store):
+            self._store = np.concatenate([self._store, np.zeros_like(self._store)])
+        self._store[self._count] = packed
+        self._count += 1
+
+    def find(self, p_hash: imagehash.ImageHash, radius: int) -> Optional[imagehash.ImageHash]:
+        """
+        Finds the earliest added hash within the given Hamming distance.
+
+        Args:
+            p_hash (imagehash.ImageHash): The hash to look up.
+            radius (int): The maximum Hamming distance of a match.
+
+        Returns:
+            Optional[imagehash.ImageHash]: The matching hash, or None if there is no match.
+        """
+        if self._count == 0:
+            return None
+        if p_hash.hash.shape != self._shape:
+            raise TypeError("ImageHashes must be of the same shape.", p_hash.hash.shape, self._shape)
+
+        distances = _popcount(self._store[: self._count] ^ self._pack(p_hash))
+        if distances.ndim > 1:
+            distances = distances.sum(axis=1, dtype=np.int64)
+        matches = np.flatnonzero(distances <= radius)
+        if matches.size == 0:
+            return None
+        return self._unpack(self._store[matches[0]])
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __iter__(self) -> Iterator[imagehash.ImageHash]:
+        for position in range(self._count):
+            yield self._unpack(self._store[position])
+
+
+# Near-duplicate index implementations selectable through the 'hash_index' option
+HASH_INDEXES = {
+    "linear": LinearHashIndex,
+    "bktree": BKTreeHashIndex,
+    "array": ArrayHashIndex,
+}
+
+
+_fingerprints: Dict[Tuple[str, int, float], str] = {}
+
+
+def document_fingerprint(pdf_path: str) -> str:
+    """
+    Computes a fingerprint of the PDF file content.
+
+    The SHA-256 of the file is memoized per path, size and modification time, so repeated
+    calls for an unchanged file within one process do not read it again.
+
+    Args:
+        pdf_path (str): The path to the PDF file.
+
+    Returns:
+        str: The hex digest of the file content.
+    """
+    stat = os.stat(pdf_path)
+    key = (os.path.abspath(pdf_path), stat.st_size, stat.st_mtime)
+    if key not in _fingerprints:
+        digest = hashlib.sha256()
+        with open(pdf_path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(block)
+        _fingerprints[key] = digest.hexdigest()
+    return _fingerprints[key]
+
+
+class ImageCache:
+    """
+    Persistent SQLite cache of image sizes, dimensions, pHashes and preview thumbnails.
+
+    Entries are keyed by document fingerprint, xref and pHash size, so they stay valid
+    when the threshold or duplicate settings change. Thumbnails are keyed by document
+    fingerprint and xref. When the cache grows beyond max_entries images or
+    max_thumbnails thumbnails, the least recently used entries are evicted on commit().
+
+    The GUI runs every preview and extraction on a new thread, so the connection may be
+    used from several threads; a lock keeps them from using it at the same time.
+    """
+
+    def __init__(self, cache_dir: str, max_entries: int = 200000, max_thumbnails: int = 20000):
+        os.makedirs(cache_dir, exist_ok=True)
+        self.path = os.path.join(cache_dir, "image_cache.sqlite")
+        self.max_entries = max_entries
+        self.max_thumbnails = max_thumbnails
+        self._lock = threading.Lock()
+        self.connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS images ("
+            "fingerprint TEXT, xref INTEGER, phash_size INTEGER, size_kb REAL, width INTEGER, "
+            "height INTEGER, hash TEXT, last_used REAL, PRIMARY KEY (fingerprint, xref, phash_size))"
+        )
+        self.connection.execute("CREATE INDEX IF NOT EXISTS images_last_used ON images (last_used)")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS thumbnails ("
+            "fingerprint TEXT, xref INTEGER, data BLOB, last_used REAL, PRIMARY KEY (fingerprint, xref))"
+        )
+        self.connection.execute("CREATE INDEX IF NOT EXISTS thumbnails_last_used ON thumbnails (last_used)")
+        self.connection.commit()
+
+    def get(self, fingerprint: str, xref: int, phash_size: int) -> Optional[Dict]:
+        """
+        Looks up an image and marks it as recently used.
+
+        Args:
+            fingerprint (str): The document fingerprint.
+            xref (int): The reference number of the image.
+            phash_size (int): The pHash size the hash was computed with.
+
+        Returns:
+            Optional[Dict]: The size_kb, width, height and hash (hex or None), or None if not cached.
+        """
+        with self._lock:
+            key = (fingerprint, xref, phash_size)
+            row = self.connection.execute(
+                "SELECT size_kb, width, height, hash FROM images WHERE fingerprint=? AND xref=? AND phash_size=?", key
+            ).fetchone()
+            if row is None:
+                return None
+            self.connection.execute(
+                "UPDATE images SET last_used=? WHERE fingerprint=? AND xref=? AND phash_size=?", (time.time(),) + key
+            )
+            return {"size_kb": row[0], "width": row[1], "height": row[2], "hash": row[3]}
+
+    def put(
+        self,
+        fingerprint: str,
+        xref: int,
+        phash_size: int,
+        size_kb: float,
+        width: Optional[int],
+        height: Optional[int],
+        p_hash: Optional[str],
+    ):
+        """
+        Stores or replaces the entry of an image.
+
+        Args:
+            fingerprint (str): The document fingerprint.
+            xref (int): The reference number of the image.
+            phash_size (int): The pHash size the hash was computed with.
+            size_kb (float): The size of the encoded image in KB.
+            width (Optional[int]): The image width in pixels.
+            height (Optional[int]): The image height in pixels.
+            p_hash (Optional[str]): The pHash as hex string, or None if it was not computed.
+        """
+        with self._lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO images VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (fingerprint, xref, phash_size, size_kb, width, height, p_hash, time.time()),
+            )
+
+    def get_thumbnail(self, fingerprint: str, xref: int) -> Optional[Image.Image]:
+        """
+        Looks up the preview thumbnail of an image and marks it as recently used.
+
+        Args:
+            fingerprint (str): The document fingerprint.
+            xref (int): The reference number of the image.
+
+        Returns:
+            Optional[Image.Image]: The thumbnail, or None if not cached.
+        """
+        with self._lock:
+            key = (fingerprint, xref)
+            row = self.connection.execute("SELECT data FROM thumbnails WHERE fingerprint=? AND xref=?", key).fetchone()
+            if row is None:
+                return None
+            self.connection.execute(
+                "UPDATE thumbnails SET last_used=? WHERE fingerprint=? AND xref=?", (time.time(),) + key
+            )
+        thumbnail = Image.open(io.BytesIO(row[0]))
+        thumbnail.load()
+        return thumbnail
+
+    def put_thumbnail(self, fingerprint: str, xref: int, thumbnail: Image.Image):
+        """
+        Stores or replaces the preview thumbnail of an image.
+
+        Args:
+            fingerprint (str): The document fingerprint.
+            xref (int): The reference number of the image.
+            thumbnail (Image.Image): The thumbnail, stored losslessly as PNG.
+        """
+        buffer = io.BytesIO()
+        thumbnail.save(buffer, **PNG_SAVE_ARGUMENTS)
+        with self._lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO thumbnails VALUES (?, ?, ?, ?)",
+                (fingerprint, xref, buffer.getvalue(), time.time()),
+            )
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self.connection.execute("SELECT COUNT(*) FROM images").fetchone()[0]
+
+    def commit(self):
+        """Evicts the least recently used entries beyond max_entries and max_thumbnails and commits."""
+        with self._lock:
+            for table, limit in (("images", self.max_entries), ("thumbnails", self.max_thumbnails)):
+                excess = self.connection.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] - limit
+                if excess > 0:
+                    self.connection.execute(
+                        f"DELETE FROM {table} WHERE rowid IN (SELECT rowid FROM {table} ORDER BY last_used LIMIT ?)",
+                        (excess,),
+                    )
+            self.connection.commit()
+
+    def close(self):
+        self.commit()
+        with self._lock:
+            self.connection.close()
+
+
+class DocumentSession:
+    """
+    Analysis of one PDF shared between the thumbnail preview and the extraction.
+
+    The preview stores the analysis of every image xref (in the format of
+    PDFImageExtractor.analyze_image) together with the document fingerprint and the
+    result settings it was made with. As long as both are unchanged, the extraction
+    makes its decisions from the session and only decodes and writes the kept images.
+    """
+
+    def __init__(self, fingerprint: str, settings: Dict):
+        self.fingerprint = fingerprint
+        self.settings = settings
+        self.analyses: Dict[int, Dict] = {}
+        self.kept: List[int] = []  # Xrefs kept by the preview, in page order
+
+    def matches(self, fingerprint: str, settings: Dict) -> bool:
+        """
+        Checks whether the session is valid for a document and settings.
+
+        Args:
+            fingerprint (str): The fingerprint of the selected PDF file.
+            settings (Dict): The current result settings.
+
+        Returns:
+            bool: True if the analysis can be reused, False otherwise.
+        """
+        return fingerprint == self.fingerprint and settings == self.settings
+
+
+class ExtractionCancelled(Exception):
+    """Raised at the next image boundary after PDFImageExtractor.cancel() was called."""
+
+
+class ProgressTracker:
+    """
+    Measures the progress of a preview or extraction run.
+
+    Snapshots with the pages done, the throughput in images and megabytes per second and
+    the estimated time remaining are passed to a callback, at most once per interval
+    seconds. The callback is called on the thread doing the work.
+    """
+
+    def __init__(self, page_count: int, callback=None, interval: float = 0.25):
+        self.page_count = page_count
+        self.callback = callback
+        self.interval = interval
+        self.pages_done = 0
+        self.images = 0
+        self.bytes = 0
+        self.started = time.perf_counter()
+        self._last_report = 0.0
+
+    def update(self, pages_done: Optional[int] = None, images: int = 0, nbytes: int = 0, force: bool = False):
+        """
+        Records progress and reports a snapshot if the interval has passed.
+
+        Args:
+            pages_done (int, optional): The number of completed pages, if it changed.
+            images (int): The number of images processed since the last update.
+            nbytes (int): The number of encoded image bytes processed since the last update.
+            force (bool): Whether to report even if the interval has not passed.
+        """
+        if pages_done is not None:
+            self.pages_done = pages_done
+        self.images += images
+        self.bytes += nbytes
+        now = time.perf_counter()
+        if self.callback is not None and (force or now - self._last_report >= self.interval):
+            self._last_report = now
+            self.callback(self.snapshot())
+
+    def snapshot(self) -> Dict:
+        """
+        Returns:
+            Dict: The pages done, page count, images, elapsed seconds, images per second,
+            megabytes per second and the estimated seconds remaining (None until a page is done).
+        """
+        elapsed = max(time.perf_counter() - self.started, 1e-9)
+        eta = None
+        if self.pages_done:
+            eta = elapsed / self.pages_done * (self.page_count - self.pages_done)
+        return {
+            "pages_done": self.pages_done,
+            "page_count": self.page_count,
+            "images": self.images,
+            "elapsed": elapsed,
+            "images_per_second": self.images / elapsed,
+            "mb_per_second": self.bytes / elapsed / 1e6,
+            "eta": eta,
+        }
+
+
+# Thumbnail sheet formats: file extension and PIL save arguments
+SHEET_FORMATS = {
+    "png": ("png", PNG_SAVE_ARGUMENTS),
+    "jpeg": ("jpg", {"format": "JPEG", "quality": 85}),
+    "webp": ("webp", {"format": "WEBP", "quality": 80}),
+}
+
+# Smallest side of the reduced decode used for hashing, in multiples of the pHash size. The
+# pHash itself works on a 4 * phash_size square. Hashes of reduced decodes still differ from
+# full-resolution hashes by up to 4 bits on large photos, see benchmarks/bench_reduced_phash.py,
+# so the 'reduced_phash' option is off by default
+PHASH_DECODE_FACTOR = 16
+
+# Output folder layouts: one file per page image, or content-addressed objects with the page
+# names as links or index entries, see PDFImageExtractor.output_target
+OUTPUT_LAYOUTS = ("pages", "content")
+CONTENT_LINKS = ("hardlink", "symlink", "index")
+
+# Options that change which images are saved and how they are named and encoded; a manifest
+# is only resumed if they are unchanged
+RESULT_OPTIONS = (
+    "use_threshold",
+    "remove_duplicates",
+    "skip_repeated_xrefs",
+    "raw_passthrough",
+    "min_dimension",
+    "phash_size",
+    "phash_threshold",
+    "reduced_phash",
+    "output_preset",
+    "output_quality",
+    "output_compression",
+    "output_layout",
+)
+
+# Outcomes counted per extraction run in PDFImageExtractor.counts
+IMAGE_COUNTS = ("saved", "prefiltered", "below_threshold", "duplicate", "repeated_xref", "failed")
+
+
+class PDFImageExtractor:
+    def __init__(self):
+        self.pdf_path = ""
+        self.pdf_directory = ""
+        self.pdf_name = ""
+        self.output_folder = ""
+        self.threshold = 0
+        # xref -> list of (page_index, image_index) references in the current document
+        self.xref_registry: Dict[int, List[Tuple[int, int]]] = {}
+        # xref -> output file name, or None if the image was not saved
+        self.xref_outputs: Dict[int, Optional[str]] = {}
+        # Names of all files written by the last extract_and_save_images run, in order
+        self.saved_files: List[str] = []
+        # File name -> (xref, smask, page_index, image_index) of every saved file
+        self.file_sources: Dict[str, Tuple[int, int, int, int]] = {}
+        # Content layout: file name -> stored object, objects stored by this run, and the page
+        # names already linked to their object
+        self.file_objects: Dict[str, str] = {}
+        self.stored_objects: set = set()
+        self.linked_files: set = set()
+        # pHash (hex) -> xref that added it, and near-duplicate xref -> the xref it matched
+        self.hash_owners: Dict[str, int] = {}
+        self.duplicate_of: Dict[int, int] = {}
+        self.writer: Optional[AsyncImageWriter] = None
+        # Outcome counters of the last extraction, see IMAGE_COUNTS
+        self.counts: Dict[str, int] = dict.fromkeys(IMAGE_COUNTS, 0)
+        self.cache: Optional[ImageCache] = None
+        self._fingerprint: Optional[str] = None
+        # Analysis of the last preview, reused by extract_and_save_images
+        self.session: Optional[DocumentSession] = None
+        # Set by cancel() to stop the running preview or extraction
+        self.cancel_event = threading.Event()
+        # Progress of the running preview or extraction
+        self.progress: Optional[ProgressTracker] = None
+        # Stage timings and counters of the last preview or extraction
+        self.stats = PipelineStats()
+        self.options: Dict[str, Any] = {
+            "use_threshold": True,
+            "remove_duplicates": True,
+            "skip_repeated_xrefs": True,  # Process each image xref only once per document
+            "raw_passthrough": False,  # Write unmasked images in their original encoding
+            "output_layout": "pages",  # "content" stores each unique image once, see OUTPUT_LAYOUTS
+            "content_links": "hardlink",  # How page names point to stored objects, see CONTENT_LINKS
+            "output_preset": "png",  # Encoder of decoded output images, see OUTPUT_PRESETS, or "auto"
+            "output_quality": 0,  # JPEG and WebP quality, 0 keeps the preset's
+            "output_compression": -1,  # PNG zlib compression level 0-9, -1 keeps the preset's
+            "min_dimension": 0,  # Smallest accepted width and height in pixels, 0 accepts all
+            "phash_size": 8,  # New option for pHash size
+            "phash_threshold": 5,  # New option for pHash comparison threshold
+            "reduced_phash": False,  # Hash a reduced-resolution decode instead of the full image
+            "hash_index": "array",  # Near-duplicate lookup structure, see HASH_INDEXES
+            "workers": 1,  # Number of worker processes for extract_and_save_images
+            "preview_limit": 0,  # Maximum number of thumbnails in the preview, 0 shows all
+            "thumbnail_threads": 4,  # Threads decoding preview thumbnails and rendering sheets
+            "thumbs_per_sheet": 500,  # Thumbnails per preview sheet, 0 puts all on one sheet
+            "sheet_format": "png",  # Preview sheet format, see SHEET_FORMATS
+            "write_log_file": False,  # GUI: also write the log of each run to the output folder
+            "resume": True,  # Continue an interrupted extraction from the manifest in the output folder
+            "checkpoint_pages": 50,  # Pages between manifest checkpoints, 0 only writes it at the end
+            "use_cache": False,  # Keep image sizes and pHashes in a persistent cache
+            "cache_dir": os.path.join(os.path.expanduser("~"), ".cache", "pdf_image_extractor"),
+            "cache_max_entries": 200000,  # Least recently used entries beyond this are evicted
+            "cache_max_thumbnails": 20000,  # Least recently used preview thumbnails beyond this are evicted
+            "writer_threads": 2,  # Threads encoding and writing output files, 0 writes synchronously
+            "writer_queue_size": 8,  # Maximum number of output files waiting to be written
+            "mask_cache_mb": 64,  # Decoded soft masks kept for images sharing a mask, 0 disables
+            "memory_budget_mb": 0,  # Cap on decoded pixels held at once, shared by the workers; 0 is unlimited
+        }
+        self.current_p_hashes = self.create_hash_index()
+        # Bytes of decoded pixels held by the running preview or extraction
+        self.budget = self.create_memory_budget()
+        self.encoder = self.create_encoder()
+        self.mask_cache = self.create_mask_cache()
+
+    def create_memory_budget(self, shares: int = 1) -> MemoryBudget:
+        """
+        Creates a memory budget of the size set by the 'memory_budget_mb' option.
+
+        Args:
+            shares (int): The number of processes the budget is divided between.
+
+        Returns:
+            MemoryBudget: The budget of one process.
+        """
+        return MemoryBudget(int(self.options["memory_budget_mb"] * 1024 * 1024) // max(1, shares))
+
+    def create_encoder(self) -> OutputEncoder:
+        """
+        Creates the output encoder selected by the 'output_preset', 'output_quality' and
+        'output_compression' options.
+
+        Raises:
+            ValueError: If the option names an unknown preset.
+
+        Returns:
+            OutputEncoder: The encoder.
+        """
+        return OutputEncoder(
+            self.options["output_preset"], self.options["output_quality"], self.options["output_compression"]
+        )
+
+    def create_mask_cache(self) -> MaskCache:
+        """
+        Creates an empty soft mask cache of the size set by the 'mask_cache_mb' option.
+
+        Returns:
+            MaskCache: The cache.
+        """
+        return MaskCache(int(self.options["mask_cache_mb"] * 1024 * 1024))
+
+    def report_memory(self, log_callback=None):
+        """
+        Logs the peak of decoded pixels of the last run against the memory budget.
+
+        Nothing is logged without a budget.
+
+        Args:
+            log_callback (callable, optional): A function to log messages.
+        """
+        memory = self.stats.memory
+        if not memory["limit"]:
+            return
+        msg = (
+            f"Peak memory of decoded images: {memory['peak'] / 2**20:.1f} MB of "
+            f"{memory['limit'] / 2**20:.1f} MB budget per process"
+        )
+        if memory["waits"]:
+            msg += f", decodes waited {memory['waits']} times for {memory['wait_time']:.1f} s"
+        if log_callback:
+            log_callback(msg + ".")
+        else:
+            print(msg + ".")
+
+    def create_hash_index(self):
+        """
+        Creates an empty near-duplicate index of the type selected by the 'hash_index' option.
+
+        Raises:
+            ValueError: If the option names an unknown index type.
+
+        Returns:
+            The new hash index.
+        """
+        index_type = self.options["hash_index"]
+        if index_type not in HASH_INDEXES:
+            raise ValueError(f"Unknown hash index: {index_type}")
+        return HASH_INDEXES[index_type]()
+
+    def phash_image(self, image: Image) -> imagehash.ImageHash:
+        """
+        Calculates the pHash value
+
+        Args:
+            image (Image.Image | ImageStage | imagehash.ImageHash): The image to calculate the
+                pHash for. For an ImageStage the already decoded pixels are used, or a reduced
+                decode with the 'reduced_phash' option. A hash that was already computed, for
+                example by a worker process, is returned unchanged.
+
+        Returns:
+            str: The pHash value of the image.
+        """
+        if isinstance(image, imagehash.ImageHash):
+            return image
+        if isinstance(image, ImageStage):
+            if image.p_hash is None:
+                if self.options["reduced_phash"]:
+                    pixels = image.reduced_image(self.options["phash_size"] * PHASH_DECODE_FACTOR)
+                else:
+                    pixels = image.pil_image
+                with timed(self.stats, "phash"):
+                    image.p_hash = imagehash.phash(pixels, hash_size=self.options["phash_size"])
+            return image.p_hash
+        with timed(self.stats, "phash"):
+            p_hash = imagehash.phash(image, hash_size=self.options["phash_size"])
+        return p_hash
+
+    @property
+    def fingerprint(self) -> str:
+        """The content fingerprint of the selected PDF file, computed on first access."""
+        if self._fingerprint is None:
+            self._fingerprint = document_fingerprint(self.pdf_path)
+        return self._fingerprint
+
+    def get_cache(self) -> Optional[ImageCache]:
+        """
+        Opens the persistent image cache on first use.
+
+        Returns:
+            Optional[ImageCache]: The cache, or None if the 'use_cache' option is off.
+        """
+        if not self.options["use_cache"]:
+            return None
+        if self.cache is None:
+            self.cache = ImageCache(
+                self.options["cache_dir"], self.options["cache_max_entries"], self.options["cache_max_thumbnails"]
+            )
+        return self.cache
+
+    def cache_hash_key(self) -> int:
+        """
+        The pHash size under which cache entries are stored.
+
+        Hashes of full-resolution decodes are stored under the negated size, so they never
+        mix with hashes of reduced decodes.
+        """
+        return self.options["phash_size"] if self.options["reduced_phash"] else -self.options["phash_size"]
+
+    def load_cached(self, stage: ImageStage):
+        """
+        Fills the size, dimensions and pHash of a stage from the image cache, if present.
+
+        Args:
+            stage (ImageStage): The stage to fill.
+        """
+        cache = self.get_cache()
+        if cache is None:
+            return
+        entry = cache.get(self.fingerprint, stage.xref, self.cache_hash_key())
+        if entry is None:
+            return
+        stage.cached = entry
+        stage.size_kb = entry["size_kb"]
+        stage.width, stage.height = entry["width"], entry["height"]
+        if entry["hash"]:
+            stage.p_hash = imagehash.hex_to_hash(entry["hash"])
+
+    def store_cached(self, stage: ImageStage):
+        """
+        Stores what was learned about a stage in the image cache.
+
+        Nothing is written if the image was never extracted or the cache already knows everything.
+
+        Args:
+            stage (ImageStage): The processed stage.
+        """
+        cache = self.get_cache()
+        if cache is None or stage.known_size_kb is None:
+            return
+        if stage.cached is not None and (stage.cached["hash"] or stage.p_hash is None):
+            return
+        p_hash = str(stage.p_hash) if stage.p_hash is not None else None
+        cache.put(self.fingerprint, stage.xref, self.cache_hash_key(), stage.size_kb, stage.width, stage.height, p_hash)
+
+    def commit_cache(self):
+        """Writes pending image cache entries to disk."""
+        if self.cache is not None:
+            self.cache.commit()
+
+    def is_duplicate(self, new_hash: imagehash.ImageHash) -> bool:
+        """
+        Checks if the new hash is a duplicate based on the current threshold
+
+        Args:
+            new_hash (imagehash.ImageHash): The hash to check for duplicates
+
+        Returns:
+            bool: True if it's a duplicate, False otherwise
+        """
+        return self.find_duplicate(new_hash) is not None
+
+    def find_duplicate(self, new_hash: imagehash.ImageHash) -> Optional[imagehash.ImageHash]:
+        """
+        Looks up the stored hash within the pHash threshold of a new hash.
+
+        Args:
+            new_hash (imagehash.ImageHash): The hash to check for duplicates.
+
+        Returns:
+            Optional[imagehash.ImageHash]: The matching stored hash, or None.
+        """
+        with timed(self.stats, "duplicate_lookup"):
+            return self.current_p_hashes.find(new_hash, self.options["phash_threshold"])
+
+    def cancel(self):
+        """Asks the running preview or extraction to stop at the next image boundary. Thread-safe."""
+        self.cancel_event.set()
+
+    def check_cancelled(self):
+        """
+        Raises:
+            ExtractionCancelled: If cancel() was called since the run started.
+        """
+        if self.cancel_event.is_set():
+            raise ExtractionCancelled("Cancelled by the user.")
+
+    def report_progress(self, pages_done: Optional[int] = None, images: int = 0, size_kb: float = 0):
+        """
+        Forwards progress to the tracker of the running operation, if any.
+
+        Args:
+            pages_done (int, optional): The number of completed pages, if it changed.
+            images (int): The number of images processed since the last call.
+            size_kb (float): Their encoded size in KB.
+        """
+        if self.progress is not None:
+            self.progress.update(pages_done, images, int(size_kb * 1024))
+
+    def set_pdf_file(self, pdf_path: str):
+        """
+        Sets the PDF file path and updates related attributes.
+
+        Args:
+            pdf_path (str): The path to the PDF file.
+
+        Raises:
+            FileNotFoundError: If the file does not exist.
+        """
+        if pdf_path:
+            if not os.path.isfile(pdf_path):
+                raise FileNotFoundError(f"The selected file does not exist: {pdf_path}")
+            self.pdf_path = pdf_path
+            self.pdf_directory = os.path.dirname(self.pdf_path)
+            self.pdf_name = os.path.basename(self.pdf_path)
+            self._fingerprint = None
+            self.session = None
+
+    def iter_images(self) -> Iterator["ImageRecord"]:
+        """
+        Lazily walks the images of the selected PDF file, one record at a time.
+
+        The document stays open while the generator is consumed. Each record carries the
+        page index, xref, soft mask and size; its bytes are kept only until record.release()
+        and fetched again on demand afterwards, so memory does not grow with the document.
+
+        Raises a ValueError if no PDF file is selected or if an error occurs while reading the PDF file.
+        Raises a RuntimeError for unexpected errors during image extraction.
+
+        Yields:
+            ImageRecord: One record per image, in page order.
+        """
+        if not self.pdf_path:
+            raise ValueError("No PDF file selected.")
+
+        seen_xrefs = set()
+        try:
+            with pymupdf.open(self.pdf_path) as doc:
+                for page_index, page in enumerate(doc):
+                    image_list = page.get_images(full=True)
+                    for img in image_list:
+                        xref = img[0]
+                        if self.options["skip_repeated_xrefs"]:
+                            if xref in seen_xrefs:
+                                continue
+                            seen_xrefs.add(xref)
+                        record = ImageRecord(doc, page_index, xref, img[1], img, self.stats, self.budget)
+                        self.load_cached(record)
+                        yield record
+        except pymupdf.FileDataError as e:
+            raise ValueError(f"Error reading PDF file: {str(e)}")
+        except Exception as e:
+            raise RuntimeError(f"Unexpected error extracting images: {str(e)}")
+
+    def extract_images(self) -> List[Tuple[bytes, float]]:
+        """
+        Extracts images from the selected PDF file.
+
+        Raises a ValueError if no PDF file is selected or if an error occurs while reading the PDF file.
+        Raises a RuntimeError for unexpected errors during image extraction.
+
+        Returns:
+            List[Tuple[bytes, float]]: A list of tuples containing image bytes and their sizes in KB.
+        """
+        return [(record.image_bytes, record.size_kb) for record in self.iter_images()]
+
+    def passes_filters(self, image, size: float, log_callback=None) -> Tuple[bool, Optional[Image.Image]]:
+        """
+        Applies the threshold and duplicate settings to a single image.
+
+        Args:
+            image (bytes | ImageStage): The encoded image, or a stage whose cached pHash or
+                decoded pixels are used for the duplicate check.
+            size (float): The size of the image in KB.
+            log_callback (callable, optional): A function to log messages.
+
+        Returns:
+            Tuple[bool, Optional[Image.Image]]: Whether the image is kept, and the image
+            if it had to be decoded for the duplicate check.
+        """
+        if self.options["use_threshold"] and size < self.threshold:
+            return False, None
+
+        if self.options["remove_duplicates"]:
+            try:
+                if isinstance(image, ImageStage):
+                    hash_to_check = self.phash_image(image)
+                    img = image.decoded_image
+                else:
+                    img = Image.open(io.BytesIO(image))
+                    img = img.convert("RGB")
+                    hash_to_check = self.phash_image(img)
+                if self.is_duplicate(hash_to_check):
+                    return False, None
+                self.current_p_hashes.add(hash_to_check)
+                return True, img
+            except Exception as e:
+                msg = f"Warning: Failed to process image for duplicate check: {str(e)}"
+                if log_callback:
+                    log_callback(msg)
+                else:
+                    print(msg)
+                return False, None
+
+        return True, None
+
+    def filter_images(self, images: List[Tuple[bytes, float]], log_callback=None) -> List[Tuple[bytes, float]]:
+        """
+        Filters images based on threshold and duplicate settings.
+
+        Args:
+            images (List[Tuple[bytes, float]]): A list of tuples containing image bytes and their sizes in KB.
+            log_callback (callable, optional): A function to log messages.
+
+        Returns:
+            List[Tuple[bytes, float]]: A filtered list of image tuples.
+        """
+        self.current_p_hashes = self.create_hash_index()  # Reset pHashes for thumbnail preview
+        return [
+            (image_bytes, size)
+            for image_bytes, size in images
+            if self.passes_filters(image_bytes, size, log_callback)[0]
+        ]
+
+    def make_thumbnail(self, image, log_callback=None) -> Optional[Image.Image]:
+        """
+        Creates a 100x100 RGB thumbnail.
+
+        Args:
+            image (bytes | Image.Image): The encoded image, or an already decoded image.
+            log_callback (callable, optional): A function to log messages.
+
+        Returns:
+            Optional[Image.Image]: The thumbnail, or None if the image could not be processed.
+        """
+        thumbnail, msg = thumbnail_image(image)
+        if msg:
+            if log_callback:
+                log_callback(msg)
+            else:
+                print(msg)
+        return thumbnail
+
+    def sort_images_by_size(
+        self, images: List[Tuple[bytes, float]], log_callback=None
+    ) -> List[Tuple[Image.Image, float]]:
+        """
+        Sorts images by size in descending order and creates thumbnails.
+
+        The thumbnails are decoded on 'thumbnail_threads' threads.
+
+        Args:
+            images (List[Tuple[bytes, float]]): A list of tuples containing image bytes and their sizes in KB.
+            log_callback (callable, optional): A function to log messages.
+
+        Returns:
+            List[Tuple[Image.Image, float]]: A list of tuples containing thumbnail images and their sizes in KB.
+        """
+        images.sort(key=lambda x: x[1], reverse=True)  # Sort by size in KB
+        thumbnails = []
+        with ThreadPoolExecutor(max_workers=max(1, self.options["thumbnail_threads"])) as pool:
+            results = pool.map(
+                lambda image_bytes: thumbnail_image(image_bytes, self.budget),
+                [image_bytes for image_bytes, _ in images],
+            )
+            for (_, size), (img, msg) in zip(images, results):
+                if msg:
+                    if log_callback:
+                        log_callback(msg)
+                    else:
+                        print(msg)
+                if img is not None:
+                    thumbnails.append((img, size))
+        return thumbnails
+
+    def create_thumb_sheet(self, images: List[Tuple[Image.Image, float]]) -> str:
+        """
+        Creates thumbnail sheets from a list of images and saves them next to the PDF.
+
+        At most 'thumbs_per_sheet' thumbnails are placed on one sheet. If they all fit, a
+        single thumbnail_sheet file is written. Otherwise the sheets are numbered, rendered
+        in parallel on 'thumbnail_threads' threads, and listed in thumbnail_sheets.html.
+        Sheets are written in the 'sheet_format' format (png, jpeg or webp).
+
+        Args:
+            images (List[Tuple[Image.Image, float]]): A list of tuples containing images and their sizes in KB.
+
+        Raises:
+            ValueError: If the images list is empty or the sheet format is unknown.
+            IOError: If saving a thumbnail sheet or the index fails.
+
+        Returns:
+            str: The path to the saved thumbnail sheet, or to the index if there are several sheets.
+        """
+        if not images:
+            raise ValueError("No images to create thumbnail sheet.")
+        sheet_format = self.options["sheet_format"]
+        if sheet_format not in SHEET_FORMATS:
+            raise ValueError(f"Unknown sheet format: {sheet_format}")
+
+        extension = SHEET_FORMATS[sheet_format][0]
+        per_sheet = self.options["thumbs_per_sheet"] or len(images)
+        if len(images) <= per_sheet:
+            thumbnail_sheet_path = os.path.join(self.pdf_directory, f"thumbnail_sheet.{extension}")
+            self.render_thumb_sheet(images, thumbnail_sheet_path)
+            return thumbnail_sheet_path
+
+        pages = [images[start : start + per_sheet] for start in range(0, len(images), per_sheet)]
+        paths = [
+            os.path.join(self.pdf_directory, f"thumbnail_sheet_{number:03d}.{extension}")
+            for number in range(1, len(pages) + 1)
+        ]
+        with ThreadPoolExecutor(max_workers=max(1, self.options["thumbnail_threads"])) as pool:
+            # list() re-raises the first rendering error
+            list(pool.map(self.render_thumb_sheet, pages, paths))
+        return self.write_sheet_index(paths, [len(page) for page in pages])
+
+    def render_thumb_sheet(self, images: List[Tuple[Image.Image, float]], path: str):
+        """
+        Draws one thumbnail sheet with 10 thumbnails per row and a size label below each.
+
+        Args:
+            images (List[Tuple[Image.Image, float]]): The thumbnails and their sizes in KB.
+            path (str): The path to save the sheet to, in the 'sheet_format' format.
+
+        Raises:
+            IOError: If saving the thumbnail sheet fails.
+        """
+        thumb_width, thumb_height = 100, 100
+        max_thumbs_per_row = 10
+
+        # Calculate the number of rows needed
+        num_rows = (len(images) - 1) // max_thumbs_per_row + 1
+
+        sheet_width = thumb_width * min(len(images), max_thumbs_per_row)
+        sheet_height = (thumb_height + 20) * num_rows  # Extra height for labels
+
+        sheet = Image.new("RGB", (sheet_width, sheet_height))
+        draw = ImageDraw.Draw(sheet)
+        font = ImageFont.load_default()
+
+        for index, (img, size) in enumerate(images):
+            row = index // max_thumbs_per_row
+            col = index % max_thumbs_per_row
+            x_offset = col * thumb_width
+            y_offset = row * (thumb_height + 20)
+
+            sheet.paste(img, (x_offset, y_offset))
+            draw.text(
+                (x_offset, y_offset + thumb_height + 5),
+                f"{size:.2f} KB",
+                fill="white",
+                font=font,
+            )
+
+        try:
+            sheet.save(path, **SHEET_FORMATS[self.options["sheet_format"]][1])
+        except Exception as e:
+            raise IOError(f"Failed to save thumbnail sheet: {str(e)}")
+
+    def write_sheet_index(self, paths: List[str], counts: List[int]) -> str:
+        """
+        Writes an HTML page showing all thumbnail sheets in order.
+
+        Args:
+            paths (List[str]): The paths of the sheets.
+            counts (List[int]): The number of thumbnails on each sheet.
+
+        Raises:
+            IOError: If writing the index fails.
+
+        Returns:
+            str: The path to the index.
+        """
+        index_path = os.path.join(self.pdf_directory, "thumbnail_sheets.html")
+        title = html.escape(f"Thumbnails of {self.pdf_name}")
+        lines = [
+            f'<!DOCTYPE html>\n<html><head><meta charset="utf-8"><title>{title}</title></head><body>',
+            f"<h1>{title}</h1>",
+        ]
+        first = 1
+        for number, (path, count) in enumerate(zip(paths, counts), start=1):
+            name = html.escape(os.path.basename(path))
+            lines.append(f"<h2>Sheet {number}: images {first} to {first + count - 1}</h2>")
+            lines.append(f'<p><img src="{name}" alt="{name}"></p>')
+            first += count
+        lines.append("</body></html>")
+        try:
+            with open(index_path, "w", encoding="utf-8") as f:
+                f.write("\n".join(lines) + "\n")
+        except OSError as e:
+            raise IOError(f"Failed to write thumbnail sheet index: {str(e)}")
+        return index_path
+
+    def create_thumbnail_preview(self, log_callback=None, progress_callback=None):
+        """
+        Creates a thumbnail preview of the selected PDF file, respecting threshold and duplicate settings.
+
+        Images are streamed through iter_images and filtered one at a time. Only thumbnails
+        are kept, and with the 'preview_limit' option set only the largest images are kept in
+        a bounded heap, so memory stays flat for large documents. Thumbnails are decoded on
+        'thumbnail_threads' threads while the next images are filtered; at most two per
+        thread are queued or running, so the encoded bytes of pending images are held for a
+        few images only, not the whole document. With the 'use_cache' option they are stored
+        in the image cache, so previewing the same PDF again decodes nothing. The analysis of
+        every image is kept in self.session for extract_and_save_images. The preview can be
+        stopped from another thread with cancel().
+
+        Args:
+            log_callback (callable, optional): A function to log messages.
+            progress_callback (callable, optional): A function receiving ProgressTracker snapshots.
+
+        Raises:
+            ValueError: If no PDF file is selected.
+            ExtractionCancelled: If cancel() was called during the preview.
+
+        Returns:
+            str: The path to the created thumbnail sheet.
+        """
+        if not self.pdf_path:
+            raise ValueError("No PDF file selected.")
+
+        self.current_p_hashes = self.create_hash_index()  # Reset pHashes for thumbnail preview
+        self.session = None
+        self.cancel_event.clear()
+        self.stats = PipelineStats()
+        self.budget = self.create_memory_budget()
+        tracker = ProgressTracker(0, progress_callback)
+        session = DocumentSession(self.fingerprint, self.result_settings())
+        limit = self.options["preview_limit"]
+        cache = self.get_cache()
+        # Min-heap of (size, -order, xref, thumbnail or pending Future): the smallest, latest
+        # image is evicted first
+        heap: List[Tuple[float, int, int, object]] = []
+        dropped = 0
+        prefiltered = 0
+        threads = max(1, self.options["thumbnail_threads"])
+        in_flight: set = set()  # Thumbnail futures queued or running, each holding its encoded image
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            try:
+                for order, record in enumerate(self.iter_images()):
+                    try:
+                        self.check_cancelled()
+                        tracker.page_count = len(record.doc)
+                        tracker.update(pages_done=record.page_index, images=1)
+                        if self.prefilter(record.doc, record.metadata):
+                            prefiltered += 1
+                            session.analyses.setdefault(
+                                record.xref, {"prefiltered": True, "size_kb": 0, "hash": None, "error": None}
+                            )
+                            continue
+                        session.analyses.setdefault(record.xref, self.analyze_stage(record))
+                        tracker.update(nbytes=int(record.size_kb * 1024))
+                        keep, decoded = self.passes_filters(record, record.size_kb, log_callback)
+                        if not keep:
+                            continue
+                        session.kept.append(record.xref)
+                        if limit and len(heap) >= limit and (record.size_kb, -order) <= heap[0][:2]:
+                            dropped += 1
+                            continue
+                        thumbnail = cache.get_thumbnail(self.fingerprint, record.xref) if cache is not None else None
+                        if thumbnail is None and decoded is not None:
+                            # The pixels are already decoded and shared with the record, reduce them right away
+                            thumbnail = self.make_thumbnail(decoded, log_callback)
+                            if thumbnail is None:
+                                continue
+                            if cache is not None:
+                                cache.put_thumbnail(self.fingerprint, record.xref, thumbnail)
+                        elif thumbnail is None:
+                            image_bytes = record.image_bytes
+                            # The pending thumbnails may wait in the memory budget for the pixels
+                            # this record holds, so drop them before waiting for a free slot
+                            record.release()
+                            in_flight = {future for future in in_flight if not future.done()}
+                            while len(in_flight) >= threads * 2:
+                                self.check_cancelled()
+                                in_flight = wait(in_flight, timeout=0.1, return_when=FIRST_COMPLETED).not_done
+                            thumbnail = pool.submit(thumbnail_image, image_bytes, self.budget)
+                            in_flight.add(thumbnail)
+                        entry = (record.size_kb, -order, record.xref, thumbnail)
+                        if limit and len(heap) >= limit:
+                            evicted = heapq.heapreplace(heap, entry)[3]
+                            if isinstance(evicted, Future):
+                                evicted.cancel()
+                            dropped += 1
+                        else:
+                            heapq.heappush(heap, entry)
+                    finally:
+                        self.store_cached(record)
+                        record.release()
+            except ExtractionCancelled:
+                pool.shutdown(wait=False, cancel_futures=True)
+                raise
+
+            thumbnails = []
+            for size, order, xref, thumbnail in heap:
+                if isinstance(thumbnail, Future):
+                    thumbnail, msg = thumbnail.result()
+                    if msg:
+                        if log_callback:
+                            log_callback(msg)
+                        else:
+                            print(msg)
+                    if thumbnail is None:
+                        continue
+                    if cache is not None:
+                        cache.put_thumbnail(self.fingerprint, xref, thumbnail)
+                thumbnails.append((size, order, thumbnail))
+        self.commit_cache()
+        self.session = session
+        tracker.update(pages_done=tracker.page_count, force=True)
+        self.stats.record_memory(self.budget)
+        self.stats.finish({"kept": len(session.kept), "shown": len(thumbnails), "prefiltered": prefiltered})
+        self.report_memory(log_callback)
+
+        if prefiltered:
+            msg = f"{prefiltered} images rejected from their metadata without extracting them."
+            if log_callback:
+                log_callback(msg)
+            else:
+                print(msg)
+        if dropped:
+            msg = f"Preview limited to the {limit} largest images, {dropped} smaller images not shown."
+            if log_callback:
+                log_callback(msg)
+            else:
+                print(msg)
+
+        thumbnails.sort(key=lambda entry: (-entry[0], -entry[1]))  # Largest first, ties in page order
+        return self.create_thumb_sheet([(thumbnail, size) for size, _, thumbnail in thumbnails])
+
+    def extract_and_save_images(self, log_callback=None, executor: Optional[Executor] = None, progress_callback=None):
+        """
+        Extracts and saves images from the selected PDF file.
+
+        With the 'workers' option above 1, or when an executor is given, pages are processed
+        by worker processes (see process_pages_parallel). The saved files, their names and the
+        duplicate decisions are identical to a serial run. The run can be stopped from another
+        thread with cancel(); the last manifest checkpoint stays valid for resuming.
+
+        Args:
+            log_callback (callable, optional): A function to log messages.
+            executor (Executor, optional): A process pool to run the workers on instead of
+                creating one for this call.
+            progress_callback (callable, optional): A function receiving ProgressTracker snapshots.
+
+        Returns:
+            int: The number of images saved.
+
+        Raises:
+            ValueError: If no PDF file is selected or no output folder is specified.
             IOError: If creating the output folder fails.
             ValueError: If an error occurs while reading the PDF file.
+            ExtractionCancelled: If cancel() was called during the run.
             RuntimeError: For unexpected errors during PDF processing.
         """
-        if not self.pdf_path:
-            raise ValueError("No PDF file selected.")
-        if not self.output_folder:
-            raise ValueError("No output folder specified.")
+        self.prepare_extraction()
+        self.cancel_event.clear()
+        session = self.session
+        if session is not None and not session.matches(self.fingerprint, self.result_settings()):
+            session = self.session = None
+        if session is not None:
+            msg = (
+                f"Reusing the preview analysis of {len(session.analyses)} images, "
+                f"only the {len(session.kept)} kept images are decoded."
+            )
+            if log_callback:
+                log_callback(msg)
+            else:
+                print(msg)
+
+        try:
+            with pymupdf.open(self.pdf_path) as doc:
+                page_count = len(doc)
+                start_page = 0
+                if self.options["resume"]:
+                    start_page = self.resume_from_manifest(doc, log_callback)
+                self.progress = ProgressTracker(page_count, progress_callback)
+                self.report_progress(pages_done=start_page)
+                if executor is None and (self.options["workers"] <= 1 or page_count <= 1):
+                    if self.options["writer_threads"] > 0:
+                        self.writer = AsyncImageWriter(
+                            self.options["writer_threads"],
+                            self.options["writer_queue_size"],
+                            log_callback,
+                            self.stats,
+                            self.budget,
+                        )
+                    try:
+                        for page_index in range(start_page, page_count):
+                            self.process_page(doc, page_index, log_callback)
+                            self.report_progress(pages_done=page_index + 1)
+                            self.checkpoint(page_index + 1, page_count, log_callback)
+                    finally:
+                        self.close_writer()
+                        self.stats.record_memory(self.budget)
+                        self.stats.record_cache("smask", self.mask_cache.counters())
+                        self.mask_cache.clear()
+            if executor is not None or (self.options["workers"] > 1 and page_count > 1):
+                self.process_pages_parallel(page_count, log_callback, executor, start_page)
+            self.progress.update(force=True)
+        except pymupdf.FileDataError as e:
+            raise ValueError(f"Error reading PDF file: {str(e)}")
+        except ExtractionCancelled:
+            self.commit_cache()
+            raise
+        except Exception as e:
+            raise RuntimeError(f"Unexpected error processing PDF: {str(e)}")
+        finally:
+            self.progress = None
+
+        self.commit_cache()
+        self.write_manifest(log_callback, page_count, page_count)
+        self.stats.finish(self.counts)
+        self.report_memory(log_callback)
+        if self.counts["prefiltered"]:
+            msg = f"{self.counts['prefiltered']} images rejected from their metadata without extracting them."
+            if log_callback:
+                log_callback(msg)
+            else:
+                print(msg)
+        return len(self.saved_files)
+
+    def checkpoint(self, pages_completed: int, page_count: int, log_callback=None):
+        """
+        Writes a manifest checkpoint every 'checkpoint_pages' pages.
+
+        Pending asynchronous writes are flushed first, so every file listed in the
+        checkpoint is complete on disk.
+
+        Args:
+            pages_completed (int): The number of pages processed so far.
+            page_count (int): The number of pages in the PDF.
+            log_callback (callable, optional): A function to log messages.
+        """
+        interval = self.options["checkpoint_pages"]
+        if not interval or pages_completed % interval or pages_completed >= page_count:
+            return
+        self.flush_writer()
+        self.commit_cache()
+        self.write_manifest(log_callback, pages_completed, page_count)
+
+    def result_settings(self) -> Dict:
+        """
+        Collects the settings that influence which images are saved and under which names.
+
+        Returns:
+            Dict: The settings a manifest has to match to be resumed.
+        """
+        settings = {option: self.options[option] for option in RESULT_OPTIONS}
+        settings["threshold"] = self.threshold
+        return settings
+
+    def resume_from_manifest(self, doc: pymupdf.Document, log_callback=None) -> int:
+        """
+        Restores the state of an earlier, interrupted or finished run from its manifest.
+
+        The manifest is only used if it belongs to the same PDF content and was written with
+        the same result settings. The xref registry, the saved files, the counters and the
+        duplicate index are restored, so the rest of the run makes the same decisions as an
+        uninterrupted run. Files listed in the manifest that are missing or have a different
+        size are written again.
+
+        Args:
+            doc (pymupdf.Document): The PDF document object.
+            log_callback (callable, optional): A function to log messages.
+
+        Returns:
+            int: The index of the first page that still has to be processed.
+        """
+        manifest_path = os.path.join(self.output_folder, "manifest.json")
+        if not os.path.isfile(manifest_path):
+            return 0
+
+        def log(msg):
+            if log_callback:
+                log_callback(msg)
+            else:
+                print(msg)
+
+        try:
+            with open(manifest_path, encoding="utf-8") as f:
+                manifest = json.load(f)
+            if (
+                manifest.get("fingerprint") != self.fingerprint
+                or manifest.get("settings") != self.result_settings()
+                or manifest.get("page_count") != len(doc)
+            ):
+                log("Existing manifest does not match this PDF or these settings, starting from the first page.")
+                return 0
+
+            for entry in manifest["images"]:
+                self.xref_registry[entry["xref"]] = [(ref["page"], ref["image"]) for ref in entry["references"]]
+                self.xref_outputs[entry["xref"]] = entry["output"]
+            for entry in manifest["images"]:
+                if entry.get("duplicate_of") is not None:
+                    self.duplicate_of[entry["xref"]] = entry["duplicate_of"]
+            for p_hash in manifest["hashes"]:
+                self.current_p_hashes.add(imagehash.hex_to_hash(p_hash))
+            self.hash_owners.update(manifest.get("hash_owners", {}))
+            self.counts.update(manifest["counts"])
+            files = manifest["files"]
+            pages_completed = manifest["pages_completed"]
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            log(f"Warning: Failed to read manifest, starting from the first page: {str(e)}")
+            self.prepare_extraction()
+            return 0
+
+        rewritten = 0
+        for entry in files:
+            file_name = entry["file"]
+            self.saved_files.append(file_name)
+            self.file_sources[file_name] = (entry["xref"], entry["smask"], entry["page"], entry["image"])
+            object_name = entry.get("object")
+            output_path = os.path.join(self.output_folder, *(object_name or file_name).split("/"))
+            if os.path.isfile(output_path) and os.path.getsize(output_path) == entry["bytes"]:
+                if object_name:
+                    self.file_objects[file_name] = object_name
+                    self.stored_objects.add(object_name)
+                continue
+            try:
+                if self.save_image(doc, entry["xref"], entry["smask"], entry["page"], entry["image"]) != file_name:
+                    raise IOError("The saved file name changed")
+                rewritten += 1
+            except Exception as e:
+                self.forget_outputs({file_name})
+                self.report_failure(entry["page"], entry["image"], str(e), log_callback)
+
+        if pages_completed >= len(doc):
+            log(f"All pages were already extracted, {rewritten} missing or damaged files written again.")
+        else:
+            log(
+                f"Resuming from page {pages_completed} of {len(doc)}, {rewritten} missing or damaged files written again."
+            )
+        return pages_completed
+
+    def prepare_extraction(self):
+        """
+        Validates the settings, resets the per-document state and creates the output folder.
+
+        Raises:
+            ValueError: If no PDF file is selected or no output folder is specified.
+            IOError: If creating the output folder fails.
+        """
+        if not self.pdf_path:
+            raise ValueError("No PDF file selected.")
+        if not self.output_folder:
+            raise ValueError("No output folder specified.")
+        if self.options["output_layout"] not in OUTPUT_LAYOUTS:
+            raise ValueError(f"Unknown output layout: {self.options['output_layout']}")
+        if self.options["content_links"] not in CONTENT_LINKS:
+            raise ValueError(f"Unknown content link type: {self.options['content_links']}")
+        self.encoder = self.create_encoder()
+        self.mask_cache = self.create_mask_cache()
+
+        self.current_p_hashes = self.create_hash_index()  # Reset the current pHashes
+        self.xref_registry = {}
+        self.xref_outputs = {}
+        self.saved_files = []
+        self.file_sources = {}
+        self.file_objects = {}
+        self.stored_objects = set()
+        self.linked_files = set()
+        self.hash_owners = {}
+        self.duplicate_of = {}
+        self.counts = dict.fromkeys(IMAGE_COUNTS, 0)
+        self.stats = PipelineStats()
+        self.budget = self.create_memory_budget()
+
+        try:
+            os.makedirs(self.output_folder, exist_ok=True)
+        except OSError as e:
+            raise IOError(f"Failed to create output folder: {str(e)}")
+
+    def report_failure(self, page_index: int, image_index: int, error: str, log_callback=None):
+        """
+        Counts and logs an image that could not be processed.
+
+        Args:
+            page_index (int): The index of the page containing the image.
+            image_index (int): The index of the image on the page.
+            error (str): The error message.
+            log_callback (callable, optional): A function to log messages.
+        """
+        self.counts["failed"] += 1
+        msg = f"Warning: Failed to process image {image_index} on page {page_index}: {error}"
+        if log_callback:
+            log_callback(msg)
+        else:
+            print(msg)
+
+    def record_output(
+        self, xref: int, file_name: Optional[str], page_index: int = -1, image_index: int = -1, smask: int = 0
+    ):
+        """
+        Records the outcome of processing an image xref.
+
+        Args:
+            xref (int): The reference number of the image.
+            file_name (Optional[str]): The name of the saved file, or None if the image was skipped.
+            page_index (int): The index of the page the saved file was named after.
+            image_index (int): The index of the image on that page.
+            smask (int): The soft mask reference number of the image.
+        """
+        self.xref_outputs.setdefault(xref, file_name)
+        if file_name is not None:
+            self.saved_files.append(file_name)
+            self.file_sources[file_name] = (xref, smask, page_index, image_index)
+            self.counts["saved"] += 1
+
+    def close_writer(self):
+        """
+        Waits for all pending asynchronous writes, shuts the writer down and forgets the
+        output of images that failed to write.
+        """
+        if self.writer is None:
+            return
+        writer, self.writer = self.writer, None
+        self.forget_outputs(self.failed_names(writer.close()))
+
+    def flush_writer(self):
+        """
+        Waits for all pending asynchronous writes and forgets the output of images that failed to write.
+        """
+        if self.writer is not None:
+            self.forget_outputs(self.failed_names(self.writer.flush()))
+
+    def failed_names(self, failures: List[Tuple[str, str]]) -> set:
+        """
+        Maps failed writes to the names of the affected output files.
+
+        Args:
+            failures (List[Tuple[str, str]]): The path and error message of every failed write.
+
+        Returns:
+            set: The file names, including every name stored as a failed content object.
+        """
+        names = set()
+        for output_path, _ in failures:
+            object_name = os.path.relpath(output_path, self.output_folder).replace(os.sep, "/")
+            self.stored_objects.discard(object_name)
+            sharing = {file_name for file_name, stored in self.file_objects.items() if stored == object_name}
+            names |= sharing or {os.path.basename(output_path)}
+        return names
+
+    def forget_outputs(self, failed_names: set):
+        """
+        Counts files that could not be written as failed and removes them from the results.
+
+        Args:
+            failed_names (set): The names of the files that failed.
+        """
+        if not failed_names:
+            return
+        for xref, file_name in self.xref_outputs.items():
+            if file_name in failed_names:
+                self.xref_outputs[xref] = None
+        self.saved_files = [file_name for file_name in self.saved_files if file_name not in failed_names]
+        for file_name in failed_names:
+            self.file_sources.pop(file_name, None)
+            self.file_objects.pop(file_name, None)
+        self.counts["saved"] -= len(failed_names)
+        self.counts["failed"] += len(failed_names)
+
+    def write_output(self, file_name: str, data, reserved: int = 0, save_arguments: Optional[Dict] = None):
+        """
+        Writes an output file, through the asynchronous writer if one is active.
+
+        Args:
+            file_name (str): The name of the file in the output folder.
+            data (bytes | Image.Image): Encoded bytes to write as they are, or an image to encode.
+            reserved (int): The bytes reserved in the memory budget for data, released once written.
+            save_arguments (Dict, optional): The Image.save arguments of an image, PNG by default.
+        """
+        output_path = os.path.join(self.output_folder, file_name)
+        if self.writer is not None:
+            self.writer.submit(output_path, data, reserved, save_arguments)
+            return
+        try:
+            AsyncImageWriter._write(output_path, data, self.stats, save_arguments)
+        finally:
+            if reserved:
+                self.budget.release(reserved)
+
+    def process_pages_parallel(
+        self, page_count: int, log_callback=None, executor: Optional[Executor] = None, start_page: int = 0
+    ):
+        """
+        Processes all pages of the PDF with worker processes.
+
+        Work is split into three steps so the result matches a serial run:
+        1. Workers analyze contiguous page ranges, each with its own document, and return
+           every image reference together with the size and pHash of each xref.
+        2. The coordinator walks the references in page order and makes the xref registry,
+           threshold and duplicate decisions exactly as process_image would.
+        3. Workers write the kept images under their usual page_{i}-image_{j} names. Each
+           worker writes synchronously, since the workers already run in parallel.
+
+        With checkpoints enabled, the pages are processed in waves of at least
+        'checkpoint_pages' pages and a manifest checkpoint is written after each wave.
+
+        Args:
+            page_count (int): The number of pages in the PDF.
+            log_callback (callable, optional): A function to log messages.
+            executor (Executor, optional): A process pool to use instead of creating one.
+            start_page (int): The index of the first page to process.
+        """
+        if executor is None:
+            with ProcessPoolExecutor(max_workers=self.options["workers"]) as own_executor:
+                try:
+                    return self.process_pages_parallel(page_count, log_callback, own_executor, start_page)
+                except ExtractionCancelled:
+                    own_executor.shutdown(wait=False, cancel_futures=True)
+                    raise
+
+        wave_size = page_count
+        if self.options["checkpoint_pages"]:
+            # Large enough waves keep every worker busy between two checkpoints
+            wave_size = max(self.options["checkpoint_pages"], self.options["workers"] * 16)
+        for wave_start in range(start_page, page_count, wave_size):
+            wave_stop = min(wave_start + wave_size, page_count)
+            if self.session is not None:
+                analysis_results = [(self.list_occurrences(wave_start, wave_stop), self.session.analyses)]
+            else:
+                analysis_results = (future.result() for future in self.submit_analysis(executor, wave_start, wave_stop))
+            kept = self.decide_images(analysis_results, log_callback)
+            self.collect_writes(kept, self.submit_writes(kept, executor), log_callback)
+            self.report_progress(pages_done=wave_stop)
+            if wave_stop < page_count:
+                self.commit_cache()
+                self.write_manifest(log_callback, wave_stop, page_count)
+
+    def list_occurrences(self, start_page: int, stop_page: int) -> List[Tuple[int, int, int, int]]:
+        """
+        Lists the image references of a range of pages without extracting anything.
+
+        Args:
+            start_page (int): The index of the first page.
+            stop_page (int): The index after the last page.
+
+        Returns:
+            List[Tuple[int, int, int, int]]: The (page_index, image_index, xref, smask) references in page order.
+        """
+        with pymupdf.open(self.pdf_path) as doc:
+            return [
+                (page_index, image_index, img[0], img[1])
+                for page_index in range(start_page, stop_page)
+                for image_index, img in enumerate(doc[page_index].get_images(), start=1)
+            ]
+
+    def submit_analysis(self, executor: Executor, start_page: int, stop_page: int) -> List[Future]:
+        """
+        Submits the analysis of a range of pages to worker processes in contiguous page ranges.
+
+        Args:
+            executor (Executor): The process pool to submit to.
+            start_page (int): The index of the first page to analyze.
+            stop_page (int): The index after the last page to analyze.
+
+        Returns:
+            List[Future]: One future per page range, in page order, resolving to the result of _analyze_page_range.
+        """
+        settings = self.worker_settings()
+        chunk_size = max(1, math.ceil((stop_page - start_page) / (max(1, self.options["workers"]) * 4)))
+        return [
+            executor.submit(_analyze_page_range, settings, (start, min(start + chunk_size, stop_page)))
+            for start in range(start_page, stop_page, chunk_size)
+        ]
+
+    def decide_images(self, analysis_results, log_callback=None) -> List[Tuple[int, int, int, int]]:
+        """
+        Makes the xref registry, threshold and duplicate decisions for analyzed page ranges.
+
+        Args:
+            analysis_results (Iterable): Results of _analyze_page_range in page order. The
+                stage timings of the workers, if included, are added to self.stats.
+            log_callback (callable, optional): A function to log messages.
+
+        Returns:
+            List[Tuple[int, int, int, int]]: The (page_index, image_index, xref, smask) images to save.
+        """
+        analyses: Dict[int, Dict] = {}
+        kept: List[Tuple[int, int, int, int]] = []
+        for result in analysis_results:
+            occurrences, chunk_analyses = result[0], result[1]
+            if len(result) > 2:
+                self.stats.merge(result[2])
+            for xref, analysis in chunk_analyses.items():
+                analyses.setdefault(xref, analysis)
+
+            for page_index, image_index, xref, smask in occurrences:
+                self.check_cancelled()
+                if self.register_xref(xref, page_index, image_index) and self.options["skip_repeated_xrefs"]:
+                    continue
+                try:
+                    analysis = analyses[xref]
+                    self.report_progress(images=1, size_kb=analysis["size_kb"])
+                    if analysis["error"]:
+                        raise RuntimeError(analysis["error"])
+                    if analysis["prefiltered"]:
+                        self.counts["prefiltered"] += 1
+                        self.record_output(xref, None)
+                        continue
+                    p_hash = imagehash.hex_to_hash(analysis["hash"]) if analysis["hash"] else None
+                    if self.check_conditions(analysis["size_kb"], p_hash, log_callback, xref):
+                        self.record_output(xref, None)
+                        continue
+                    kept.append((page_index, image_index, xref, smask))
+                except Exception as e:
+                    self.report_failure(page_index, image_index, f"Failed to process image: {str(e)}", log_callback)
+            if occurrences:
+                self.report_progress(pages_done=occurrences[-1][0] + 1)
+        return kept
+
+    def submit_writes(self, kept: List[Tuple[int, int, int, int]], executor: Executor) -> List[Future]:
+        """
+        Submits the kept images to worker processes for writing.
+
+        Args:
+            kept (List[Tuple[int, int, int, int]]): The images returned by decide_images.
+            executor (Executor): The process pool to submit to.
+
+        Returns:
+            List[Future]: One future per batch, in the order of the kept list.
+        """
+        settings = self.worker_settings()
+        batch_size = max(1, math.ceil(len(kept) / (max(1, self.options["workers"]) * 4)))
+        return [
+            executor.submit(_save_image_batch, settings, kept[start : start + batch_size])
+            for start in range(0, len(kept), batch_size)
+        ]
+
+    def collect_writes(self, kept: List[Tuple[int, int, int, int]], write_futures: List[Future], log_callback=None):
+        """
+        Records the results of submit_writes.
+
+        Args:
+            kept (List[Tuple[int, int, int, int]]): The images passed to submit_writes.
+            write_futures (List[Future]): The futures returned by submit_writes.
+            log_callback (callable, optional): A function to log messages.
+        """
+        # Results come back in batch order, so they line up with the kept list
+        results = []
+        for future in write_futures:
+            batch_results, stages, objects = future.result()
+            results.extend(batch_results)
+            self.stats.merge(stages)
+            self.file_objects.update(objects)
+            self.stored_objects.update(objects.values())
+        for (page_index, image_index, xref, smask), (file_name, error) in zip(kept, results):
+            if error:
+                self.report_failure(page_index, image_index, f"Failed to process image: {error}", log_callback)
+                continue
+            self.record_output(xref, file_name, page_index, image_index, smask)
+
+    def worker_settings(self) -> Dict:
+        """
+        Collects the state a worker process needs to act like this extractor.
 
-        self.current_p_hashes = [] # Reset the current pHashes
+        Returns:
+            Dict: The PDF path, output folder, threshold and options.
+        """
+        return {
+            "pdf_path": self.pdf_path,
+            "output_folder": self.output_folder,
+            "threshold": self.threshold,
+            "options": dict(self.options),
+            "fingerprint": self.fingerprint if self.options["use_cache"] else None,
+        }
+
+    @classmethod
+    def from_worker_settings(cls, settings: Dict) -> "PDFImageExtractor":
+        """
+        Creates an extractor inside a worker process from worker_settings().
+
+        Args:
+            settings (Dict): The settings collected by worker_settings().
+
+        Returns:
+            PDFImageExtractor: The configured extractor.
+        """
+        extractor = cls()
+        extractor.pdf_path = settings["pdf_path"]
+        extractor.pdf_directory = os.path.dirname(settings["pdf_path"])
+        extractor.pdf_name = os.path.basename(settings["pdf_path"])
+        extractor.output_folder = settings["output_folder"]
+        extractor.threshold = settings["threshold"]
+        extractor.options.update(settings["options"])
+        extractor._fingerprint = settings["fingerprint"]
+        extractor.budget = extractor.create_memory_budget(extractor.options["workers"])
+        extractor.encoder = extractor.create_encoder()
+        extractor.mask_cache = extractor.create_mask_cache()
+        return extractor
+
+    def analyze_image(self, doc: pymupdf.Document, img: Tuple) -> Dict:
+        """
+        Computes everything check_conditions needs for an image, without deciding anything.
+
+        Images rejected by prefilter are not extracted. The pHash is only computed if
+        duplicate removal is on and the image passes the size threshold, just like in
+        check_conditions.
 
+        Args:
+            doc (pymupdf.Document): The PDF document object.
+            img (Tuple): The entry of Page.get_images() describing the image.
+
+        Returns:
+            Dict: Whether the image was prefiltered, the size in KB, the pHash as hex string
+            (or None) and an error message (or None).
+        """
+        xref, smask = img[0], img[1]
+        if self.prefilter(doc, img):
+            return {"prefiltered": True, "size_kb": 0, "hash": None, "error": None}
+        stage = ImageStage(doc, xref, smask, self.stats, self.budget)
+        self.load_cached(stage)
         try:
-            os.makedirs(self.output_folder, exist_ok=True)
-        except OSError as e:
-            raise IOError(f"Failed to create output folder: {str(e)}")
+            return self.analyze_stage(stage)
+        finally:
+            self.store_cached(stage)
+            stage.release()
+
+    def analyze_stage(self, stage: ImageStage) -> Dict:
+        """
+        Computes the size and, if needed, the pHash of an image that passed prefilter.
+
+        Args:
+            stage (ImageStage): The stage of the image. Its pHash is memoized in the stage.
 
+        Returns:
+            Dict: The analysis in the format of analyze_image.
+        """
         try:
-            with pymupdf.open(self.pdf_path) as doc:
-                for page_index in range(len(doc)):
-                    self.process_page(doc, page_index, log_callback)
-        except pymupdf.fitz.FileDataError as e:
-            raise ValueError(f"Error reading PDF file: {str(e)}")
+            size_kb = stage.size_kb
+            p_hash = None
+            below_threshold = self.options["use_threshold"] and size_kb < self.threshold
+            if self.options["remove_duplicates"] and not below_threshold:
+                try:
+                    p_hash = str(self.phash_image(stage))
+                except Exception as e:
+                    raise RuntimeError(f"Failed to hash image: {str(e)}")
+            return {"prefiltered": False, "size_kb": size_kb, "hash": p_hash, "error": None}
         except Exception as e:
-            raise RuntimeError(f"Unexpected error processing PDF: {str(e)}")
+            return {"prefiltered": False, "size_kb": 0, "hash": None, "error": str(e)}
+
+    def register_xref(self, xref: int, page_index: int, image_index: int) -> bool:
+        """
+        Records a reference to an image xref in the document-level registry.
+
+        Args:
+            xref (int): The reference number of the image.
+            page_index (int): The index of the page referencing the image.
+            image_index (int): The index of the image on the page.
+
+        Returns:
+            bool: True if the xref was already registered on an earlier occurrence, False otherwise.
+        """
+        references = self.xref_registry.setdefault(xref, [])
+        references.append((page_index, image_index))
+        if len(references) > 1 and self.options["skip_repeated_xrefs"]:
+            self.counts["repeated_xref"] += 1
+        return len(references) > 1
+
+    def write_manifest(
+        self, log_callback=None, pages_completed: Optional[int] = None, page_count: Optional[int] = None
+    ) -> Optional[str]:
+        """
+        Writes a manifest of all image xrefs, their output files and page references to the output folder.
+
+        Besides the page references, the manifest records everything needed to resume the run:
+        the number of completed pages, the result settings, the document fingerprint, the
+        duplicate index and the size of every saved file. It is replaced atomically, so an
+        interrupted write never leaves a damaged manifest behind. In the 'content' output
+        layout the page links and the content index are brought up to date first.
+
+        Args:
+            log_callback (callable, optional): A function to log messages.
+            pages_completed (int, optional): The number of pages processed so far.
+            page_count (int, optional): The number of pages in the PDF.
+
+        Returns:
+            Optional[str]: The path to the written manifest, or None if writing failed.
+        """
+        manifest_path = os.path.join(self.output_folder, "manifest.json")
+        if self.options["output_layout"] == "content":
+            self.write_content_index(log_callback)
+        try:
+            files = []
+            for file_name in self.saved_files:
+                xref, smask, page_index, image_index = self.file_sources.get(file_name, (0, 0, -1, -1))
+                object_name = self.file_objects.get(file_name)
+                output_path = os.path.join(self.output_folder, *(object_name or file_name).split("/"))
+                files.append(
+                    {
+                        "file": file_name,
+                        "object": object_name,
+                        "xref": xref,
+                        "smask": smask,
+                        "page": page_index,
+                        "image": image_index,
+                        "bytes": os.path.getsize(output_path) if os.path.isfile(output_path) else None,
+                    }
+                )
+            manifest = {
+                "pdf": self.pdf_name,
+                "fingerprint": self.fingerprint if os.path.isfile(self.pdf_path) else None,
+                "settings": self.result_settings(),
+                "page_count": page_count,
+                "pages_completed": pages_completed,
+                "counts": self.counts,
+                "hashes": [str(p_hash) for p_hash in self.current_p_hashes],
+                "hash_owners": self.hash_owners,
+                "files": files,
+                "images": [
+                    {
+                        "xref": xref,
+                        "output": self.xref_outputs.get(xref),
+                        "duplicate_of": self.duplicate_of.get(xref),
+                        "references": [
+                            {"page": page_index, "image": image_index} for page_index, image_index in references
+                        ],
+                    }
+                    for xref, references in self.xref_registry.items()
+                ],
+            }
+            temp_path = manifest_path + ".tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(manifest, f, indent=2)
+            os.replace(temp_path, manifest_path)
+        except OSError as e:
+            msg = f"Warning: Failed to write manifest: {str(e)}"
+            if log_callback:
+                log_callback(msg)
+            else:
+                print(msg)
+            return None
+        return manifest_path
+
+    def write_content_index(self, log_callback=None) -> Optional[str]:
+        """
+        Links the page names to their stored objects and writes content_index.json.
+
+        Every reference to a saved image gets an entry, including repeated references to
+        the same xref and references to near-duplicates that were not saved, which name the
+        saved file they duplicate in 'duplicate_of'. With the 'content_links' option set to
+        hardlink or symlink, every entry is also created as a link to its object in the
+        output folder; with index, the index is the only way from pages to objects.
+
+        Args:
+            log_callback (callable, optional): A function to log messages.
+
+        Returns:
+            Optional[str]: The path to the written index, or None if writing failed.
+        """
+
+        def log(msg):
+            if log_callback:
+                log_callback(msg)
+            else:
+                print(msg)
+
+        entries = []
+        for xref, references in self.xref_registry.items():
+            source = xref if self.xref_outputs.get(xref) else self.duplicate_of.get(xref)
+            saved_name = self.xref_outputs.get(source)
+            object_name = self.file_objects.get(saved_name)
+            if object_name is None:
+                continue
+            extension = object_name.rsplit(".", 1)[1]
+            for page_index, image_index in references:
+                file_name = f"page_{page_index}-image_{image_index}.{extension}"
+                own_object = self.file_objects.get(file_name)
+                entries.append(
+                    {
+                        "file": file_name,
+                        "page": page_index,
+                        "image": image_index,
+                        "xref": xref,
+                        "object": own_object or object_name,
+                        "duplicate_of": None if own_object else saved_name,
+                        "near_duplicate": source != xref,
+                    }
+                )
+        entries.sort(key=lambda entry: (entry["page"], entry["image"]))
+
+        link_type = self.options["content_links"]
+        if link_type != "index":
+            failures = []
+            for entry in entries:
+                if entry["file"] in self.linked_files:
+                    continue
+                try:
+                    if self.link_file(entry["file"], entry["object"], link_type):
+                        self.linked_files.add(entry["file"])
+                except OSError as e:
+                    failures.append(str(e))
+            if failures:
+                log(
+                    f"Warning: Failed to link {len(failures)} page names to their images, they are only "
+                    f"listed in content_index.json: {failures[0]}"
+                )
+
+        object_bytes = {}
+        for entry in entries:
+            if entry["object"] not in object_bytes:
+                object_path = os.path.join(self.output_folder, *entry["object"].split("/"))
+                object_bytes[entry["object"]] = os.path.getsize(object_path) if os.path.isfile(object_path) else 0
+        index = {
+            "pdf": self.pdf_name,
+            "links": link_type,
+            "objects": len(object_bytes),
+            "object_bytes": sum(object_bytes.values()),
+            "referenced_bytes": sum(object_bytes[entry["object"]] for entry in entries),
+            "pages": entries,
+        }
+        index_path = os.path.join(self.output_folder, "content_index.json")
+        try:
+            temp_path = index_path + ".tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(index, f, indent=2)
+            os.replace(temp_path, index_path)
+        except OSError as e:
+            log(f"Warning: Failed to write content index: {str(e)}")
+            return None
+        return index_path
+
+    def link_file(self, file_name: str, object_name: str, link_type: str) -> bool:
+        """
+        Creates or replaces a page name in the output folder as a link to a stored object.
+
+        Args:
+            file_name (str): The page-based file name.
+            object_name (str): The object path relative to the output folder.
+            link_type (str): "hardlink" or "symlink".
+
+        Raises:
+            OSError: If the link cannot be created.
+
+        Returns:
+            bool: True if the page name links to the object, False if the object does not exist.
+        """
+        link_path = os.path.join(self.output_folder, file_name)
+        object_path = os.path.join(self.output_folder, *object_name.split("/"))
+        if not os.path.isfile(object_path):
+            return False
+        relative_path = os.path.relpath(object_path, os.path.dirname(link_path))
+        if os.path.islink(link_path):
+            if link_type == "symlink" and os.readlink(link_path) == relative_path:
+                return True
+        elif os.path.isfile(link_path) and link_type == "hardlink" and os.path.samefile(link_path, object_path):
+            return True
+        temp_path = link_path + ".link"
+        if os.path.lexists(temp_path):
+            os.remove(temp_path)
+        if link_type == "hardlink":
+            os.link(object_path, temp_path)
+        else:
+            os.symlink(relative_path, temp_path)
+        os.replace(temp_path, link_path)
+        return True
 
     def process_page(self, doc: pymupdf.Document, page_index: int, log_callback=None):
         """
         Processes a page of the PDF to extract and handle images.
 
+        With a matching preview session, the decisions are made from its analysis and only
+        the kept images are extracted.
+
         Args:
             doc (pymupdf.Document): The PDF document object.
             page_index (int): The index of the page to process.
             log_callback (callable, optional): A function to log messages.
 
         Raises:
-            RuntimeError: If an error occurs while processing an image.
+            ExtractionCancelled: If cancel() was called.
         """
         page = doc[page_index]
         image_list = page.get_images()
 
+        if self.session is not None:
+            occurrences = [
+                (page_index, image_index, img[0], img[1]) for image_index, img in enumerate(image_list, start=1)
+            ]
+            for _, image_index, xref, smask in self.decide_images([(occurrences, self.session.analyses)], log_callback):
+                self.check_cancelled()
+                try:
+                    file_name = self.save_image(doc, xref, smask, page_index, image_index)
+                    self.record_output(xref, file_name, page_index, image_index, smask)
+                except Exception as e:
+                    self.report_failure(page_index, image_index, f"Failed to process image: {str(e)}", log_callback)
+            return
+
         for image_index, img in enumerate(image_list, start=1):
+            self.check_cancelled()
             try:
                 self.process_image(doc, page_index, image_index, img, log_callback)
             except Exception as e:
-                msg = f"Warning: Failed to process image {image_index} on page {page_index}: {str(e)}"
-                if log_callback:
-                    log_callback(msg)
-                else:
-                    print(msg)
+                self.report_failure(page_index, image_index, str(e), log_callback)
 
-    def process_image(
-        self, doc: pymupdf.Document, page_index: int, image_index: int, img: Tuple, log_callback=None
-    ):
+    def process_image(self, doc: pymupdf.Document, page_index: int, image_index: int, img: Tuple, log_callback=None):
         """
         Processes an image from a PDF page if it is larger than a threshold. It also checks if the image is a duplicate.
+        Repeated occurrences of an already processed xref are only recorded in the xref registry, and images
+        rejected by prefilter are skipped without extracting them.
 
         Args:
             doc (pymupdf.Document): The PDF document object.
             page_index (int): The index of the page containing the image.
             image_index (int): The index of the image on the page.
-            img (Tuple): A tuple containing image reference and smask.
+            img (Tuple): A tuple containing image reference and smask, usually the full entry of Page.get_images().
             log_callback (callable, optional): A function to log messages.
 
         Raises:
             RuntimeError: If an error occurs while processing the image.
         """
         xref, smask = img[0], img[1]
-        try:
-            image_bytes = doc.extract_image(xref)["image"]
-            img_size = len(image_bytes) / 1024
-            pil_image = Image.open(io.BytesIO(image_bytes))
+        if self.register_xref(xref, page_index, image_index) and self.options["skip_repeated_xrefs"]:
+            return
+        if self.prefilter(doc, img):
+            self.counts["prefiltered"] += 1
+            self.record_output(xref, None)
+            self.report_progress(images=1)
+            return
 
-            if self.check_conditions(img_size, pil_image, log_callback):
+        stage = ImageStage(doc, xref, smask, self.stats, self.budget)
+        self.load_cached(stage)
+        try:
+            if self.check_conditions(stage.size_kb, stage, log_callback, xref):
+                self.record_output(xref, None)
                 return
 
-            self.save_image(doc, xref, smask, page_index, image_index)
+            file_name = self.save_image(doc, xref, smask, page_index, image_index, stage)
+            self.record_output(xref, file_name, page_index, image_index, smask)
         except Exception as e:
             raise RuntimeError(f"Failed to process image: {str(e)}")
+        finally:
+            self.report_progress(images=1, size_kb=stage.known_size_kb or 0)
+            self.store_cached(stage)
+            stage.release()
+
+    def prefilter(self, doc: pymupdf.Document, img: Tuple) -> bool:
+        """
+        Rejects images from their metadata alone, before anything is extracted.
+
+        The width and height reported by Page.get_images are compared against the
+        'min_dimension' option. The threshold is only checked for JPEG and JPEG 2000 images,
+        whose stream length equals the size used by check_conditions; other images are
+        re-encoded on extraction and are left to check_conditions.
+
+        Args:
+            doc (pymupdf.Document): The PDF document object.
+            img (Tuple): The entry of Page.get_images() describing the image. Tuples with
+                only the reference and smask are never rejected.
+
+        Returns:
+            bool: True if the image can be skipped without extracting it, False otherwise.
+        """
+        if len(img) < 9:
+            return False
+        with timed(self.stats, "prefilter"):
+            return self._prefilter(doc, img)
+
+    def _prefilter(self, doc: pymupdf.Document, img: Tuple) -> bool:
+        xref, width, height, image_filter = img[0], img[2], img[3], img[8]
+        min_dimension = self.options["min_dimension"]
+        if min_dimension and min(width, height) < min_dimension:
+            return True
+        if self.options["use_threshold"] and self.threshold > 0 and image_filter in PASSTHROUGH_FILTERS:
+            length = stream_length(doc, xref)
+            if length is not None and length / 1024 < self.threshold:
+                return True
+        return False
 
-    def check_conditions(self, img_size: int, image:Image.Image, log_callback=None) -> bool:
+    def check_conditions(
+        self, img_size: int, image: Image.Image, log_callback=None, xref: Optional[int] = None
+    ) -> bool:
         """
         Checks if the image size is less than the threshold or if the image is a duplicate.
         Respects the options set by the user.
 
         Args:
             img_size (int): The size of the image in KB.
-            image (Image.Image): The image to check for duplicates.
+            image (Image.Image | ImageStage): The image to check for duplicates. An ImageStage
+                is only decoded if the duplicate check is reached.
             log_callback (callable, optional): A function to log messages.
+            xref (int, optional): The reference number of the image. If given, the xref whose
+                hash a duplicate matched is recorded in self.duplicate_of.
 
         Returns:
             bool: True if the image should be skipped, False otherwise.
         """
         if self.options["use_threshold"] and img_size < self.threshold:
+            self.counts["below_threshold"] += 1
             return True
 
         if self.options["remove_duplicates"]:
             try:
                 hash_to_check = self.phash_image(image)
-                if self.is_duplicate(hash_to_check):
+                match = self.find_duplicate(hash_to_check)
+                if match is not None:
+                    self.counts["duplicate"] += 1
+                    if xref is not None and str(match) in self.hash_owners:
+                        self.duplicate_of[xref] = self.hash_owners[str(match)]
                     msg = f"Duplicate image found: {hash_to_check}"
                     if log_callback:
                         log_callback(msg)
                     else:
                         print(msg)
                     return True
-                self.current_p_hashes.append(hash_to_check)
+                self.current_p_hashes.add(hash_to_check)
+                if xref is not None:
+                    self.hash_owners.setdefault(str(hash_to_check), xref)
             except Exception as e:
                 raise RuntimeError(f"Failed to hash image: {str(e)}")
 
@@ -738,39 +3616,128 @@ class PDFImageExtractor:
         smask: int,
         page_index: int,
         image_index: int,
-    ):
+        stage: Optional[ImageStage] = None,
+    ) -> str:
         """
         Saves an image from a PDF page to the output folder.
 
+        With the 'raw_passthrough' option enabled, images without a soft mask are written
+        as their original encoded stream with its native extension, skipping the decode.
+        Other images are decoded, composed with their soft mask and encoded with the settings
+        of self.encoder, which also picks the extension. PNG with the default settings is
+        encoded by pymupdf on this thread, other formats by PIL on a writer thread. In the
+        'content' output layout the image is stored under its content digest instead, see
+        output_target. While an asynchronous writer is active the file is only queued; errors
+        are reported when it is written.
+
         Args:
             doc (pymupdf.Document): The PDF document object.
             xref (int): The reference number of the image.
             smask (int): The soft mask reference number.
             page_index (int): The index of the page containing the image.
             image_index (int): The index of the image on the page.
+            stage (ImageStage, optional): The pipeline stage holding the already extracted image.
 
         Raises:
             IOError: If saving the image fails.
+
+        Returns:
+            str: The file name of the saved image.
         """
+        own_stage = stage is None
+        if own_stage:
+            stage = ImageStage(doc, xref, smask, self.stats, self.budget)
         try:
-            pix = self.create_pixmap(doc, xref, smask)
-            output_path = os.path.join(
-                self.output_folder, f"page_{page_index}-image_{image_index}.png"
+            if self.options["raw_passthrough"] and smask == 0:
+                file_name = f"page_{page_index}-image_{image_index}.{stage.base_image['ext']}"
+                target = self.output_target(file_name, stage.image_bytes)
+                if target is not None:
+                    self.write_output(target, stage.image_bytes)
+                return file_name
+
+            pix = self.create_pixmap(doc, xref, smask, stage)
+            extension, save_arguments = self.encoder.settings_for(stage.base_image["ext"], bool(pix.alpha))
+            file_name = f"page_{page_index}-image_{image_index}.{extension}"
+            target = self.output_target(
+                file_name, pix.samples_mv, (pix.width, pix.height, pix.n, pix.alpha, save_arguments)
             )
-            pix.save(output_path)
+            if target is None:
+                return file_name
+            if save_arguments is None:
+                # pymupdf encodes about six times faster than PIL; it has to run here since
+                # pymupdf objects stay on this thread, the writer threads only write the bytes
+                with timed(self.stats, "encode", len(pix.samples_mv)) as sizes:
+                    data = pix.tobytes("png")
+                    sizes["bytes_out"] = len(data)
+                self.write_output(target, data)
+            elif self.writer is not None:
+                # Copy the samples so encoding can run on a writer thread; the copy stays in
+                # the memory budget until it is written
+                image = pixmap_to_image(pix, copy=True)[0]
+                reserved = len(pix.samples_mv)
+                self.budget.acquire(reserved, admitted=True)
+                self.write_output(target, image, reserved, save_arguments)
+            else:
+                image, source = pixmap_to_image(pix)  # source owns the samples while encoding
+                self.write_output(target, image, save_arguments=save_arguments)
+            return file_name
         except Exception as e:
             raise IOError(f"Failed to save image: {str(e)}")
+        finally:
+            if own_stage:
+                stage.release()
+
+    def output_target(self, file_name: str, content, description: Tuple = ()) -> Optional[str]:
+        """
+        Decides where in the output folder an image is written.
+
+        In the 'pages' layout this is file_name itself. In the 'content' layout the image is
+        stored once as objects/<digest[:2]>/<digest>.<ext>, where the digest covers the
+        encoded stream, or the decoded pixels together with their description and encoder
+        settings. file_name is linked to the object when the manifest is written, see
+        write_content_index.
+
+        Args:
+            file_name (str): The page-based name of the image.
+            content (bytes | memoryview): The encoded stream or the decoded samples.
+            description (Tuple): Everything besides the content that changes the written file.
+
+        Returns:
+            Optional[str]: The path to write, relative to the output folder, or None if the
+            same content is already stored and nothing has to be written.
+        """
+        if self.options["output_layout"] != "content":
+            return file_name
+        digest = hashlib.blake2b(repr(description).encode(), digest_size=16)
+        digest.update(content)
+        digest = digest.hexdigest()
+        object_name = f"objects/{digest[:2]}/{digest}.{file_name.rsplit('.', 1)[1]}"
+        self.file_objects[file_name] = object_name
+        object_path = os.path.join(self.output_folder, *object_name.split("/"))
+        if object_name in self.stored_objects or os.path.isfile(object_path):
+            self.stored_objects.add(object_name)
+            self.stats.record_cache("content_store", {"hits": 1, "misses": 0})
+            return None
+        os.makedirs(os.path.dirname(object_path), exist_ok=True)
+        self.stored_objects.add(object_name)
+        self.stats.record_cache("content_store", {"hits": 0, "misses": 1})
+        return object_name
 
     def create_pixmap(
-        self, doc: pymupdf.Document, xref: int, smask: int
+        self, doc: pymupdf.Document, xref: int, smask: int, stage: Optional[ImageStage] = None
     ) -> pymupdf.Pixmap:
         """
         Creates a pixmap from a PDF image reference and optional soft mask.
 
+        Soft masks are taken from self.mask_cache, so a mask shared by several images is
+        decoded once.
+
         Args:
             doc (pymupdf.Document): The PDF document object.
             xref (int): The reference number of the image.
             smask (int): The soft mask reference number.
+            stage (ImageStage, optional): The pipeline stage whose decoded pixmap is reused. The
+                soft mask and the composed pixmap are added to its memory budget reservation.
 
         Raises:
             RuntimeError: If creating the pixmap fails.
@@ -779,26 +3746,598 @@ class PDFImageExtractor:
             pymupdf.Pixmap: The created pixmap.
         """
         try:
-            pix1 = pymupdf.Pixmap(doc.extract_image(xref)["image"])
+            if stage is None:
+                stage = ImageStage(doc, xref, 0, self.stats)
+            pix1 = stage.pixmap
             if smask > 0:
-                mask = pymupdf.Pixmap(doc.extract_image(smask)["image"])
-                return pymupdf.Pixmap(pix1, mask)
+                mask = self.mask_cache.get(doc, smask, self.stats)
+                with timed(self.stats, "smask"):
+                    pix = pymupdf.Pixmap(pix1, mask)
+                stage.reserve(len(mask.samples_mv) + len(pix.samples_mv))
+                return pix
             return pix1
         except Exception as e:
             raise RuntimeError(f"Failed to create pixmap: {str(e)}")
 
 
-def main():
+class SharedHashIndex:
+    """
+    Near-duplicate index shared by all documents of a corpus.
+
+    Wraps any index from HASH_INDEXES and remembers which document added each hash, so
+    matches against images of other documents can be counted per document.
+    """
+
+    def __init__(self, index):
+        self.index = index
+        self.document: Optional[str] = None
+        self.origins: Dict[str, str] = {}
+        self.cross_document_matches: Dict[str, int] = {}
+
+    def add(self, p_hash: imagehash.ImageHash):
+        self.index.add(p_hash)
+        self.origins.setdefault(str(p_hash), self.document)
+
+    def find(self, p_hash: imagehash.ImageHash, radius: int) -> Optional[imagehash.ImageHash]:
+        match = self.index.find(p_hash, radius)
+        if match is not None and self.origins.get(str(match)) != self.document:
+            self.cross_document_matches[self.document] = self.cross_document_matches.get(self.document, 0) + 1
+        return match
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def __iter__(self) -> Iterator[imagehash.ImageHash]:
+        return iter(self.index)
+
+
+class CorpusExtractor:
+    """
+    Extracts images from a corpus of PDFs with one near-duplicate index shared by all documents.
+
+    The pages of all documents are analyzed concurrently on one process pool. Decisions are
+    then made document by document in input order against the shared index, so an image is
+    only saved the first time it appears anywhere in the corpus and the result does not
+    depend on scheduling. Writing of all documents again runs concurrently.
+    """
+
+    def __init__(self, template: PDFImageExtractor, output_root: str):
+        """
+        Args:
+            template (PDFImageExtractor): Extractor whose options and threshold are used for every document.
+            output_root (str): Folder receiving one subfolder per document and the corpus report.
+        """
+        self.template = template
+        self.output_root = output_root
+        self.shared_index: Optional[SharedHashIndex] = None
+
+    def extractor_for(self, pdf_path: str) -> PDFImageExtractor:
+        """
+        Creates the extractor for one document of the corpus.
+
+        Args:
+            pdf_path (str): The path to the PDF file.
+
+        Returns:
+            PDFImageExtractor: An extractor with the template settings and its own output folder.
+        """
+        extractor = PDFImageExtractor()
+        extractor.threshold = self.template.threshold
+        extractor.options.update(self.template.options)
+        extractor.set_pdf_file(pdf_path)
+        extractor.output_folder = os.path.join(self.output_root, f"extracted_img_from_{os.path.basename(pdf_path)}")
+        return extractor
+
+    def run(self, pdf_paths: List[str], log_callback=None, executor: Optional[Executor] = None) -> Dict:
+        """
+        Processes all documents and writes corpus_report.json to the output root.
+
+        Args:
+            pdf_paths (List[str]): The PDF files of the corpus, in the order their images take precedence.
+            log_callback (callable, optional): A function to log messages.
+            executor (Executor, optional): A process pool to use instead of creating one.
+
+        Returns:
+            Dict: The corpus report with one entry per document and corpus totals.
+        """
+        if executor is None:
+            with ProcessPoolExecutor(max_workers=max(1, self.template.options["workers"])) as own_executor:
+                return self.run(pdf_paths, log_callback, own_executor)
+
+        os.makedirs(self.output_root, exist_ok=True)
+        self.shared_index = SharedHashIndex(self.template.create_hash_index())
+        documents = []
+
+        # Analysis of every document is submitted up front, so the pool stays busy across documents
+        for pdf_path in pdf_paths:
+            entry = {"pdf": pdf_path, "extractor": None, "futures": None, "error": None}
+            try:
+                extractor = self.extractor_for(pdf_path)
+                extractor.prepare_extraction()
+                with pymupdf.open(pdf_path) as doc:
+                    page_count = len(doc)
+                entry["extractor"] = extractor
+                entry["futures"] = extractor.submit_analysis(executor, 0, page_count)
+            except Exception as e:
+                entry["error"] = str(e)
+            documents.append(entry)
+
+        for entry in documents:
+            if entry["error"]:
+                continue
+            extractor = entry["extractor"]
+            self.shared_index.document = entry["pdf"]
+            extractor.current_p_hashes = self.shared_index
+            try:
+                entry["kept"] = extractor.decide_images((future.result() for future in entry["futures"]), log_callback)
+                entry["futures"] = extractor.submit_writes(entry["kept"], executor)
+            except Exception as e:
+                entry["error"] = str(e)
+
+        for entry in documents:
+            if entry["error"]:
+                continue
+            extractor = entry["extractor"]
+            try:
+                extractor.collect_writes(entry["kept"], entry["futures"], log_callback)
+                extractor.write_manifest(log_callback)
+                extractor.stats.finish(extractor.counts)
+            except Exception as e:
+                entry["error"] = str(e)
+
+        report = self.build_report(documents)
+        report_path = os.path.join(self.output_root, "corpus_report.json")
+        try:
+            with open(report_path, "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2)
+        except OSError as e:
+            msg = f"Warning: Failed to write corpus report: {str(e)}"
+            if log_callback:
+                log_callback(msg)
+            else:
+                print(msg)
+        return report
+
+    def build_report(self, documents: List[Dict]) -> Dict:
+        """
+        Summarizes unique and duplicate images per document and for the whole corpus.
+
+        Args:
+            documents (List[Dict]): The per-document state collected by run().
+
+        Returns:
+            Dict: The corpus report.
+        """
+        entries = []
+        totals = dict.fromkeys(IMAGE_COUNTS, 0)
+        totals["cross_document_duplicate"] = 0
+        for entry in documents:
+            extractor = entry["extractor"]
+            report_entry = {
+                "pdf": entry["pdf"],
+                "status": "failed" if entry["error"] else "ok",
+                "error": entry["error"],
+                "output_folder": extractor.output_folder if extractor else None,
+                "counts": dict(extractor.counts) if extractor and not entry["error"] else {},
+                "stats": extractor.stats.to_dict() if extractor and not entry["error"] else {},
+            }
+            if not entry["error"]:
+                report_entry["counts"]["cross_document_duplicate"] = self.shared_index.cross_document_matches.get(
+                    entry["pdf"], 0
+                )
+                for name, value in report_entry["counts"].items():
+                    totals[name] += value
+            entries.append(report_entry)
+
+        return {
+            "documents": entries,
+            "totals": {
+                "documents": len(entries),
+                "failed_documents": sum(1 for entry in entries if entry["status"] == "failed"),
+                "unique_images": totals["saved"],
+                "duplicate_images": totals["duplicate"] + totals["repeated_xref"],
+                **totals,
+            },
+        }
+
+
+def _analyze_page_range(
+    settings: Dict, page_range: Tuple[int, int]
+) -> Tuple[List[Tuple[int, int, int, int]], Dict[int, Dict], Dict]:
+    """
+    Worker process entry point for the analysis step of process_pages_parallel.
+
+    Args:
+        settings (Dict): The settings collected by PDFImageExtractor.worker_settings().
+        page_range (Tuple[int, int]): The start (inclusive) and stop (exclusive) page index.
+
+    Returns:
+        Tuple[List[Tuple[int, int, int, int]], Dict[int, Dict], Dict]: All image references as
+        (page_index, image_index, xref, smask) in page order, the analysis of every xref
+        referenced in the range, and the statistics of the worker.
+    """
+    extractor = PDFImageExtractor.from_worker_settings(settings)
+    occurrences = []
+    analyses = {}
+    with pymupdf.open(settings["pdf_path"]) as doc:
+        for page_index in range(*page_range):
+            for image_index, img in enumerate(doc[page_index].get_images(), start=1):
+                xref, smask = img[0], img[1]
+                occurrences.append((page_index, image_index, xref, smask))
+                if xref not in analyses:
+                    analyses[xref] = extractor.analyze_image(doc, img)
+    if extractor.cache is not None:
+        extractor.cache.close()
+    extractor.stats.record_memory(extractor.budget)
+    return occurrences, analyses, extractor.stats.to_dict()
+
+
+def _save_image_batch(
+    settings: Dict, jobs: List[Tuple[int, int, int, int]]
+) -> Tuple[List[Tuple[Optional[str], Optional[str]]], Dict, Dict[str, str]]:
+    """
+    Worker process entry point for the writing step of process_pages_parallel.
+
+    Args:
+        settings (Dict): The settings collected by PDFImageExtractor.worker_settings().
+        jobs (List[Tuple[int, int, int, int]]): The (page_index, image_index, xref, smask) images to save.
+
+    Returns:
+        Tuple[List[Tuple[Optional[str], Optional[str]]], Dict, Dict[str, str]]: The saved file
+        name and error message for each job, the statistics of the worker and the content
+        objects of the saved files.
+    """
+    extractor = PDFImageExtractor.from_worker_settings(settings)
+    results = []
+    with pymupdf.open(settings["pdf_path"]) as doc:
+        for page_index, image_index, xref, smask in jobs:
+            try:
+                results.append((extractor.save_image(doc, xref, smask, page_index, image_index), None))
+            except Exception as e:
+                results.append((None, str(e)))
+    extractor.stats.record_memory(extractor.budget)
+    extractor.stats.record_cache("smask", extractor.mask_cache.counters())
+    return results, extractor.stats.to_dict(), extractor.file_objects
+
+
+def collect_pdf_paths(inputs: List[str], recursive: bool = False) -> List[str]:
+    """
+    Expands command-line inputs into a list of PDF files.
+
+    Args:
+        inputs (List[str]): PDF files, directories and glob patterns.
+        recursive (bool): Whether directories are searched recursively.
+
+    Returns:
+        List[str]: The PDF files in input order, without duplicates. Inputs that match
+        nothing are kept as they are, so they show up as failures in the summary.
+    """
+    pdf_paths = []
+    for item in inputs:
+        if os.path.isdir(item):
+            pattern = os.path.join(item, "**", "*.pdf") if recursive else os.path.join(item, "*.pdf")
+            matches = sorted(glob.glob(pattern, recursive=recursive))
+        elif glob.has_magic(item):
+            matches = sorted(path for path in glob.glob(item, recursive=True) if os.path.isfile(path))
+        else:
+            matches = [item]
+        for path in matches:
+            if path not in pdf_paths:
+                pdf_paths.append(path)
+    return pdf_paths
+
+
+def build_arg_parser() -> argparse.ArgumentParser:
+    """
+    Creates the parser for the command-line interface.
+
+    Returns:
+        argparse.ArgumentParser: The configured parser.
+    """
+    defaults = PDFImageExtractor().options
+    parser = argparse.ArgumentParser(
+        prog="PDF_Image_Extractor",
+        description="Extract images from PDF files. Without arguments the graphical interface is started.",
+    )
+    parser.add_argument("inputs", nargs="+", help="PDF files, directories or glob patterns")
+    parser.add_argument(
+        "-o",
+        "--output",
+        help="Folder for the extracted images. Each PDF gets its own "
+        "subfolder. Defaults to a folder next to each PDF.",
+    )
+    parser.add_argument("-r", "--recursive", action="store_true", help="Search directories recursively")
+    parser.add_argument("-t", "--threshold", type=float, default=0, help="Minimum image size in KB")
+    parser.add_argument(
+        "--remove-duplicates",
+        action=argparse.BooleanOptionalAction,
+        default=defaults["remove_duplicates"],
+        help="Skip near-duplicate images",
+    )
+    parser.add_argument(
+        "--min-dimension",
+        type=int,
+        default=defaults["min_dimension"],
+        help="Skip images narrower or lower than this many pixels",
+    )
+    parser.add_argument("--phash-size", type=int, default=defaults["phash_size"], help="pHash size")
+    parser.add_argument(
+        "--phash-threshold", type=int, default=defaults["phash_threshold"], help="Maximum pHash distance of duplicates"
+    )
+    parser.add_argument(
+        "--reduced-phash",
+        action=argparse.BooleanOptionalAction,
+        default=defaults["reduced_phash"],
+        help="Hash a reduced-resolution decode of each image",
+    )
+    parser.add_argument(
+        "--raw-passthrough",
+        action=argparse.BooleanOptionalAction,
+        default=defaults["raw_passthrough"],
+        help="Write unmasked images in their original encoding",
+    )
+    parser.add_argument(
+        "--output-preset",
+        choices=sorted(OUTPUT_PRESETS) + ["auto"],
+        default=defaults["output_preset"],
+        help="Encoder of the saved images; auto keeps JPEG sources as JPEG and writes others as PNG",
+    )
+    parser.add_argument(
+        "--quality",
+        type=int,
+        default=defaults["output_quality"],
+        help="JPEG and WebP quality 1-100 (default: the preset's)",
+    )
+    parser.add_argument(
+        "--compress-level",
+        type=int,
+        default=defaults["output_compression"],
+        help="PNG compression level 0-9 (default: the preset's)",
+    )
+    parser.add_argument(
+        "--layout",
+        choices=OUTPUT_LAYOUTS,
+        default=defaults["output_layout"],
+        help="pages: one file per page image; content: store each unique image once under "
+        "objects/ and list every page reference in content_index.json",
+    )
+    parser.add_argument(
+        "--links",
+        choices=CONTENT_LINKS,
+        default=defaults["content_links"],
+        help="How page names point to stored images in the content layout",
+    )
+    parser.add_argument(
+        "--use-cache",
+        action=argparse.BooleanOptionalAction,
+        default=defaults["use_cache"],
+        help="Reuse image sizes and pHashes from earlier runs",
+    )
+    parser.add_argument("--cache-dir", default=defaults["cache_dir"], help="Folder of the persistent cache")
+    parser.add_argument(
+        "--resume",
+        action=argparse.BooleanOptionalAction,
+        default=defaults["resume"],
+        help="Continue interrupted extractions from the manifest in the output folder",
+    )
+    parser.add_argument(
+        "--memory-budget",
+        type=float,
+        default=defaults["memory_budget_mb"],
+        metavar="MB",
+        help="Cap on the decoded image pixels held at once, divided between the workers " "(default: unlimited)",
+    )
+    parser.add_argument(
+        "-w", "--workers", type=int, default=os.cpu_count() or 1, help="Number of worker processes shared by all PDFs"
+    )
+    parser.add_argument(
+        "--cross-document-dedupe",
+        action="store_true",
+        help="Share one duplicate index across all PDFs and write corpus_report.json "
+        "to the output folder (requires --output)",
+    )
+    parser.add_argument(
+        "--stats-json", metavar="FILE", help="Write the per-stage timings and counters of every PDF to a JSON file"
+    )
+    parser.add_argument("-q", "--quiet", action="store_true", help="Only print the summary")
+    return parser
+
+
+def extractor_from_args(args: argparse.Namespace) -> PDFImageExtractor:
+    """
+    Creates an extractor configured from parsed command-line arguments.
+
+    Args:
+        args (argparse.Namespace): The arguments parsed by build_arg_parser().
+
+    Returns:
+        PDFImageExtractor: The configured extractor, without PDF file and output folder.
+    """
+    extractor = PDFImageExtractor()
+    extractor.threshold = args.threshold
+    extractor.options.update(
+        {
+            "use_threshold": args.threshold > 0,
+            "remove_duplicates": args.remove_duplicates,
+            "min_dimension": max(0, args.min_dimension),
+            "phash_size": args.phash_size,
+            "phash_threshold": args.phash_threshold,
+            "reduced_phash": args.reduced_phash,
+            "raw_passthrough": args.raw_passthrough,
+            "output_preset": args.output_preset,
+            "output_quality": max(0, min(100, args.quality)),
+            "output_compression": min(9, args.compress_level),
+            "output_layout": args.layout,
+            "content_links": args.links,
+            "use_cache": args.use_cache,
+            "cache_dir": args.cache_dir,
+            "resume": args.resume,
+            "memory_budget_mb": max(0, args.memory_budget),
+            "workers": max(1, args.workers),
+        }
+    )
+    return extractor
+
+
+def run_cli(argv: List[str]) -> int:
+    """
+    Runs the headless command-line interface.
+
+    All PDFs are processed one after another on one shared process pool, or as one corpus
+    with a shared duplicate index when --cross-document-dedupe is given.
+
+    Args:
+        argv (List[str]): The command-line arguments without the program name.
+
+    Returns:
+        int: The exit code, 0 if every PDF was processed and 1 otherwise.
+    """
+    args = build_arg_parser().parse_args(argv)
+    pdf_paths = collect_pdf_paths(args.inputs, args.recursive)
+    if not pdf_paths:
+        print("Error: No PDF files found.", file=sys.stderr)
+        return 1
+    if args.cross_document_dedupe and not args.output:
+        print("Error: --cross-document-dedupe requires --output.", file=sys.stderr)
+        return 1
+
+    log_callback = (lambda msg: None) if args.quiet else None
+    if args.cross_document_dedupe:
+        results = run_cli_corpus(args, pdf_paths, log_callback)
+    else:
+        results = run_cli_batch(args, pdf_paths, log_callback)
+
+    print("----------------------------------------")
+    for pdf_path, succeeded, detail in results:
+        print(f"{'OK' if succeeded else 'FAILED'}: {pdf_path}: {detail}")
+    failures = sum(1 for _, succeeded, _ in results if not succeeded)
+    print(f"{len(results) - failures} of {len(results)} PDF files processed successfully.")
+    return 1 if failures else 0
+
+
+def write_stats_json(path: str, documents: List[Dict]):
+    """
+    Writes the pipeline statistics of the processed PDFs to a JSON file.
+
+    Args:
+        path (str): The path of the file.
+        documents (List[Dict]): One entry per PDF with its path under "pdf" and PipelineStats.to_dict().
+    """
+    try:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"documents": documents}, f, indent=2)
+    except OSError as e:
+        print(f"Warning: Failed to write statistics: {str(e)}", file=sys.stderr)
+
+
+def run_cli_batch(args: argparse.Namespace, pdf_paths: List[str], log_callback=None) -> List[Tuple[str, bool, str]]:
+    """
+    Extracts every PDF independently, sharing one process pool.
+
+    Args:
+        args (argparse.Namespace): The arguments parsed by build_arg_parser().
+        pdf_paths (List[str]): The PDF files to process.
+        log_callback (callable, optional): A function to log messages.
+
+    Returns:
+        List[Tuple[str, bool, str]]: The path, success flag and summary of every PDF.
+    """
+    results = []
+    statistics = []
+    executor = ProcessPoolExecutor(max_workers=args.workers) if args.workers > 1 else None
+    try:
+        for pdf_path in pdf_paths:
+            extractor = extractor_from_args(args)
+            folder_name = f"extracted_img_from_{os.path.basename(pdf_path)}"
+            if args.output:
+                extractor.output_folder = os.path.join(args.output, folder_name)
+            else:
+                extractor.output_folder = os.path.join(os.path.dirname(pdf_path), folder_name)
+
+            try:
+                extractor.set_pdf_file(pdf_path)
+                if not args.quiet:
+                    print(f"Extracting images from {pdf_path}...")
+                saved = extractor.extract_and_save_images(log_callback=log_callback, executor=executor)
+                results.append((pdf_path, True, f"{saved} images saved to {extractor.output_folder}"))
+                statistics.append({"pdf": pdf_path, **extractor.stats.to_dict()})
+            except Exception as e:
+                results.append((pdf_path, False, str(e)))
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    if args.stats_json:
+        write_stats_json(args.stats_json, statistics)
+    return results
+
+
+def run_cli_corpus(args: argparse.Namespace, pdf_paths: List[str], log_callback=None) -> List[Tuple[str, bool, str]]:
+    """
+    Extracts all PDFs as one corpus with cross-document duplicate elimination.
+
+    Args:
+        args (argparse.Namespace): The arguments parsed by build_arg_parser().
+        pdf_paths (List[str]): The PDF files to process.
+        log_callback (callable, optional): A function to log messages.
+
+    Returns:
+        List[Tuple[str, bool, str]]: The path, success flag and summary of every PDF.
+    """
+    if not args.quiet:
+        print(f"Extracting images from {len(pdf_paths)} PDF files as one corpus...")
+    report = CorpusExtractor(extractor_from_args(args), args.output).run(pdf_paths, log_callback)
+
+    results = []
+    for entry in report["documents"]:
+        if entry["status"] == "ok":
+            counts = entry["counts"]
+            detail = (
+                f"{counts['saved']} unique images saved, {counts['duplicate']} duplicates "
+                f"({counts['cross_document_duplicate']} from other documents)"
+            )
+            results.append((entry["pdf"], True, detail))
+        else:
+            results.append((entry["pdf"], False, entry["error"]))
+    if args.stats_json:
+        write_stats_json(
+            args.stats_json,
+            [{"pdf": entry["pdf"], **entry["stats"]} for entry in report["documents"] if entry["status"] == "ok"],
+        )
+    totals = report["totals"]
+    print(
+        f"Corpus: {totals['unique_images']} unique images, {totals['duplicate_images']} duplicate "
+        f"references. Report: {os.path.join(args.output, 'corpus_report.json')}"
+    )
+    return results
+
+
+def main(argv: Optional[List[str]] = None):
     """
-    Initializes the main application window and starts the Tkinter event loop.
+    Starts the command-line interface if arguments are given, otherwise the GUI.
+
+    Without arguments this function creates an instance of the PDFImageExtractorGUI
+    class and starts the Tkinter main loop to run the GUI application. If Python was
+    built without Tk, it exits with an error pointing to the command-line interface.
 
-    This function creates an instance of the PDFImageExtractorGUI class and
-    starts the Tkinter main loop to run the GUI application.
+    Args:
+        argv (List[str], optional): The command-line arguments, defaults to sys.argv[1:].
     """
+    argv = sys.argv[1:] if argv is None else argv
+    if argv:
+        sys.exit(run_cli(argv))
+    if tk is None:
+        print(
+            "Error: The GUI needs tkinter, which this Python installation does not provide. "
+            "Run with arguments to use the command line, see --help.",
+            file=sys.stderr,
+        )
+        sys.exit(2)
+
     root = tk.Tk()
     _ = PDFImageExtractorGUI(root)
     root.mainloop()
 
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()
     main()
@@ -0,0 +1,138 @@
+"""
+Compares encode time and file size of the output encoder presets.
+
+Photo-like images (treated as JPEG sources) and flat graphics with text-like edges
+(treated as Flate sources) are generated, or the images of the given PDFs are decoded.
+Every image is encoded with every preset of OUTPUT_PRESETS and with "auto", the way
+PDFImageExtractor.save_image does: by pymupdf for the default "png" preset, by PIL
+otherwise. The script prints the time per image, the throughput in decoded megapixels
+per second and the output size relative to the default PNG preset.
+
+Usage:
+    python benchmarks/bench_encoders.py [--pdf FILE ...] [--images 6] [--size 1600 1200] [--repeat 3]
+"""
+
+import argparse
+import io
+import os
+import sys
+import time
+
+import numpy as np
+import pymupdf
+from PIL import Image, ImageDraw, ImageFilter
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PDF_Image_Extractor import OUTPUT_PRESETS, OutputEncoder, pixmap_to_image
+
+
+def make_photo(size, rng):
+    """Creates a photo-like image: smooth random shapes with fine noise on top."""
+    width, height = size
+    coarse = rng.integers(0, 256, (9, 12, 3), dtype=np.uint8)
+    image = Image.fromarray(coarse).resize((width, height), Image.BICUBIC)
+    noise = rng.normal(0, 10, (height, width, 3))
+    pixels = np.clip(np.asarray(image, dtype=np.float32) + noise, 0, 255).astype(np.uint8)
+    return Image.fromarray(pixels).filter(ImageFilter.SMOOTH)
+
+
+def make_graphic(size, rng):
+    """Creates a diagram-like image: flat boxes, lines and short strokes on white."""
+    image = Image.new("RGB", size, "white")
+    draw = ImageDraw.Draw(image)
+    width, height = size
+    for _ in range(40):
+        x, y = int(rng.integers(width)), int(rng.integers(height))
+        color = tuple(int(c) for c in rng.integers(0, 256, 3))
+        draw.rectangle(
+            [x, y, x + int(rng.integers(20, width // 4)), y + int(rng.integers(20, height // 4))],
+            outline=color,
+            width=3,
+        )
+    for _ in range(400):
+        x, y = int(rng.integers(width)), int(rng.integers(height))
+        draw.line([x, y, x + int(rng.integers(4, 30)), y], fill="black", width=2)
+    return image
+
+
+def pdf_images(paths):
+    """Decodes the images of PDFs the way save_image does, with their source extension."""
+    images = []
+    for path in paths:
+        with pymupdf.open(path) as doc:
+            seen = set()
+            for page in doc:
+                for img in page.get_images(full=True):
+                    if img[0] in seen:
+                        continue
+                    seen.add(img[0])
+                    base_image = doc.extract_image(img[0])
+                    image = pixmap_to_image(pymupdf.Pixmap(base_image["image"]), copy=True)[0]
+                    images.append((base_image["ext"], image))
+    return images
+
+
+def to_pixmap(image):
+    """Returns a pymupdf pixmap with the pixels of an RGB or RGBA image, as save_image has it."""
+    alpha = image.mode == "RGBA"
+    return pymupdf.Pixmap(pymupdf.csRGB, image.width, image.height, image.tobytes(), alpha)
+
+
+def encode_all(encoder, images, pixmaps, repeat):
+    """Encodes every image repeat times and returns the best time per image and the total size."""
+    best = None
+    for _ in range(repeat):
+        total_size = 0
+        start = time.perf_counter()
+        for (source_ext, image), pix in zip(images, pixmaps):
+            save_arguments = encoder.settings_for(source_ext, "A" in image.getbands())[1]
+            if save_arguments is None:
+                total_size += len(pix.tobytes("png"))
+                continue
+            buffer = io.BytesIO()
+            image.save(buffer, **save_arguments)
+            total_size += buffer.tell()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best / len(images), total_size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdf", nargs="+", help="PDF files to take the images from instead of generated ones")
+    parser.add_argument("--images", type=int, default=6, help="Number of generated images of each kind")
+    parser.add_argument("--size", type=int, nargs=2, default=[1600, 1200], help="Size of generated images")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per preset, the fastest one is kept")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.pdf:
+        groups = {"pdf": pdf_images(args.pdf)}
+    else:
+        rng = np.random.default_rng(args.seed)
+        size = tuple(args.size)
+        groups = {
+            "photo": [("jpeg", make_photo(size, rng)) for _ in range(args.images)],
+            "graphic": [("png", make_graphic(size, rng)) for _ in range(args.images)],
+        }
+
+    presets = list(OUTPUT_PRESETS) + ["auto"]
+    print(f"{'images':<8} {'preset':<14} {'ms/image':>9} {'MP/s':>7} {'KB/image':>9} {'vs png':>7}")
+    for group, images in groups.items():
+        if not images:
+            continue
+        megapixels = sum(image.width * image.height for _, image in images) / len(images) / 1e6
+        pixmaps = [to_pixmap(image) for _, image in images]
+        png_size = None
+        for preset in presets:
+            per_image, total_size = encode_all(OutputEncoder(preset), images, pixmaps, args.repeat)
+            png_size = png_size or total_size  # "png" is the first preset
+            print(
+                f"{group:<8} {preset:<14} {per_image * 1e3:>9.1f} {megapixels / per_image:>7.1f} "
+                f"{total_size / len(images) / 1024:>9.0f} {total_size / png_size:>7.0%}"
+            )
+
+
+if __name__ == "__main__":
+    main()
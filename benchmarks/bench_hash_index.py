@@ -0,0 +1,79 @@
+"""
+Compares the near-duplicate hash indexes behind PDFImageExtractor.is_duplicate.
+
+Each index is filled with n pseudo-random pHashes, a share of them near-duplicates of
+earlier hashes, and then answers the same radius queries. The script checks that every
+index returns the same match as the linear scan and prints the time per lookup.
+
+Usage:
+    python benchmarks/bench_hash_index.py [--sizes 1000 10000 100000] [--queries 200]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import imagehash
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PDF_Image_Extractor import HASH_INDEXES
+
+
+def make_hashes(count, hash_size, rng, duplicate_ratio=0.2, max_flips=3):
+    """Creates random hashes where duplicate_ratio of them are bit-flipped copies of earlier ones."""
+    hashes = []
+    for _ in range(count):
+        if hashes and rng.random() < duplicate_ratio:
+            bits = hashes[rng.integers(len(hashes))].hash.copy()
+            for _ in range(rng.integers(max_flips + 1)):
+                row, col = rng.integers(hash_size, size=2)
+                bits[row, col] = not bits[row, col]
+        else:
+            bits = rng.random((hash_size, hash_size)) < 0.5
+        hashes.append(imagehash.ImageHash(bits))
+    return hashes
+
+
+def time_queries(index, queries, radius):
+    start = time.perf_counter()
+    results = [index.find(query, radius) for query in queries]
+    return (time.perf_counter() - start) / len(queries), results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--hash-size", type=int, default=8)
+    parser.add_argument("--radius", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    print(f"{'index':<10}{'n':>10}{'build s':>12}{'lookup us':>12}{'speedup':>10}")
+    for size in args.sizes:
+        hashes = make_hashes(size + args.queries, args.hash_size, rng)
+        stored, queries = hashes[:size], hashes[size:]
+
+        reference = None
+        for name, index_type in HASH_INDEXES.items():
+            index = index_type()
+            start = time.perf_counter()
+            for p_hash in stored:
+                index.add(p_hash)
+            build_time = time.perf_counter() - start
+
+            per_query, results = time_queries(index, queries, args.radius)
+            if reference is None:
+                reference = (per_query, results)
+            elif results != reference[1]:
+                raise AssertionError(f"{name} returned different matches than the linear scan at n={size}")
+            speedup = reference[0] / per_query
+            print(f"{name:<10}{size:>10}{build_time:>12.3f}{per_query * 1e6:>12.1f}{speedup:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,311 @@
+"""
+Times the public operations of PDFImageExtractor on reproducible synthetic PDFs.
+
+Every scenario generates a PDF with pymupdf from a fixed seed, varying the number of pages
+and images, the image codec (JPEG, Flate or JPX), the image size, soft masks and the share
+of duplicates. Half of the duplicates reuse the stream of an earlier image (one xref, like
+a logo on every page), the other half are re-encoded copies that only the pHash finds.
+
+Each operation runs in a fresh process, so the recorded peak RSS belongs to that operation
+alone. The PDFs are generated in another process, since Linux carries the peak RSS of a
+parent over to its children. The results (time, images and MB per second, peak RSS and,
+for extractions, the per-stage statistics) are written to a JSON baseline. With --compare,
+the run is compared with an earlier baseline and the exit code is 1 if any operation got
+slower than the tolerance.
+
+Usage:
+    python benchmarks/bench_pipeline.py [--scenarios NAME ...] [--quick] [--repeat 3]
+                                        [--output baseline.json] [--compare old.json]
+"""
+
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pymupdf
+from PIL import Image, ImageFilter
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PDF_Image_Extractor import PDFImageExtractor
+
+CODEC_FORMATS = {"jpeg": "JPEG", "flate": "PNG", "jpx": "JPEG2000"}
+
+SCENARIOS = {
+    "jpeg_small": dict(pages=40, images_per_page=4, codec="jpeg", size=(320, 240), smask=False, duplicate_ratio=0.25),
+    "jpeg_large": dict(pages=8, images_per_page=1, codec="jpeg", size=(3000, 2000), smask=False, duplicate_ratio=0.0),
+    "flate_smask": dict(pages=30, images_per_page=3, codec="flate", size=(400, 300), smask=True, duplicate_ratio=0.25),
+    "jpx": dict(pages=20, images_per_page=2, codec="jpx", size=(600, 400), smask=False, duplicate_ratio=0.25),
+    "duplicate_heavy": dict(
+        pages=40, images_per_page=4, codec="jpeg", size=(320, 240), smask=False, duplicate_ratio=0.75
+    ),
+    "many_pages": dict(pages=400, images_per_page=1, codec="jpeg", size=(160, 120), smask=False, duplicate_ratio=0.5),
+}
+
+OPERATIONS = ("extract_images", "filter_images", "create_thumbnail_preview", "extract_serial", "extract_parallel")
+
+
+def make_photo(size, rng):
+    """Creates a photo-like image: smooth random shapes with fine noise on top."""
+    width, height = size
+    coarse = rng.integers(0, 256, (9, 12, 3), dtype=np.uint8)
+    image = Image.fromarray(coarse).resize((width, height), Image.BICUBIC)
+    noise = rng.normal(0, 8, (height, width, 3))
+    pixels = np.clip(np.asarray(image, dtype=np.float32) + noise, 0, 255).astype(np.uint8)
+    return Image.fromarray(pixels).filter(ImageFilter.SMOOTH)
+
+
+def encode(image, codec, quality=85):
+    buffer = io.BytesIO()
+    image.save(buffer, format=CODEC_FORMATS[codec], quality=quality)
+    return buffer.getvalue()
+
+
+def make_pdf(path, pages, images_per_page, codec, size, smask, duplicate_ratio, seed=0):
+    """
+    Writes a synthetic PDF for one scenario.
+
+    Returns:
+        int: The number of image occurrences in the PDF.
+    """
+    rng = np.random.default_rng(seed)
+    photos, streams = [], []
+    mask = None
+    if smask:
+        gradient = np.linspace(64, 255, size[0], dtype=np.uint8)
+        buffer = io.BytesIO()
+        Image.fromarray(np.tile(gradient, (size[1], 1))).save(buffer, format="PNG")
+        mask = buffer.getvalue()
+
+    doc = pymupdf.open()
+    for _ in range(pages):
+        page = doc.new_page()
+        cell = page.rect.width / images_per_page
+        for index in range(images_per_page):
+            if photos and rng.random() < duplicate_ratio:
+                pick = int(rng.integers(len(photos)))
+                if rng.random() < 0.5:
+                    stream = streams[pick]  # Same stream, pymupdf stores it once
+                else:
+                    stream = encode(photos[pick], codec, quality=int(rng.integers(70, 95)))
+            else:
+                photos.append(make_photo(size, rng))
+                streams.append(encode(photos[-1], codec))
+                stream = streams[-1]
+            rect = pymupdf.Rect(index * cell, 0, (index + 1) * cell, cell * size[1] / size[0])
+            page.insert_image(rect, stream=stream, mask=mask)
+    doc.save(path, deflate=True)
+    doc.close()
+    return pages * images_per_page
+
+
+def peak_rss_mb(who):
+    """Returns the peak resident set size of this process or its children in MB, or None if unknown."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(who).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def make_extractor(pdf_path, output_folder, workers=1):
+    extractor = PDFImageExtractor()
+    extractor.set_pdf_file(pdf_path)
+    extractor.output_folder = output_folder
+    extractor.threshold = 0
+    extractor.options.update(use_threshold=False, use_cache=False, resume=False, workers=workers)
+    return extractor
+
+
+def run_operation(operation, pdf_path, output_folder, workers, connection):
+    """Runs one operation in a fresh process and sends its measurements back through the pipe."""
+    log = lambda msg: None
+    extractor = make_extractor(pdf_path, output_folder, workers if operation == "extract_parallel" else 1)
+    images = extractor.extract_images() if operation == "filter_images" else None
+
+    start = time.perf_counter()
+    if operation == "extract_images":
+        result = len(extractor.extract_images())
+    elif operation == "filter_images":
+        result = len(extractor.filter_images(images, log))
+    elif operation == "create_thumbnail_preview":
+        extractor.create_thumbnail_preview(log)
+        result = extractor.stats.counts.get("shown", 0)
+    else:
+        result = extractor.extract_and_save_images(log)
+    elapsed = time.perf_counter() - start
+
+    measurement = {
+        "seconds": elapsed,
+        "result": result,
+        "peak_rss_mb": peak_rss_mb(resource.RUSAGE_SELF) if resource else None,
+        "peak_child_rss_mb": peak_rss_mb(resource.RUSAGE_CHILDREN) if resource else None,
+    }
+    if operation.startswith("extract_") and operation != "extract_images":
+        measurement["stages"] = extractor.stats.to_dict()["stages"]
+    connection.send(measurement)
+    connection.close()
+
+
+def measure(operation, pdf_path, temp_dir, workers, repeat):
+    """Runs an operation repeat times, each in a fresh process, and keeps the fastest run."""
+    context = multiprocessing.get_context("spawn")
+    best = None
+    for attempt in range(repeat):
+        output_folder = os.path.join(temp_dir, f"{operation}_{attempt}")
+        receiver, sender = context.Pipe(duplex=False)
+        process = context.Process(target=run_operation, args=(operation, pdf_path, output_folder, workers, sender))
+        process.start()
+        sender.close()
+        try:
+            measurement = receiver.recv()
+        except EOFError:
+            process.join()
+            raise RuntimeError(f"{operation} failed with exit code {process.exitcode}")
+        process.join()
+        if best is None or measurement["seconds"] < best["seconds"]:
+            best = measurement
+    return best
+
+
+def image_bytes(pdf_path):
+    """Returns the total size of the image streams of a PDF in bytes, each xref counted once."""
+    total = 0
+    with pymupdf.open(pdf_path) as doc:
+        xrefs = {img[0] for page in doc for img in page.get_images(full=True)}
+        for xref in xrefs:
+            total += len(doc.xref_stream_raw(xref) or b"")
+    return total
+
+
+def generate(path, scenario, seed):
+    """Writes the PDF of a scenario and returns its number of images and image stream bytes."""
+    image_count = make_pdf(path, seed=seed, **scenario)
+    return image_count, image_bytes(path)
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, tolerance):
+    """Prints the change against a baseline and returns the number of regressions."""
+    regressions = 0
+    print(f"\n{'scenario':<18} {'operation':<26} {'before s':>9} {'now s':>9} {'change':>8}")
+    for name, scenario in results["scenarios"].items():
+        old_scenario = baseline["scenarios"].get(name)
+        if not old_scenario:
+            continue
+        for operation, measurement in scenario["operations"].items():
+            old = old_scenario["operations"].get(operation)
+            if not old:
+                continue
+            change = measurement["seconds"] / old["seconds"] - 1
+            slower = change > tolerance
+            regressions += slower
+            print(
+                f"{name:<18} {operation:<26} {old['seconds']:>9.3f} {measurement['seconds']:>9.3f} "
+                f"{change:>+8.0%}{'  REGRESSION' if slower else ''}"
+            )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", nargs="+", choices=sorted(SCENARIOS), default=sorted(SCENARIOS))
+    parser.add_argument("--operations", nargs="+", choices=OPERATIONS, default=list(OPERATIONS))
+    parser.add_argument("--quick", action="store_true", help="Use a quarter of the pages of every scenario")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per operation, the fastest one is kept")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=max(2, min(4, os.cpu_count() or 1)),
+        help="Worker processes of the parallel extraction",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    parser.add_argument("--compare", help="A JSON file written by an earlier run with --output")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.10,
+        help="Slowdown above which an operation counts as a regression (default 0.10)",
+    )
+    args = parser.parse_args()
+
+    results = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "pymupdf": pymupdf.VersionBind,
+        "cpu_count": os.cpu_count(),
+        "workers": args.workers,
+        "quick": args.quick,
+        "seed": args.seed,
+        "scenarios": {},
+    }
+    print(f"{'scenario':<18} {'operation':<26} {'seconds':>8} {'img/s':>8} {'MB/s':>7} {'peak MB':>8} {'child MB':>9}")
+    generator = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn"))
+    with tempfile.TemporaryDirectory() as temp_dir, generator:
+        for name in args.scenarios:
+            scenario = dict(SCENARIOS[name])
+            if args.quick:
+                scenario["pages"] = max(1, scenario["pages"] // 4)
+            pdf_path = os.path.join(temp_dir, f"{name}.pdf")
+            image_count, stream_bytes = generator.submit(generate, pdf_path, scenario, args.seed).result()
+            megabytes = stream_bytes / (1024 * 1024)
+            entry = {
+                **scenario,
+                "size": list(scenario["size"]),
+                "images": image_count,
+                "image_mb": round(megabytes, 3),
+                "operations": {},
+            }
+            for operation in args.operations:
+                measurement = measure(operation, pdf_path, temp_dir, args.workers, args.repeat)
+                measurement["images_per_second"] = image_count / measurement["seconds"]
+                measurement["mb_per_second"] = megabytes / measurement["seconds"]
+                entry["operations"][operation] = measurement
+                child = measurement["peak_child_rss_mb"]
+                print(
+                    f"{name:<18} {operation:<26} {measurement['seconds']:>8.3f} "
+                    f"{measurement['images_per_second']:>8.0f} {measurement['mb_per_second']:>7.1f} "
+                    f"{measurement['peak_rss_mb'] or 0:>8.0f} {child or 0:>9.0f}"
+                )
+            results["scenarios"][name] = entry
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.output}")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
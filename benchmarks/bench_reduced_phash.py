@@ -0,0 +1,121 @@
+"""
+Compares pHashes of reduced-resolution decodes with pHashes of full decodes.
+
+A PDF with large synthetic JPEG and PNG images is generated (or the images of the given
+PDFs are used). Every image is hashed once from a full decode and once from the reduced
+decode used with the 'reduced_phash' option. The script prints the time per image of both
+paths, the speedup, and how often the hashes are identical or within the duplicate
+threshold of each other.
+
+Usage:
+    python benchmarks/bench_reduced_phash.py [--pdf FILE ...] [--images 12] [--size 3000 4000]
+"""
+
+import argparse
+import io
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pymupdf
+from PIL import Image, ImageFilter
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PDF_Image_Extractor import PHASH_DECODE_FACTOR, ImageStage, PDFImageExtractor
+
+
+def make_photo(size, rng):
+    """Creates a photo-like image: smooth random shapes with fine noise on top."""
+    width, height = size
+    coarse = rng.integers(0, 256, (12, 9, 3), dtype=np.uint8)
+    image = Image.fromarray(coarse).resize((width, height), Image.BICUBIC)
+    noise = rng.normal(0, 12, (height, width, 3))
+    pixels = np.clip(np.asarray(image, dtype=np.float32) + noise, 0, 255).astype(np.uint8)
+    return Image.fromarray(pixels).filter(ImageFilter.SMOOTH)
+
+
+def make_pdf(path, count, size, seed):
+    """Writes a PDF with count images, alternating between JPEG and PNG encoding."""
+    rng = np.random.default_rng(seed)
+    doc = pymupdf.open()
+    for index in range(count):
+        buffer = io.BytesIO()
+        make_photo(size, rng).save(buffer, format="JPEG" if index % 2 == 0 else "PNG", quality=90)
+        page = doc.new_page(width=size[0] / 10, height=size[1] / 10)
+        page.insert_image(page.rect, stream=buffer.getvalue())
+    doc.save(path)
+    doc.close()
+
+
+def image_xrefs(doc):
+    xrefs = []
+    for page in doc:
+        for img in page.get_images():
+            if img[0] not in xrefs:
+                xrefs.append(img[0])
+    return xrefs
+
+
+def hash_all(extractor, doc, xrefs, reduced):
+    """Hashes every image from a fresh stage and returns the hashes and the time per image."""
+    extractor.options["reduced_phash"] = reduced
+    hashes = []
+    elapsed = 0.0
+    for xref in xrefs:
+        stage = ImageStage(doc, xref)
+        stage.base_image  # Keep the stream extraction out of the timing, it is the same for both paths
+        start = time.perf_counter()
+        hashes.append(extractor.phash_image(stage))
+        elapsed += time.perf_counter() - start
+        stage.release()
+    return hashes, elapsed / len(xrefs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdf", nargs="+", help="PDF files to use instead of a generated one")
+    parser.add_argument("--images", type=int, default=12, help="Number of generated images")
+    parser.add_argument("--size", type=int, nargs=2, default=[3000, 4000], help="Size of generated images")
+    parser.add_argument("--phash-size", type=int, default=8)
+    parser.add_argument("--phash-threshold", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        pdf_paths = args.pdf
+        if not pdf_paths:
+            pdf_paths = [os.path.join(temp_dir, "generated.pdf")]
+            make_pdf(pdf_paths[0], args.images, tuple(args.size), args.seed)
+
+        extractor = PDFImageExtractor()
+        extractor.options["phash_size"] = args.phash_size
+        print(
+            f"pHash size {args.phash_size}, reduced decodes keep at least "
+            f"{args.phash_size * PHASH_DECODE_FACTOR} pixels per side"
+        )
+        print(
+            f"{'pdf':<30} {'images':>6} {'full ms':>9} {'reduced ms':>11} {'speedup':>8} "
+            f"{'identical':>10} {'within':>7} {'max dist':>9}"
+        )
+        for pdf_path in pdf_paths:
+            with pymupdf.open(pdf_path) as doc:
+                xrefs = image_xrefs(doc)
+                if not xrefs:
+                    continue
+                full, full_time = hash_all(extractor, doc, xrefs, reduced=False)
+                reduced, reduced_time = hash_all(extractor, doc, xrefs, reduced=True)
+            distances = [a - b for a, b in zip(full, reduced)]
+            identical = sum(distance == 0 for distance in distances) / len(distances)
+            within = sum(distance <= args.phash_threshold for distance in distances) / len(distances)
+            print(
+                f"{os.path.basename(pdf_path)[:30]:<30} {len(xrefs):>6} {full_time * 1e3:>9.1f} "
+                f"{reduced_time * 1e3:>11.1f} {full_time / reduced_time:>7.1f}x {identical:>10.0%} "
+                f"{within:>7.0%} {max(distances):>9}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Compares synchronous output writing with the asynchronous writer on default settings.
+
+A PDF with Flate images (decoded and written as PNG) is generated from a fixed seed, or
+the given PDFs are used. Each PDF is extracted serially with the default options, once
+with 'writer_threads' set to 0, which encodes and writes every image in line like the
+extraction did before the writer existed, and once for every thread count given. The
+script prints the best time of each configuration and its speedup over the synchronous
+run.
+
+Local disks usually absorb writes in the page cache, where the writer can only gain by
+encoding PIL formats on other cores. --latency adds a delay to every file write, in the
+synchronous and the asynchronous path alike, to model network shares and slow drives;
+--temp-dir places the output folders on a real one.
+
+Usage:
+    python benchmarks/bench_writer.py [--pdf FILE ...] [--images 40] [--threads 1 2 4]
+                                      [--latency 0 5] [--repeat 3]
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_pipeline import make_pdf
+from PDF_Image_Extractor import AsyncImageWriter, PDFImageExtractor
+
+write_file = AsyncImageWriter._write
+
+
+def slow_write(latency):
+    """Returns a replacement for AsyncImageWriter._write that waits latency seconds per file."""
+
+    def write(*args, **kwargs):
+        time.sleep(latency)
+        write_file(*args, **kwargs)
+
+    return staticmethod(write)
+
+
+def extract(pdf_path, output_folder, writer_threads):
+    """Runs one serial extraction with default options and returns its time in seconds."""
+    shutil.rmtree(output_folder, ignore_errors=True)
+    extractor = PDFImageExtractor()
+    extractor.set_pdf_file(pdf_path)
+    extractor.output_folder = output_folder
+    extractor.threshold = 0
+    extractor.options.update(
+        use_threshold=False, use_cache=False, resume=False, workers=1, writer_threads=writer_threads
+    )
+    start = time.perf_counter()
+    saved = extractor.extract_and_save_images(lambda msg: None)
+    return time.perf_counter() - start, saved
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdf", nargs="+", help="PDF files to use instead of a generated one")
+    parser.add_argument("--images", type=int, default=40, help="Number of generated images")
+    parser.add_argument("--size", type=int, nargs=2, default=[800, 600], help="Size of generated images")
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4], help="Writer thread counts to compare")
+    parser.add_argument(
+        "--latency",
+        type=float,
+        nargs="+",
+        default=[0, 5],
+        help="Simulated storage latency per written file in milliseconds",
+    )
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per configuration, the fastest one is kept")
+    parser.add_argument("--temp-dir", help="Directory for the generated PDF and the output folders")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(dir=args.temp_dir) as temp_dir:
+        pdf_paths = args.pdf
+        if not pdf_paths:
+            pdf_paths = [os.path.join(temp_dir, "generated.pdf")]
+            make_pdf(
+                pdf_paths[0],
+                pages=args.images,
+                images_per_page=1,
+                codec="flate",
+                size=tuple(args.size),
+                smask=False,
+                duplicate_ratio=0.0,
+                seed=args.seed,
+            )
+
+        print(f"{'pdf':<30} {'latency':>8} {'writer':<10} {'images':>6} {'seconds':>8} {'speedup':>8}")
+        for pdf_path in pdf_paths:
+            for latency in args.latency:
+                AsyncImageWriter._write = slow_write(latency / 1000) if latency else staticmethod(write_file)
+                baseline = None
+                for threads in [0] + args.threads:
+                    output_folder = os.path.join(temp_dir, f"out_{threads}")
+                    seconds, saved = min(extract(pdf_path, output_folder, threads) for _ in range(args.repeat))
+                    baseline = baseline or seconds
+                    label = "sync" if threads == 0 else f"{threads} threads"
+                    print(
+                        f"{os.path.basename(pdf_path)[:30]:<30} {latency:>6g}ms {label:<10} {saved:>6} "
+                        f"{seconds:>8.3f} {baseline / seconds:>7.2f}x"
+                    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,98 @@
 import unittest
 import os
+import io
+import json
+import random
 import shutil
+import tempfile
+import time
+import threading
+import contextlib
+import importlib.util
+from concurrent.futures import ThreadPoolExecutor
 from unittest.mock import MagicMock, patch
 import sys
 
+import pymupdf
+import PIL
+from PIL import Image
+
 # Add the parent directory to the path so we can import the module
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from PDF_Image_Extractor import PDFImageExtractor
+import imagehash
+import numpy as np
+
+from PDF_Image_Extractor import (
+    PDFImageExtractor,
+    ImageStage,
+    HASH_INDEXES,
+    AsyncImageWriter,
+    run_cli,
+    collect_pdf_paths,
+    CorpusExtractor,
+    ImageCache,
+    stream_length,
+    ExtractionCancelled,
+    BufferedLogSink,
+    PipelineStats,
+    MemoryBudget,
+    OutputEncoder,
+    MaskCache,
+    CONTENT_LINKS,
+    PNG_SAVE_ARGUMENTS,
+)
+
+
+def make_image_bytes(seed, size=(64, 64), fmt="PNG"):
+    """Creates a reproducible smooth random image encoded in the given format."""
+    rng = random.Random(seed)
+    img = Image.frombytes("RGB", (8, 8), rng.randbytes(8 * 8 * 3)).resize(size, Image.BICUBIC)
+    buffer = io.BytesIO()
+    img.save(buffer, format=fmt)
+    return buffer.getvalue()
+
+
+def make_pdf(path, pages):
+    """Creates a PDF where each page lists the image bytes to place on it."""
+    doc = pymupdf.open()
+    for images in pages:
+        page = doc.new_page()
+        for index, image_bytes in enumerate(images):
+            rect = pymupdf.Rect(10 + index * 110, 10, 110 + index * 110, 110)
+            page.insert_image(rect, stream=image_bytes)
+    doc.save(path)
+    doc.close()
+
+
+class ExtractionTestCase(unittest.TestCase):
+    """Base class for tests extracting a generated PDF into a temporary folder."""
+
+    pdf_name = "test.pdf"
+
+    def make_pages(self):
+        """Returns the image bytes of every page, see make_pdf."""
+        raise NotImplementedError
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.pdf_path = os.path.join(self.temp_dir, self.pdf_name)
+        make_pdf(self.pdf_path, self.make_pages())
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def run_extraction(self, folder, **options):
+        """Extracts the PDF into folder with the given options and returns the extractor and log messages."""
+        extractor = PDFImageExtractor()
+        extractor.set_pdf_file(self.pdf_path)
+        extractor.output_folder = os.path.join(self.temp_dir, folder)
+        extractor.threshold = 1
+        extractor.options.update(options)
+        log_callback = MagicMock()
+        extractor.extract_and_save_images(log_callback=log_callback)
+        return extractor, [call.args[0] for call in log_callback.call_args_list]
+
 
 class TestPDFImageExtractor(unittest.TestCase):
     def setUp(self):
@@ -54,7 +139,7 @@ class TestPDFImageExtractor(unittest.TestCase):
 
         # Verify
         self.extractor.process_page.assert_called_once()
-        self.assertEqual(self.extractor.process_page.call_args[0][1], 0) # page_index 0
+        self.assertEqual(self.extractor.process_page.call_args[0][1], 0)  # page_index 0
 
     def test_log_callback(self):
         # Create a mock callback
@@ -78,5 +163,1140 @@ class TestPDFImageExtractor(unittest.TestCase):
         log_callback.assert_called()
         self.assertTrue("Warning" in log_callback.call_args[0][0])
 
+
+class TestXrefRegistry(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.pdf_path = os.path.join(self.temp_dir, "repeated.pdf")
+        self.output_folder = os.path.join(self.temp_dir, "out")
+        logo = make_image_bytes(1)
+        make_pdf(self.pdf_path, [[logo], [logo, make_image_bytes(2)], [logo]])
+        self.extractor = PDFImageExtractor()
+        self.extractor.set_pdf_file(self.pdf_path)
+        self.extractor.output_folder = self.output_folder
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_repeated_xref_is_extracted_once(self):
+        with patch(
+            "pymupdf.Document.extract_image", autospec=True, side_effect=pymupdf.Document.extract_image
+        ) as mock_extract:
+            self.extractor.extract_and_save_images()
+        extracted_xrefs = [call.args[1] for call in mock_extract.call_args_list]
+        self.assertEqual(len(extracted_xrefs), 2)
+        self.assertEqual(len(set(extracted_xrefs)), 2)
+        saved = sorted(f for f in os.listdir(self.output_folder) if f.endswith(".png"))
+        self.assertEqual(saved, ["page_0-image_1.png", "page_1-image_2.png"])
+
+    def test_manifest_records_all_references(self):
+        self.extractor.extract_and_save_images()
+        with open(os.path.join(self.output_folder, "manifest.json")) as f:
+            manifest = json.load(f)
+        logo_entry = next(e for e in manifest["images"] if e["output"] == "page_0-image_1.png")
+        self.assertEqual(
+            logo_entry["references"],
+            [{"page": 0, "image": 1}, {"page": 1, "image": 1}, {"page": 2, "image": 1}],
+        )
+
+    def test_repeated_xrefs_processed_when_option_disabled(self):
+        self.extractor.options["skip_repeated_xrefs"] = False
+        self.extractor.options["remove_duplicates"] = False
+        self.extractor.extract_and_save_images()
+        saved = [f for f in os.listdir(self.output_folder) if f.endswith(".png")]
+        self.assertEqual(len(saved), 4)
+
+
+class TestImageStage(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.pdf_path = os.path.join(self.temp_dir, "stage.pdf")
+        make_pdf(self.pdf_path, [[make_image_bytes(3, fmt="JPEG")]])
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_stage_extracts_and_decodes_once(self):
+        extractor = PDFImageExtractor()
+        extractor.output_folder = self.temp_dir
+        with pymupdf.open(self.pdf_path) as doc:
+            xref = doc[0].get_images()[0][0]
+            with patch(
+                "pymupdf.Document.extract_image", autospec=True, side_effect=pymupdf.Document.extract_image
+            ) as mock_extract, patch.object(
+                pymupdf.Pixmap, "__init__", autospec=True, side_effect=pymupdf.Pixmap.__init__
+            ) as mock_pixmap:
+                extractor.process_image(doc, 0, 1, (xref, 0))
+        self.assertEqual(mock_extract.call_count, 1)
+        self.assertEqual(mock_pixmap.call_count, 1)
+        self.assertTrue(os.path.isfile(os.path.join(self.temp_dir, "page_0-image_1.png")))
+
+    def test_reduced_phash_skips_full_jpeg_decode(self):
+        pdf_path = os.path.join(self.temp_dir, "large.pdf")
+        make_pdf(pdf_path, [[make_image_bytes(4, size=(600, 800), fmt="JPEG")]])
+        extractor = PDFImageExtractor()
+        extractor.options["reduced_phash"] = True
+        with pymupdf.open(pdf_path) as doc:
+            xref = doc[0].get_images()[0][0]
+            full_hash = extractor.phash_image(Image.open(io.BytesIO(ImageStage(doc, xref).image_bytes)))
+            stage = ImageStage(doc, xref)
+            with patch.object(
+                pymupdf.Pixmap, "__init__", autospec=True, side_effect=pymupdf.Pixmap.__init__
+            ) as mock_pixmap:
+                reduced_hash = extractor.phash_image(stage)
+        mock_pixmap.assert_not_called()
+        self.assertLessEqual(reduced_hash - full_hash, 2)
+
+    def test_stage_phash_matches_pil_decode(self):
+        extractor = PDFImageExtractor()
+        with pymupdf.open(self.pdf_path) as doc:
+            xref = doc[0].get_images()[0][0]
+            stage = ImageStage(doc, xref)
+            pil_hash = extractor.phash_image(Image.open(io.BytesIO(stage.image_bytes)))
+            self.assertLessEqual(extractor.phash_image(stage) - pil_hash, 2)
+
+    def test_read_only_properties_do_not_extract(self):
+        with pymupdf.open(self.pdf_path) as doc:
+            stage = ImageStage(doc, doc[0].get_images()[0][0])
+            self.assertIsNone(stage.known_size_kb)
+            self.assertIsNone(stage.decoded_image)
+            self.assertIsNone(stage._base_image)
+            image = stage.pil_image
+            self.assertIs(stage.decoded_image, image)
+            self.assertEqual(stage.known_size_kb, len(stage.image_bytes) / 1024)
+            stage.release()
+            self.assertIsNone(stage.decoded_image)
+            self.assertIsNotNone(stage.known_size_kb)
+
+
+class TestRawPassthrough(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.pdf_path = os.path.join(self.temp_dir, "jpeg.pdf")
+        self.jpeg_bytes = make_image_bytes(4, fmt="JPEG")
+        make_pdf(self.pdf_path, [[self.jpeg_bytes]])
+        self.extractor = PDFImageExtractor()
+        self.extractor.set_pdf_file(self.pdf_path)
+        self.extractor.output_folder = os.path.join(self.temp_dir, "out")
+        self.extractor.options["raw_passthrough"] = True
+        self.extractor.options["remove_duplicates"] = False
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_jpeg_written_without_decode(self):
+        with patch.object(
+            pymupdf.Pixmap, "__init__", autospec=True, side_effect=pymupdf.Pixmap.__init__
+        ) as mock_pixmap:
+            self.extractor.extract_and_save_images()
+        mock_pixmap.assert_not_called()
+        output_path = os.path.join(self.extractor.output_folder, "page_0-image_1.jpeg")
+        with open(output_path, "rb") as f:
+            self.assertEqual(f.read(), self.jpeg_bytes)
+
+    def test_masked_image_falls_back_to_png(self):
+        rgba = Image.new("RGBA", (32, 32), (255, 0, 0, 128))
+        buffer = io.BytesIO()
+        rgba.save(buffer, format="PNG")
+        make_pdf(self.pdf_path, [[buffer.getvalue()]])
+        self.extractor.extract_and_save_images()
+        self.assertEqual(
+            [f for f in os.listdir(self.extractor.output_folder) if f.startswith("page_")],
+            ["page_0-image_1.png"],
+        )
+
+
+class TestMaskCache(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.pdf_path = os.path.join(self.temp_dir, "masks.pdf")
+        frame = Image.new("L", (64, 64), 0)
+        frame.paste(255, (8, 8, 56, 56))
+        masks = []
+        for mask_image in (frame, frame.transpose(Image.Transpose.ROTATE_90).point(lambda v: v // 2)):
+            buffer = io.BytesIO()
+            mask_image.save(buffer, format="PNG")
+            masks.append(buffer.getvalue())
+        doc = pymupdf.open()
+        page = doc.new_page()
+        for index in range(4):
+            rect = pymupdf.Rect(10 + index * 110, 10, 110 + index * 110, 110)
+            page.insert_image(rect, stream=make_image_bytes(70 + index, fmt="JPEG"), mask=masks[index == 3])
+        doc.save(self.pdf_path)
+        doc.close()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_shared_mask_is_decoded_once(self):
+        extractor = PDFImageExtractor()
+        extractor.set_pdf_file(self.pdf_path)
+        extractor.output_folder = os.path.join(self.temp_dir, "out")
+        extractor.extract_and_save_images(log_callback=MagicMock())
+        self.assertEqual(extractor.counts["saved"], 4)
+        self.assertEqual(extractor.stats.to_dict()["caches"]["smask"], {"hits": 2, "misses": 2, "evictions": 0})
+        self.assertEqual(extractor.stats.to_dict()["stages"]["decode_smask"]["calls"], 2)
+        with Image.open(os.path.join(extractor.output_folder, extractor.saved_files[0])) as image:
+            self.assertEqual(image.mode, "RGBA")
+            self.assertEqual(image.getpixel((0, 0))[3], 0)
+
+    def test_least_recently_used_mask_is_evicted(self):
+        with pymupdf.open(self.pdf_path) as doc:
+            first, _, _, last = [img[1] for img in doc[0].get_images(full=True)]
+            cache = MaskCache(max_bytes=64 * 64)
+            self.assertEqual(cache.get(doc, first).n, 1)
+            cache.get(doc, first)
+            cache.get(doc, last)
+            cache.get(doc, first)
+        self.assertEqual(cache.counters(), {"hits": 1, "misses": 3, "evictions": 2})
+
+
+class TestOutputEncoder(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.pdf_path = os.path.join(self.temp_dir, "codecs.pdf")
+        make_pdf(self.pdf_path, [[make_image_bytes(60, fmt="JPEG"), make_image_bytes(61)]])
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def extract(self, preset, folder):
+        extractor = PDFImageExtractor()
+        extractor.set_pdf_file(self.pdf_path)
+        extractor.output_folder = os.path.join(self.temp_dir, folder)
+        extractor.options["output_preset"] = preset
+        extractor.extract_and_save_images(log_callback=MagicMock())
+        return extractor
+
+    def test_settings_follow_preset_source_and_overrides(self):
+        self.assertEqual(OutputEncoder("auto").settings_for("jpeg")[0], "jpg")
+        self.assertEqual(OutputEncoder("auto").settings_for("png")[0], "png")
+        self.assertEqual(OutputEncoder("jpeg-hq").settings_for("jpeg", alpha=True)[0], "png")
+        extension, arguments = OutputEncoder("png-fast", compress_level=3).settings_for()
+        self.assertEqual((extension, arguments["compress_level"]), ("png", 3))
+        self.assertEqual(
+            OutputEncoder(compress_level=9).settings_for(), ("png", {**PNG_SAVE_ARGUMENTS, "compress_level": 9})
+        )
+        self.assertEqual(PNG_SAVE_ARGUMENTS["compress_level"], 1)
+        self.assertEqual(OutputEncoder("webp", quality=70).settings_for()[1]["quality"], 70)
+        with self.assertRaises(ValueError):
+            OutputEncoder("gif")
+
+    def test_default_png_is_encoded_by_pymupdf(self):
+        self.assertEqual(OutputEncoder().settings_for("png"), ("png", None))
+        extractor = self.extract("png", "png")
+        with pymupdf.open(self.pdf_path) as doc:
+            expected = pymupdf.Pixmap(doc, doc[0].get_images()[1][0]).samples
+        with Image.open(os.path.join(extractor.output_folder, "page_0-image_2.png")) as image:
+            self.assertEqual(image.tobytes(), expected)
+        self.assertEqual(extractor.stats.to_dict()["stages"]["encode"]["calls"], 2)
+
+    def test_auto_preset_picks_format_from_source_codec(self):
+        extractor = self.extract("auto", "auto")
+        self.assertEqual(extractor.saved_files, ["page_0-image_1.jpg", "page_0-image_2.png"])
+        with Image.open(os.path.join(extractor.output_folder, "page_0-image_1.jpg")) as image:
+            self.assertEqual(image.format, "JPEG")
+
+    def test_lossless_presets_keep_pixels(self):
+        png = self.extract("png", "png")
+        fast = self.extract("png-fast", "fast")
+        webp = self.extract("webp-lossless", "webp")
+        self.assertEqual(webp.saved_files, ["page_0-image_1.webp", "page_0-image_2.webp"])
+        for png_name, fast_name, webp_name in zip(png.saved_files, fast.saved_files, webp.saved_files):
+            with Image.open(os.path.join(png.output_folder, png_name)) as expected:
+                for folder, name in ((fast.output_folder, fast_name), (webp.output_folder, webp_name)):
+                    with Image.open(os.path.join(folder, name)) as actual:
+                        self.assertEqual(actual.convert("RGB").tobytes(), expected.convert("RGB").tobytes())
+
+
+class TestHashIndexes(unittest.TestCase):
+    def make_hashes(self, count, hash_size=8):
+        rng = np.random.default_rng(42)
+        base = [imagehash.ImageHash(rng.random((hash_size, hash_size)) < 0.5) for _ in range(count)]
+        near = []
+        for p_hash in base[: count // 2]:
+            bits = p_hash.hash.copy()
+            bits[0, : rng.integers(6)] ^= True
+            near.append(imagehash.ImageHash(bits))
+        return base, near
+
+    def test_indexes_match_linear_scan(self):
+        for hash_size in (8, 16):
+            stored, queries = self.make_hashes(300, hash_size)
+            queries += self.make_hashes(50, hash_size)[0]
+            for name, index_type in HASH_INDEXES.items():
+                linear, index = HASH_INDEXES["linear"](), index_type()
+                for p_hash in stored:
+                    linear.add(p_hash)
+                    index.add(p_hash)
+                self.assertEqual(len(index), len(stored))
+                for radius in (0, 3, 5, 10):
+                    for query in queries:
+                        self.assertEqual(index.find(query, radius), linear.find(query, radius), name)
+
+    def test_is_duplicate_uses_selected_index(self):
+        extractor = PDFImageExtractor()
+        extractor.options["hash_index"] = "linear"
+        extractor.current_p_hashes = extractor.create_hash_index()
+        stored, near = self.make_hashes(4)
+        extractor.current_p_hashes.add(stored[0])
+        self.assertTrue(extractor.is_duplicate(near[0]))
+        self.assertFalse(extractor.is_duplicate(stored[1]))
+
+    def test_unknown_index_raises(self):
+        extractor = PDFImageExtractor()
+        extractor.options["hash_index"] = "unknown"
+        with self.assertRaises(ValueError):
+            extractor.create_hash_index()
+
+
+class TestParallelExtraction(ExtractionTestCase):
+    pdf_name = "mixed.pdf"
+
+    def make_pages(self):
+        logo = make_image_bytes(5)
+        photo = make_image_bytes(6, size=(128, 128))
+        photo_copy = make_image_bytes(6, size=(128, 128), fmt="JPEG")
+        return [
+            [logo, photo],
+            [logo],
+            [photo_copy, make_image_bytes(7)],
+            [],
+            [logo, make_image_bytes(8, size=(8, 8))],
+            [make_image_bytes(9)],
+        ]
+
+    def extraction_result(self, workers, folder):
+        extractor, messages = self.run_extraction(folder, workers=workers)
+        with open(os.path.join(extractor.output_folder, "manifest.json")) as f:
+            manifest = json.load(f)
+        return sorted(os.listdir(extractor.output_folder)), manifest, messages
+
+    def test_parallel_run_matches_serial_run(self):
+        serial = self.extraction_result(1, "serial")
+        parallel = self.extraction_result(3, "parallel")
+        self.assertEqual(serial, parallel)
+        self.assertIn("page_0-image_1.png", serial[0])
+        self.assertNotIn("page_2-image_1.png", serial[0])  # Duplicate of the photo on page 0
+        self.assertTrue(any("Duplicate image found" in message for message in serial[2]))
+
+    def test_missing_analysis_fails_only_its_image(self):
+        extractor = PDFImageExtractor()
+        extractor.threshold = 1
+        extractor.options["remove_duplicates"] = False
+        analysis = {"size_kb": 5.0, "error": None, "prefiltered": False, "hash": None}
+        log_callback = MagicMock()
+        kept = extractor.decide_images([([(0, 0, 10, 0), (0, 1, 11, 0)], {11: analysis})], log_callback)
+        self.assertEqual(kept, [(0, 1, 11, 0)])
+        self.assertEqual(extractor.counts["failed"], 1)
+        self.assertIn("image 0 on page 0", log_callback.call_args.args[0])
+
+
+class TestPipelineStats(ExtractionTestCase):
+    pdf_name = "stats.pdf"
+
+    def make_pages(self):
+        logo = make_image_bytes(40)
+        return [[logo, make_image_bytes(41)], [logo, make_image_bytes(42, fmt="JPEG")]]
+
+    def extraction_stats(self, workers):
+        extractor, _ = self.run_extraction(f"out_{workers}", workers=workers)
+        return extractor.stats.to_dict()
+
+    def test_serial_run_times_every_stage(self):
+        stats = self.extraction_stats(1)
+        for name in ("extract_image", "decode", "phash", "duplicate_lookup", "write"):
+            self.assertGreater(stats["stages"][name]["calls"], 0, name)
+        self.assertEqual(stats["stages"]["write"]["calls"], 3)
+        self.assertEqual(stats["counts"]["saved"], 3)
+        self.assertGreater(stats["stages"]["extract_image"]["bytes_out"], 0)
+        self.assertGreater(stats["wall"], 0)
+
+    def test_parallel_run_merges_worker_stages(self):
+        stats = self.extraction_stats(2)
+        # Workers only skip xrefs repeated within their own page range
+        self.assertGreaterEqual(stats["stages"]["phash"]["calls"], 3)
+        self.assertGreater(stats["stages"]["decode"]["calls"], 0)
+        self.assertEqual(stats["stages"]["write"]["calls"], 3)
+
+    def test_write_json_round_trips(self):
+        stats = PipelineStats()
+        with stats.stage("decode", bytes_in=10) as sizes:
+            sizes["bytes_out"] = 40
+        stats.merge(
+            {
+                "stages": {"decode": {"calls": 2, "wall": 1.0, "cpu": 0.5, "bytes_in": 5, "bytes_out": 20}},
+                "memory": {"limit": 100, "peak": 80, "waits": 1, "wait_time": 0.5},
+                "caches": {"smask": {"hits": 2, "misses": 1, "evictions": 0}},
+            }
+        )
+        stats.record_cache("smask", {"hits": 1, "misses": 1, "evictions": 1})
+        stats.finish({"saved": 1})
+        path = os.path.join(self.temp_dir, "stats.json")
+        stats.write_json(path)
+        with open(path) as f:
+            data = json.load(f)
+        self.assertEqual(data, stats.to_dict())
+        self.assertEqual(data["stages"]["decode"]["calls"], 3)
+        self.assertEqual(data["stages"]["decode"]["bytes_out"], 60)
+        self.assertEqual(data["counts"], {"saved": 1})
+        self.assertEqual(data["memory"]["peak"], 80)
+        self.assertEqual(data["caches"]["smask"], {"hits": 3, "misses": 2, "evictions": 1})
+
+
+class TestMemoryBudget(ExtractionTestCase):
+    pdf_name = "budget.pdf"
+
+    def make_pages(self):
+        photo = make_image_bytes(50, size=(128, 128))
+        photo_copy = make_image_bytes(50, size=(128, 128), fmt="JPEG")
+        return [
+            [photo, make_image_bytes(51, size=(128, 128))],
+            [make_image_bytes(52, size=(128, 128)), photo_copy],
+            [make_image_bytes(53, size=(96, 96))],
+        ]
+
+    def test_new_images_wait_until_bytes_are_released(self):
+        budget = MemoryBudget(100)
+        budget.acquire(80)
+        budget.acquire(40, admitted=True)  # Growth of an admitted image never waits
+        admitted = threading.Event()
+        waiter = threading.Thread(target=lambda: (budget.acquire(60), admitted.set()))
+        waiter.start()
+        self.assertFalse(admitted.wait(0.2))
+        budget.release(120)
+        self.assertTrue(admitted.wait(5))
+        waiter.join()
+        self.assertEqual((budget.in_use, budget.peak, budget.waits), (60, 120, 1))
+        budget.release(60)
+        budget.acquire(500)  # Larger than the budget, admitted alone
+        self.assertEqual(budget.in_use, 500)
+
+    def test_small_budget_gives_same_result_and_reports_peak(self):
+        unlimited, messages = self.run_extraction("unlimited", memory_budget_mb=0)
+        self.assertFalse(any("Peak memory" in message for message in messages))
+        limited, messages = self.run_extraction("limited", memory_budget_mb=0.05)
+        self.assertEqual(limited.saved_files, unlimited.saved_files)
+        self.assertEqual(limited.counts, unlimited.counts)
+        self.assertEqual(limited.budget.in_use, 0)
+        memory = limited.stats.to_dict()["memory"]
+        self.assertEqual(memory["limit"], int(0.05 * 1024 * 1024))
+        self.assertGreaterEqual(memory["peak"], 128 * 128 * 3)
+        self.assertTrue(any("Peak memory of decoded images" in message for message in messages))
+
+    def test_workers_share_the_budget(self):
+        extractor, _ = self.run_extraction("parallel", memory_budget_mb=1, workers=2)
+        memory = extractor.stats.to_dict()["memory"]
+        self.assertEqual(memory["limit"], 1024 * 1024 // 2)
+        self.assertGreater(memory["peak"], 0)
+
+
+class TestAsyncImageWriter(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_close_waits_for_all_writes(self):
+        writer = AsyncImageWriter(threads=2, max_pending=2)
+        for index in range(10):
+            writer.submit(os.path.join(self.temp_dir, f"{index}.png"), Image.new("RGB", (16, 16)))
+        writer.submit(os.path.join(self.temp_dir, "raw.bin"), b"raw")
+        self.assertEqual(writer.close(), [])
+        self.assertEqual(len(os.listdir(self.temp_dir)), 11)
+
+    def test_errors_reported_through_log_callback(self):
+        log_callback = MagicMock()
+        writer = AsyncImageWriter(log_callback=log_callback)
+        writer.submit(os.path.join(self.temp_dir, "missing", "a.png"), b"data")
+        failed = writer.close()
+        self.assertEqual(len(failed), 1)
+        self.assertIn("Failed to write a.png", log_callback.call_args[0][0])
+
+    def test_failed_write_is_dropped_from_manifest(self):
+        pdf_path = os.path.join(self.temp_dir, "doc.pdf")
+        make_pdf(pdf_path, [[make_image_bytes(10)]])
+        extractor = PDFImageExtractor()
+        extractor.set_pdf_file(pdf_path)
+        extractor.output_folder = os.path.join(self.temp_dir, "out")
+        log_callback = MagicMock()
+        with patch.object(AsyncImageWriter, "_write", side_effect=OSError("disk full")):
+            extractor.extract_and_save_images(log_callback=log_callback)
+        self.assertEqual(list(extractor.xref_outputs.values()), [None])
+        self.assertIn("disk full", log_callback.call_args[0][0])
+
+
+class TestStreamingPreview(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.pdf_path = os.path.join(self.temp_dir, "preview.pdf")
+        self.sizes = [(32, 32), (128, 128), (64, 64), (96, 96)]
+        make_pdf(self.pdf_path, [[make_image_bytes(20 + i, size=size)] for i, size in enumerate(self.sizes)])
+        self.extractor = PDFImageExtractor()
+        self.extractor.set_pdf_file(self.pdf_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_iter_images_yields_lazy_records(self):
+        records = []
+        for record in self.extractor.iter_images():
+            records.append((record.page_index, record.size_kb))
+            record.release()
+            self.assertIsNone(record._base_image)
+        self.assertEqual([page for page, _ in records], [0, 1, 2, 3])
+        self.assertEqual([size for _, size in records], [size for _, size in self.extractor.extract_images()])
+
+    def test_preview_keeps_largest_images_within_limit(self):
+        self.extractor.options["preview_limit"] = 2
+        self.extractor.options["remove_duplicates"] = False
+        with patch.object(self.extractor, "create_thumb_sheet", return_value="sheet.png") as mock_sheet:
+            self.extractor.create_thumbnail_preview()
+        thumbnails = mock_sheet.call_args[0][0]
+        all_sizes = sorted((size for _, size in self.extractor.extract_images()), reverse=True)
+        self.assertEqual([size for _, size in thumbnails], all_sizes[:2])
+
+    def test_pending_thumbnails_are_bounded(self):
+        pdf_path = os.path.join(self.temp_dir, "many.pdf")
+        make_pdf(pdf_path, [[make_image_bytes(40 + i, fmt="JPEG")] for i in range(12)])
+        self.extractor.set_pdf_file(pdf_path)
+        self.extractor.options.update(remove_duplicates=False, thumbnail_threads=1)
+        lock = threading.Lock()
+        pending = {"now": 0, "peak": 0}
+
+        def slow_thumbnail(image_bytes, budget=None):
+            time.sleep(0.01)
+            with lock:
+                pending["now"] -= 1
+            return Image.open(io.BytesIO(image_bytes)).reduce(4), None
+
+        submit = ThreadPoolExecutor.submit
+
+        def counting_submit(pool, fn, *args, **kwargs):
+            with lock:
+                pending["now"] += 1
+                pending["peak"] = max(pending["peak"], pending["now"])
+            return submit(pool, fn, *args, **kwargs)
+
+        with patch("PDF_Image_Extractor.thumbnail_image", slow_thumbnail), patch.object(
+            ThreadPoolExecutor, "submit", counting_submit
+        ), patch.object(self.extractor, "create_thumb_sheet", return_value="sheet.png") as mock_sheet:
+            self.extractor.create_thumbnail_preview()
+        self.assertEqual(len(mock_sheet.call_args[0][0]), 12)
+        self.assertLessEqual(pending["peak"], 2)
+
+    def test_preview_finishes_under_small_memory_budget(self):
+        pdf_path = os.path.join(self.temp_dir, "large.pdf")
+        make_pdf(pdf_path, [[make_image_bytes(50 + i, size=(2000, 2000), fmt="JPEG")] for i in range(4)])
+        self.extractor.set_pdf_file(pdf_path)
+        self.extractor.options.update(memory_budget_mb=0.2, thumbnail_threads=1)
+        with patch.object(self.extractor, "create_thumb_sheet", return_value="sheet.png") as mock_sheet:
+            preview = threading.Thread(target=self.extractor.create_thumbnail_preview, daemon=True)
+            preview.start()
+            preview.join(timeout=30)
+        self.assertFalse(preview.is_alive(), "preview deadlocked in the memory budget")
+        self.assertEqual(len(mock_sheet.call_args[0][0]), 4)
+        self.assertEqual(self.extractor.budget.in_use, 0)
+
+    def test_unlimited_preview_matches_list_pipeline(self):
+        with patch.object(self.extractor, "create_thumb_sheet", return_value="sheet.png") as mock_sheet:
+            self.extractor.create_thumbnail_preview()
+        streamed = [size for _, size in mock_sheet.call_args[0][0]]
+        listed = self.extractor.sort_images_by_size(self.extractor.filter_images(self.extractor.extract_images()))
+        self.assertEqual(streamed, [size for _, size in listed])
+
+
+class TestDocumentSession(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.pdf_path = os.path.join(self.temp_dir, "session.pdf")
+        logo = make_image_bytes(90)
+        make_pdf(
+            self.pdf_path,
+            [
+                [logo, make_image_bytes(91, size=(96, 96))],
+                [logo, make_image_bytes(92, size=(16, 16))],
+                [make_image_bytes(91, size=(96, 96), fmt="JPEG")],
+            ],
+        )
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def make_extractor(self, folder):
+        extractor = PDFImageExtractor()
+        extractor.set_pdf_file(self.pdf_path)
+        extractor.output_folder = os.path.join(self.temp_dir, folder)
+        extractor.threshold = 1
+        return extractor
+
+    def test_extraction_after_preview_only_decodes_kept_images(self):
+        reference = self.make_extractor("reference")
+        reference.extract_and_save_images()
+
+        extractor = self.make_extractor("session")
+        with patch.object(extractor, "create_thumb_sheet", return_value="sheet.png"):
+            extractor.create_thumbnail_preview()
+        self.assertEqual(len(extractor.session.kept), 2)
+        with patch(
+            "pymupdf.Document.extract_image", autospec=True, side_effect=pymupdf.Document.extract_image
+        ) as mock_extract:
+            extractor.extract_and_save_images(log_callback=MagicMock())
+        self.assertEqual(mock_extract.call_count, 2)
+        self.assertEqual(extractor.saved_files, reference.saved_files)
+        self.assertEqual(extractor.counts, reference.counts)
+        self.assertEqual(extractor.xref_registry, reference.xref_registry)
+
+    def test_changed_settings_discard_session(self):
+        extractor = self.make_extractor("session")
+        with patch.object(extractor, "create_thumb_sheet", return_value="sheet.png"):
+            extractor.create_thumbnail_preview()
+        extractor.options["phash_threshold"] = 0
+        with patch.object(extractor, "decide_images", wraps=extractor.decide_images) as mock_decide:
+            extractor.extract_and_save_images(log_callback=MagicMock())
+        mock_decide.assert_not_called()
+        self.assertIsNone(extractor.session)
+
+
+class TestThumbSheets(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.extractor = PDFImageExtractor()
+        self.extractor.pdf_directory = self.temp_dir
+        self.extractor.pdf_name = "many.pdf"
+        self.thumbnails = [(Image.new("RGB", (100, 80), (index, 0, 0)), float(index)) for index in range(25)]
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_thumbnails_fitting_on_one_sheet(self):
+        path = self.extractor.create_thumb_sheet(self.thumbnails)
+        self.assertEqual(path, os.path.join(self.temp_dir, "thumbnail_sheet.png"))
+        with Image.open(path) as sheet:
+            self.assertEqual(sheet.size, (1000, 360))
+
+    def test_paged_sheets_with_index(self):
+        self.extractor.options["thumbs_per_sheet"] = 10
+        self.extractor.options["sheet_format"] = "webp"
+        path = self.extractor.create_thumb_sheet(self.thumbnails)
+        self.assertEqual(os.path.basename(path), "thumbnail_sheets.html")
+        names = [f"thumbnail_sheet_{number:03d}.webp" for number in (1, 2, 3)]
+        self.assertEqual(sorted(os.listdir(self.temp_dir)), names + ["thumbnail_sheets.html"])
+        with Image.open(os.path.join(self.temp_dir, names[2])) as sheet:
+            self.assertEqual((sheet.format, sheet.size), ("WEBP", (500, 120)))
+        with open(path, encoding="utf-8") as f:
+            index = f.read()
+        self.assertEqual([name for name in names if f'src="{name}"' in index], names)
+        self.assertIn("images 21 to 25", index)
+
+
+class TestCommandLine(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.pdf_dir = os.path.join(self.temp_dir, "pdfs")
+        os.makedirs(self.pdf_dir)
+        for name, seed in (("a.pdf", 30), ("b.pdf", 31)):
+            make_pdf(os.path.join(self.pdf_dir, name), [[make_image_bytes(seed)], [make_image_bytes(seed + 100)]])
+        self.output = os.path.join(self.temp_dir, "out")
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def run_cli(self, *argv):
+        stdout = io.StringIO()
+        with contextlib.redirect_stdout(stdout):
+            exit_code = run_cli(list(argv))
+        return exit_code, stdout.getvalue()
+
+    def test_collect_pdf_paths_expands_directories_and_globs(self):
+        a_path = os.path.join(self.pdf_dir, "a.pdf")
+        paths = collect_pdf_paths([a_path, self.pdf_dir, os.path.join(self.pdf_dir, "*.pdf")])
+        self.assertEqual(paths, [a_path, os.path.join(self.pdf_dir, "b.pdf")])
+
+    def test_batch_run_with_shared_pool(self):
+        exit_code, output = self.run_cli(self.pdf_dir, "-o", self.output, "-w", "2", "-q")
+        self.assertEqual(exit_code, 0)
+        self.assertIn("2 of 2 PDF files processed successfully.", output)
+        for name in ("a.pdf", "b.pdf"):
+            folder = os.path.join(self.output, f"extracted_img_from_{name}")
+            self.assertEqual(len([f for f in os.listdir(folder) if f.endswith(".png")]), 2)
+
+    def test_module_imports_without_tkinter(self):
+        module_path = os.path.join(
+            os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "PDF_Image_Extractor.py"
+        )
+        stubs = {"tkinter": None, "tkinter.ttk": None, "tkinter.filedialog": None, "PIL.ImageTk": None}
+        # PIL keeps submodules imported earlier as attributes, so drop ImageTk there as well
+        with patch.dict(sys.modules, stubs), patch.dict(PIL.__dict__):
+            PIL.__dict__.pop("ImageTk", None)
+            spec = importlib.util.spec_from_file_location("headless_extractor", module_path)
+            headless = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(headless)
+        self.assertIsNone(headless.tk)
+
+        stderr = io.StringIO()
+        with contextlib.redirect_stderr(stderr), self.assertRaises(SystemExit) as cm:
+            headless.main([])
+        self.assertEqual(cm.exception.code, 2)
+        self.assertIn("needs tkinter", stderr.getvalue())
+
+        stdout = io.StringIO()
+        with contextlib.redirect_stdout(stdout), self.assertRaises(SystemExit) as cm:
+            headless.main([os.path.join(self.pdf_dir, "a.pdf"), "-o", self.output, "-w", "1", "-q"])
+        self.assertEqual(cm.exception.code, 0)
+        self.assertIn("1 of 1 PDF files processed successfully.", stdout.getvalue())
+
+    def test_missing_file_gives_non_zero_exit(self):
+        exit_code, output = self.run_cli(
+            os.path.join(self.pdf_dir, "a.pdf"), "missing.pdf", "-o", self.output, "-w", "1", "-q"
+        )
+        self.assertEqual(exit_code, 1)
+        self.assertIn("FAILED: missing.pdf", output)
+        self.assertIn("1 of 2 PDF files processed successfully.", output)
+
+    def test_stats_json_lists_every_pdf(self):
+        stats_path = os.path.join(self.temp_dir, "stats.json")
+        exit_code, _ = self.run_cli(self.pdf_dir, "-o", self.output, "-w", "1", "-q", "--stats-json", stats_path)
+        self.assertEqual(exit_code, 0)
+        with open(stats_path) as f:
+            documents = json.load(f)["documents"]
+        self.assertEqual([os.path.basename(entry["pdf"]) for entry in documents], ["a.pdf", "b.pdf"])
+        self.assertEqual(documents[0]["counts"]["saved"], 2)
+        self.assertGreater(documents[0]["stages"]["write"]["bytes_out"], 0)
+
+
+class TestCorpusExtractor(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.masthead = make_image_bytes(40)
+        self.pdf_paths = []
+        for issue in range(3):
+            path = os.path.join(self.temp_dir, f"issue{issue}.pdf")
+            make_pdf(path, [[self.masthead], [make_image_bytes(50 + issue)]])
+            self.pdf_paths.append(path)
+        self.output_root = os.path.join(self.temp_dir, "corpus")
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_shared_index_keeps_first_occurrence_only(self):
+        report = CorpusExtractor(PDFImageExtractor(), self.output_root).run(self.pdf_paths + ["missing.pdf"])
+        counts = [entry["counts"] for entry in report["documents"][:3]]
+        self.assertEqual([c["saved"] for c in counts], [2, 1, 1])
+        self.assertEqual([c["cross_document_duplicate"] for c in counts], [0, 1, 1])
+        self.assertEqual(report["documents"][3]["status"], "failed")
+        self.assertEqual(report["totals"]["unique_images"], 4)
+        self.assertEqual(report["totals"]["duplicate_images"], 2)
+        self.assertTrue(os.path.isfile(os.path.join(self.output_root, "corpus_report.json")))
+
+    def test_cli_corpus_mode(self):
+        stdout = io.StringIO()
+        with contextlib.redirect_stdout(stdout):
+            exit_code = run_cli(self.pdf_paths + ["--cross-document-dedupe", "-o", self.output_root, "-w", "2", "-q"])
+        self.assertEqual(exit_code, 0)
+        self.assertIn("Corpus: 4 unique images, 2 duplicate references.", stdout.getvalue())
+
+
+class TestImageCache(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.pdf_path = os.path.join(self.temp_dir, "cached.pdf")
+        make_pdf(self.pdf_path, [[make_image_bytes(60)], [make_image_bytes(61, size=(96, 96))]])
+        self.cache_dir = os.path.join(self.temp_dir, "cache")
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def make_extractor(self):
+        extractor = PDFImageExtractor()
+        extractor.set_pdf_file(self.pdf_path)
+        extractor.output_folder = os.path.join(self.temp_dir, "out")
+        extractor.options["use_cache"] = True
+        extractor.options["cache_dir"] = self.cache_dir
+        return extractor
+
+    def test_rerun_with_new_thresholds_does_not_decode(self):
+        self.make_extractor().extract_and_save_images()
+
+        extractor = self.make_extractor()
+        extractor.threshold = 1000
+        extractor.options["phash_threshold"] = 0
+        with patch(
+            "pymupdf.Document.extract_image", autospec=True, side_effect=pymupdf.Document.extract_image
+        ) as mock_extract, patch.object(
+            pymupdf.Pixmap, "__init__", autospec=True, side_effect=pymupdf.Pixmap.__init__
+        ) as mock_pixmap:
+            extractor.extract_and_save_images()
+            extractor.threshold = 0
+            with patch.object(extractor, "create_thumb_sheet", return_value="sheet.png"):
+                extractor.create_thumbnail_preview()
+        self.assertEqual(extractor.counts["below_threshold"], 2)
+        mock_pixmap.assert_not_called()
+        self.assertEqual(mock_extract.call_count, 2)  # Only for the two preview thumbnails
+
+    def test_cached_hash_matches_computed_hash(self):
+        first = self.make_extractor()
+        first.extract_and_save_images()
+        second = self.make_extractor()
+        with pymupdf.open(self.pdf_path) as doc:
+            xref = doc[1].get_images()[0][0]
+            stage = ImageStage(doc, xref)
+            second.load_cached(stage)
+            self.assertIsNotNone(stage.cached)
+            self.assertEqual(stage.p_hash, first.phash_image(ImageStage(doc, xref)))
+
+    def test_repeated_preview_uses_cached_thumbnails(self):
+        previews = []
+        for _ in range(2):
+            extractor = self.make_extractor()
+            with patch(
+                "pymupdf.Document.extract_image", autospec=True, side_effect=pymupdf.Document.extract_image
+            ) as mock_extract, patch.object(extractor, "create_thumb_sheet", return_value="sheet.png") as mock_sheet:
+                extractor.create_thumbnail_preview()
+            previews.append([(thumbnail.tobytes(), size) for thumbnail, size in mock_sheet.call_args[0][0]])
+        mock_extract.assert_not_called()
+        self.assertEqual(len(previews[0]), 2)
+        self.assertEqual(previews[1], previews[0])
+
+    def test_operations_on_different_threads_share_the_cache(self):
+        # The GUI starts a new thread for every preview and extraction
+        extractor = self.make_extractor()
+        errors = []
+
+        def run(operation):
+            try:
+                operation()
+            except Exception as e:
+                errors.append(e)
+
+        with patch.object(extractor, "create_thumb_sheet", return_value="sheet.png"):
+            for operation in (extractor.create_thumbnail_preview, extractor.extract_and_save_images):
+                thread = threading.Thread(target=run, args=(operation,))
+                thread.start()
+                thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(extractor.counts["saved"], 2)
+        self.assertEqual(len(extractor.cache), 2)
+
+    def test_least_recently_used_entries_are_evicted(self):
+        cache = ImageCache(self.cache_dir, max_entries=2)
+        for xref in (1, 2, 3):
+            cache.put("doc", xref, 8, 1.0, 10, 10, None)
+            time.sleep(0.01)
+        cache.get("doc", 1, 8)
+        cache.commit()
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.get("doc", 2, 8))
+        self.assertIsNotNone(cache.get("doc", 1, 8))
+        cache.close()
+
+
+class TestResume(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.pdf_path = os.path.join(self.temp_dir, "long.pdf")
+        logo = make_image_bytes(70)
+        make_pdf(self.pdf_path, [[logo, make_image_bytes(71 + page)] for page in range(6)])
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def make_extractor(self, folder):
+        extractor = PDFImageExtractor()
+        extractor.set_pdf_file(self.pdf_path)
+        extractor.output_folder = os.path.join(self.temp_dir, folder)
+        extractor.threshold = 1
+        extractor.options["checkpoint_pages"] = 1
+        return extractor
+
+    def read_manifest(self, folder):
+        with open(os.path.join(self.temp_dir, folder, "manifest.json")) as f:
+            return json.load(f)
+
+    def test_interrupted_run_resumes_after_last_checkpoint(self):
+        self.make_extractor("reference").extract_and_save_images()
+
+        crashing = self.make_extractor("resumed")
+        process_page = crashing.process_page
+
+        def crash_on_page_3(doc, page_index, log_callback=None):
+            if page_index == 3:
+                raise KeyboardInterrupt
+            process_page(doc, page_index, log_callback)
+
+        with patch.object(crashing, "process_page", side_effect=crash_on_page_3):
+            with self.assertRaises(KeyboardInterrupt):
+                crashing.extract_and_save_images()
+        self.assertEqual(self.read_manifest("resumed")["pages_completed"], 3)
+
+        resumed = self.make_extractor("resumed")
+        with patch.object(resumed, "process_page", wraps=resumed.process_page) as mock_process:
+            resumed.extract_and_save_images(log_callback=MagicMock())
+        self.assertEqual([call.args[1] for call in mock_process.call_args_list], [3, 4, 5])
+        self.assertEqual(
+            sorted(os.listdir(os.path.join(self.temp_dir, "resumed"))),
+            sorted(os.listdir(os.path.join(self.temp_dir, "reference"))),
+        )
+        self.assertEqual(self.read_manifest("resumed"), self.read_manifest("reference"))
+
+    def test_missing_output_is_written_again(self):
+        self.make_extractor("out").extract_and_save_images()
+        os.remove(os.path.join(self.temp_dir, "out", "page_2-image_2.png"))
+
+        extractor = self.make_extractor("out")
+        with patch.object(extractor, "process_page") as mock_process:
+            self.assertEqual(extractor.extract_and_save_images(log_callback=MagicMock()), 7)
+        mock_process.assert_not_called()
+        self.assertTrue(os.path.exists(os.path.join(self.temp_dir, "out", "page_2-image_2.png")))
+
+    def test_changed_settings_start_from_first_page(self):
+        self.make_extractor("out").extract_and_save_images()
+        extractor = self.make_extractor("out")
+        extractor.options["remove_duplicates"] = False
+        with patch.object(extractor, "process_page", wraps=extractor.process_page) as mock_process:
+            extractor.extract_and_save_images(log_callback=MagicMock())
+        self.assertEqual(mock_process.call_count, 6)
+
+
+class TestContentStore(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.pdf_path = os.path.join(self.temp_dir, "shared.pdf")
+        logo = make_image_bytes(80)
+        # The logo repeats as one xref; page 1 also holds a JPEG copy that only the pHash matches
+        make_pdf(self.pdf_path, [[logo, make_image_bytes(81)], [logo, make_image_bytes(80, fmt="JPEG")]])
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def make_extractor(self, folder, links="hardlink"):
+        extractor = PDFImageExtractor()
+        extractor.set_pdf_file(self.pdf_path)
+        extractor.output_folder = os.path.join(self.temp_dir, folder)
+        extractor.threshold = 1
+        extractor.options.update(output_layout="content", content_links=links)
+        return extractor
+
+    def read_index(self, extractor):
+        with open(os.path.join(extractor.output_folder, "content_index.json")) as f:
+            return json.load(f)
+
+    def test_unique_images_are_stored_once_and_linked_from_every_page(self):
+        extractor = self.make_extractor("out")
+        self.assertEqual(extractor.extract_and_save_images(log_callback=MagicMock()), 2)
+        index = self.read_index(extractor)
+        self.assertEqual(index["objects"], 2)
+        self.assertEqual(
+            [entry["file"] for entry in index["pages"]],
+            ["page_0-image_1.png", "page_0-image_2.png", "page_1-image_1.png", "page_1-image_2.png"],
+        )
+        self.assertEqual(
+            [entry["duplicate_of"] for entry in index["pages"]],
+            [None, None, "page_0-image_1.png", "page_0-image_1.png"],
+        )
+        self.assertEqual([entry["near_duplicate"] for entry in index["pages"]], [False, False, False, True])
+        logo = os.path.join(extractor.output_folder, "page_0-image_1.png")
+        self.assertEqual(index["referenced_bytes"], index["object_bytes"] + 2 * os.path.getsize(logo))
+        for entry in index["pages"]:
+            path = os.path.join(extractor.output_folder, entry["file"])
+            self.assertTrue(os.path.samefile(path, os.path.join(extractor.output_folder, entry["object"])))
+        self.assertTrue(os.path.samefile(logo, os.path.join(extractor.output_folder, "page_1-image_2.png")))
+        self.assertEqual(extractor.stats.to_dict()["caches"]["content_store"], {"hits": 0, "misses": 2})
+
+    def test_link_types(self):
+        self.assertEqual(CONTENT_LINKS, ("hardlink", "symlink", "index"))
+        symlinks = self.make_extractor("symlink", "symlink")
+        symlinks.extract_and_save_images(log_callback=MagicMock())
+        link = os.path.join(symlinks.output_folder, "page_1-image_1.png")
+        self.assertTrue(os.path.islink(link))
+        with Image.open(link) as image:
+            self.assertEqual(image.size, (64, 64))
+
+        indexed = self.make_extractor("index", "index")
+        indexed.extract_and_save_images(log_callback=MagicMock())
+        self.assertEqual(sorted(os.listdir(indexed.output_folder)), ["content_index.json", "manifest.json", "objects"])
+        self.assertEqual(len(self.read_index(indexed)["pages"]), 4)
+
+    def test_identical_pixels_share_an_object(self):
+        extractor = self.make_extractor("out")
+        extractor.options.update(remove_duplicates=False, skip_repeated_xrefs=False)
+        self.assertEqual(extractor.extract_and_save_images(log_callback=MagicMock()), 4)
+        index = self.read_index(extractor)
+        self.assertEqual(index["objects"], 3)
+        self.assertEqual(index["pages"][0]["object"], index["pages"][2]["object"])
+        self.assertEqual(extractor.stats.to_dict()["caches"]["content_store"], {"hits": 1, "misses": 3})
+
+    def test_resumed_run_keeps_objects(self):
+        self.make_extractor("out").extract_and_save_images(log_callback=MagicMock())
+        with open(os.path.join(self.temp_dir, "out", "manifest.json")) as f:
+            manifest = json.load(f)
+        self.assertTrue(all(entry["object"].startswith("objects/") for entry in manifest["files"]))
+
+        extractor = self.make_extractor("out")
+        with patch.object(extractor, "process_page") as mock_process:
+            self.assertEqual(extractor.extract_and_save_images(log_callback=MagicMock()), 2)
+        mock_process.assert_not_called()
+        self.assertEqual(len(extractor.duplicate_of), 1)
+        self.assertEqual(len(self.read_index(extractor)["pages"]), 4)
+
+    def test_parallel_workers_store_shared_pixels_once(self):
+        # The same pixels under eight xrefs, so both workers write the same object at once
+        image = Image.open(io.BytesIO(make_image_bytes(82, size=(512, 512))))
+        streams = []
+        for level in range(8):
+            buffer = io.BytesIO()
+            image.save(buffer, format="PNG", compress_level=level + 1 if level < 7 else 0, optimize=level == 7)
+            streams.append(buffer.getvalue())
+        self.assertEqual(len(set(streams)), 8)
+        pdf_path = os.path.join(self.temp_dir, "same_pixels.pdf")
+        make_pdf(pdf_path, [[stream] for stream in streams])
+
+        extractor = self.make_extractor("parallel")
+        extractor.set_pdf_file(pdf_path)
+        # PIL encodes into the temporary file, which keeps it open long enough to overlap
+        extractor.options.update(remove_duplicates=False, workers=2, output_preset="png-fast")
+        log_callback = MagicMock()
+        self.assertEqual(extractor.extract_and_save_images(log_callback=log_callback), 8)
+        messages = [call.args[0] for call in log_callback.call_args_list]
+        self.assertFalse([message for message in messages if "Failed" in message])
+        index = self.read_index(extractor)
+        self.assertEqual((index["objects"], len(index["pages"])), (1, 8))
+        leftovers = [
+            name for _, _, names in os.walk(extractor.output_folder) for name in names if name.endswith(".part")
+        ]
+        self.assertEqual(leftovers, [])
+
+    def test_unknown_layout_is_rejected(self):
+        extractor = self.make_extractor("out")
+        extractor.options["output_layout"] = "flat"
+        with self.assertRaises(ValueError):
+            extractor.extract_and_save_images(log_callback=MagicMock())
+
+
+class TestPrefilter(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.pdf_path = os.path.join(self.temp_dir, "metadata.pdf")
+        self.small_jpeg = make_image_bytes(80, fmt="JPEG")
+        self.large_jpeg = make_image_bytes(81, size=(256, 256), fmt="JPEG")
+        make_pdf(
+            self.pdf_path,
+            [[self.small_jpeg, self.large_jpeg], [make_image_bytes(82, size=(8, 24))], [make_image_bytes(83)]],
+        )
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def make_extractor(self, folder, workers=1):
+        extractor = PDFImageExtractor()
+        extractor.set_pdf_file(self.pdf_path)
+        extractor.output_folder = os.path.join(self.temp_dir, folder)
+        extractor.threshold = (len(self.small_jpeg) + 100) / 1024
+        extractor.options["min_dimension"] = 16
+        extractor.options["workers"] = workers
+        return extractor
+
+    def test_small_images_are_rejected_without_extraction(self):
+        extractor = self.make_extractor("serial")
+        with pymupdf.open(self.pdf_path) as doc:
+            small_xref = doc[0].get_images()[0][0]
+        with patch(
+            "pymupdf.Document.extract_image", autospec=True, side_effect=pymupdf.Document.extract_image
+        ) as mock_extract:
+            extractor.extract_and_save_images(log_callback=MagicMock())
+        extracted = [call.args[1] for call in mock_extract.call_args_list]
+        self.assertEqual(len(extracted), 2)
+        self.assertNotIn(small_xref, extracted)
+        self.assertEqual(extractor.counts["prefiltered"], 2)
+        self.assertEqual(sorted(extractor.saved_files), ["page_0-image_2.png", "page_2-image_1.png"])
+
+    def test_parallel_run_counts_prefiltered_images(self):
+        serial = self.make_extractor("serial")
+        serial.extract_and_save_images(log_callback=MagicMock())
+        parallel = self.make_extractor("parallel", workers=2)
+        parallel.extract_and_save_images(log_callback=MagicMock())
+        self.assertEqual(parallel.counts, serial.counts)
+        self.assertEqual(parallel.saved_files, serial.saved_files)
+
+    def test_stream_length_matches_extracted_jpeg(self):
+        with pymupdf.open(self.pdf_path) as doc:
+            xref = doc[0].get_images()[1][0]
+            self.assertEqual(stream_length(doc, xref), len(doc.extract_image(xref)["image"]))
+
+
+class TestProgressAndCancel(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.pdf_path = os.path.join(self.temp_dir, "progress.pdf")
+        make_pdf(self.pdf_path, [[make_image_bytes(100 + page)] for page in range(5)])
+        self.extractor = PDFImageExtractor()
+        self.extractor.set_pdf_file(self.pdf_path)
+        self.extractor.output_folder = os.path.join(self.temp_dir, "out")
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_progress_reports_all_pages(self):
+        progress = MagicMock()
+        self.extractor.extract_and_save_images(progress_callback=progress)
+        snapshot = progress.call_args.args[0]
+        self.assertEqual((snapshot["pages_done"], snapshot["page_count"], snapshot["images"]), (5, 5, 5))
+        self.assertEqual(snapshot["eta"], 0)
+        self.assertGreater(snapshot["mb_per_second"], 0)
+
+    def test_cancel_stops_at_next_image(self):
+        process_image = self.extractor.process_image
+
+        def cancel_after_second_page(doc, page_index, *args):
+            process_image(doc, page_index, *args)
+            if page_index == 1:
+                self.extractor.cancel()
+
+        with patch.object(self.extractor, "process_image", side_effect=cancel_after_second_page) as mock_process:
+            with self.assertRaises(ExtractionCancelled):
+                self.extractor.extract_and_save_images()
+        self.assertEqual(mock_process.call_count, 2)
+
+        self.extractor.extract_and_save_images()  # A new run starts uncancelled
+        self.assertEqual(self.extractor.counts["saved"], 5)
+
+    def test_cancel_preview(self):
+        def cancel(*args):
+            self.extractor.cancel()
+            return False, None
+
+        with patch.object(self.extractor, "passes_filters", side_effect=cancel):
+            with self.assertRaises(ExtractionCancelled):
+                self.extractor.create_thumbnail_preview()
+        self.assertIsNone(self.extractor.session)
+
+
+class TestBufferedLogSink(unittest.TestCase):
+    def test_drain_keeps_newest_messages_and_file_keeps_all(self):
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+        log_path = os.path.join(temp_dir, "log.txt")
+        sink = BufferedLogSink(max_pending=3)
+        sink.open_file(log_path)
+        for index in range(5):
+            sink.write(f"line {index}")
+        self.assertEqual(sink.drain(), ["... 2 earlier messages not shown ...", "line 2", "line 3", "line 4"])
+        self.assertEqual(sink.drain(), [])
+        sink.close_file()
+        sink.write("not in file")
+        with open(log_path, encoding="utf-8") as f:
+            self.assertEqual(f.read().splitlines(), [f"line {index}" for index in range(5)])
+
+    def test_concurrent_writers_lose_nothing(self):
+        sink = BufferedLogSink(max_pending=10000)
+        threads = [threading.Thread(target=lambda n=n: [sink.write(f"{n}-{i}") for i in range(500)]) for n in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(sink.drain()), 2000)
+
+
 if __name__ == "__main__":
     unittest.main()